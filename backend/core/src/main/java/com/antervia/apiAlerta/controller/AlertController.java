@@ -49,6 +49,20 @@ public class AlertController {
         return new ResponseEntity<>(savedAlert, HttpStatus.CREATED);
     }
 
+    /**
+     * Recibe un lote de alertas desde Python (POST).
+     * El despachador de analítica agrupa las alertas pendientes para ahorrar viajes.
+     */
+    @PostMapping("/internal/alerts/batch")
+    public ResponseEntity<List<Alert>> createAlerts(@RequestBody List<Alert> alerts) {
+        System.out.println("Lote de alertas recibido (REST): " + alerts.size());
+
+        List<Alert> savedAlerts = alertRepository.saveAll(alerts);
+        savedAlerts.forEach(webSocketService::notifyFrontend);
+
+        return new ResponseEntity<>(savedAlerts, HttpStatus.CREATED);
+    }
+
     /**
      * Devuelve el historial de alertas (GET).
      */
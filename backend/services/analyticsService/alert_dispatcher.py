@@ -0,0 +1,382 @@
+import glob
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Existe, pero es de otro usuario
+    return True
+
+
+class AlertDispatcher:
+    """
+    Envío asíncrono de alertas a Spring Boot, fuera del bucle de análisis.
+
+    - `submit()` nunca bloquea: encola en una cola acotada (si se llena, la alerta se
+      descarta y se cuenta).
+    - Las alertas repetidas (misma cámara, tipo de evento y `dedup_key`, p.ej. la zona o
+      el track) dentro de `dedup_window` segundos se fusionan en una sola, con el número
+      de repeticiones en `details`.
+    - Un hilo trabajador envía en lotes con una sesión HTTP keep-alive, reintentando con
+      backoff exponencial (con jitter). Un 4xx (salvo 408/429) es definitivo: la alerta
+      se descarta y se cuenta en `rejected` (si fue un lote, se reenvía de a una).
+    - Si el core no responde, las alertas se guardan en disco (`spool_dir`, JSON por
+      línea) y un hilo de reenvío las reintenta más tarde.
+    """
+
+    def __init__(self, url: str, spool_dir: str, queue_size: int = 1000, dedup_window: float = 30.0,
+                 batch_size: int = 20, max_retries: int = 4, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, timeout: float = 5.0, replay_interval: float = 15.0,
+                 pool_size: int = 4):
+        self.url = url.rstrip("/")
+        self.spool_dir = spool_dir
+        self.dedup_window = dedup_window
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.replay_interval = replay_interval
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._recent = {}   # { (camera_id, event_type, dedup_key): hora en que salió a enviarse la última }
+        self._pending = {}  # { (camera_id, event_type, dedup_key): alerta aún en cola (para fusionar) }
+        self._last_prune = time.monotonic()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._batch_supported = True  # Se desactiva si el core no tiene el endpoint de lotes
+        self._core_down_until = 0.0  # Mientras el core esté caído, las alertas van directo a disco
+        self._spool_lock = threading.Lock()
+        self._spool_file = os.path.join(spool_dir, f"alerts-{os.getpid()}.jsonl")
+        self._spool_lines = {}  # { archivo: (bytes ya contados, líneas) } para no releer la cola en disco
+
+        # Sesión con pool de conexiones reutilizables (keep-alive)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        # Contadores
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed_attempts = 0
+        self.spooled = 0
+        self.replayed = 0  # Salieron de la cola en disco (entregadas o rechazadas por el core)
+        self.rejected = 0
+        self.spool_invalid = 0  # Líneas ilegibles en la cola en disco
+        self.last_error = None
+        self.last_send_ms = None
+
+        # Callable(alertas) tras cada envío exitoso; cada alerta recién encolada trae
+        # "_queued_at" (time.monotonic() al encolarla) para medir la latencia de envío
+        self.on_delivered = None
+
+    def start(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        for target, name in ((self._run, "alert-dispatcher"), (self._replay_loop, "alert-replay")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """Detiene los hilos; lo que quede en cola se guarda en disco para no perderlo."""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        leftovers = self._drain(self._queue.qsize())
+        if leftovers:
+            self._spool(leftovers)
+
+    # --- Lado productor (bucle de análisis) ---
+
+    def submit(self, alert: dict, dedup_key=None) -> bool:
+        """
+        Encola una alerta sin bloquear. Retorna False si se descartó por cola llena.
+        Solo se fusionan alertas con la misma cámara, tipo de evento y `dedup_key`.
+        """
+        key = (alert["camera_id"], alert["event_type"], dedup_key)
+        now = time.monotonic()
+        with self._lock:
+            self.submitted += 1
+            pending = self._pending.get(key)
+            if pending is not None:
+                # Todavía no salió: la fusionamos con la que está en cola
+                pending["_count"] += 1
+                self.coalesced += 1
+                return True
+            if now - self._recent.get(key, -self.dedup_window) < self.dedup_window:
+                # Ya se envió una igual hace poco
+                self.coalesced += 1
+                return True
+
+            alert = {**alert, "_count": 1, "_queued_at": now, "_key": key}
+            try:
+                self._queue.put_nowait(alert)
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._pending[key] = alert
+            return True
+
+    # --- Lado consumidor ---
+
+    def _drain(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit:
+            try:
+                alert = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(self._finalize(alert))
+        return batch
+
+    def _finalize(self, alert: dict) -> dict:
+        """Saca la alerta de la tabla de fusión y produce el payload definitivo."""
+        with self._lock:
+            key = alert["_key"]
+            if self._pending.get(key) is alert:
+                del self._pending[key]
+            # La ventana de fusión cuenta desde que la alerta sale a enviarse
+            self._recent[key] = time.monotonic()
+            count = alert.pop("_count")
+        if count > 1:
+            alert["details"] = f"{alert['details']} (x{count} en {self.dedup_window:.0f}s)"
+        return alert
+
+    @staticmethod
+    def _payload(alert: dict) -> dict:
+        """La alerta sin los campos internos (los que empiezan con "_")."""
+        return {key: value for key, value in alert.items() if not key.startswith("_")}
+
+    def _post(self, alerts: list):
+        """Envía un lote (o una alerta suelta). Lanza una excepción si falla."""
+        start = time.perf_counter()
+        if len(alerts) > 1:
+            response = self._session.post(f"{self.url}/batch", json=[self._payload(alert) for alert in alerts],
+                                          timeout=self.timeout)
+        else:
+            response = self._session.post(self.url, json=self._payload(alerts[0]), timeout=self.timeout)
+        response.raise_for_status()
+        self.last_send_ms = (time.perf_counter() - start) * 1000
+
+    @staticmethod
+    def _status(error: requests.RequestException):
+        return error.response.status_code if error.response is not None else None
+
+    @classmethod
+    def _is_rejection(cls, error: requests.RequestException) -> bool:
+        """Un 4xx (salvo 408 y 429) no se arregla reintentando: el core no acepta esa alerta."""
+        status = cls._status(error)
+        return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+    def _attempt(self, alerts: list):
+        """
+        Intenta enviar con backoff exponencial. Retorna None si se envió, o el último error
+        (un rechazo del core corta los reintentos).
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._post(alerts)
+                self.sent += len(alerts)
+                self._core_down_until = 0.0
+                if self.on_delivered is not None:
+                    self.on_delivered(alerts)
+                return None
+            except requests.RequestException as e:
+                self.last_error = str(e)
+                if self._is_rejection(e):
+                    return e
+                self.failed_attempts += 1
+                if attempt == self.max_retries or self._stop_event.is_set():
+                    return e
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                if self._stop_event.wait(delay * random.uniform(0.5, 1.0)):
+                    return e
+
+    def _deliver(self, alerts: list) -> list:
+        """
+        Envía las alertas. Retorna las que no se pudieron entregar (van a la cola en disco);
+        las que el core rechaza se cuentan en `rejected` y se descartan.
+        """
+        if len(alerts) > 1 and self._batch_supported:
+            error = self._attempt(alerts)
+            if error is None:
+                return []
+            if not self._is_rejection(error):
+                return list(alerts)
+            if self._status(error) in (404, 405):
+                # El core no tiene endpoint de lotes: seguimos de a una alerta
+                self._batch_supported = False
+            # Si no, alguna alerta del lote es inválida: se reenvían de a una para descartar solo esa
+
+        pending = []
+        for alert in alerts:
+            if pending:
+                pending.append(alert)  # El core sigue caído: no insistimos con el resto
+                continue
+            error = self._attempt([alert])
+            if error is None:
+                continue
+            if self._is_rejection(error):
+                self.rejected += 1
+                print(f"Advertencia: El core rechazó la alerta {alert['event_type']} de la cámara "
+                      f"{alert['camera_id']} ({self._status(error)}); se descarta.")
+            else:
+                pending.append(alert)
+        return pending
+
+    def _prune_recent(self):
+        """
+        Olvida los envíos más viejos que `dedup_window` (ya no fusionan nada). La clave incluye
+        el track, así que sin esto quedaría una entrada por cada persona vista desde el arranque.
+        """
+        now = time.monotonic()
+        if now - self._last_prune < self.dedup_window:
+            return
+        self._last_prune = now
+        with self._lock:
+            self._recent = {key: sent for key, sent in self._recent.items() if now - sent < self.dedup_window}
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._prune_recent()
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [self._finalize(first)] + self._drain(self.batch_size - 1)
+
+            if time.monotonic() < self._core_down_until:
+                # El core falló hace poco: no bloqueamos la cola reintentando, el reenvío se encarga
+                self._spool(batch)
+                continue
+            pending = self._deliver(batch)
+            if pending:
+                print(f"Advertencia: No se pudieron enviar {len(pending)} alerta(s); se guardan en disco.")
+                self._core_down_until = time.monotonic() + self.replay_interval
+                self._spool(pending)
+
+    # --- Cola en disco ---
+
+    def _spool(self, alerts: list):
+        with self._spool_lock:
+            with open(self._spool_file, "a", encoding="utf-8") as f:
+                for alert in alerts:
+                    f.write(json.dumps(self._payload(alert)) + "\n")
+        self.spooled += len(alerts)
+
+    def spooled_pending(self) -> int:
+        """
+        Alertas en la cola en disco (de todos los procesos que comparten `spool_dir`).
+        Los archivos solo crecen hasta que el reenvío los reclama, así que de cada uno se
+        cuentan únicamente los bytes agregados desde la consulta anterior.
+        """
+        counts = {}
+        for path in glob.glob(os.path.join(self.spool_dir, "alerts-*.jsonl")):
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue  # Reclamado por el reenvío mientras listábamos
+            counted, lines = self._spool_lines.get(path, (0, 0))
+            if size < counted:
+                counted, lines = 0, 0  # Otro archivo con el mismo nombre
+            if size > counted:
+                try:
+                    with open(path, "rb") as f:
+                        f.seek(counted)
+                        lines += f.read(size - counted).count(b"\n")
+                except OSError:
+                    continue
+            counts[path] = (size, lines)
+        self._spool_lines = counts
+        return sum(lines for _, lines in counts.values())
+
+    def _replay_files(self) -> list:
+        """
+        Archivos por reenviar: la cola de cada proceso y los reclamados por un reenvío que
+        no terminó (su proceso ya no existe). Los reclamados con nuestro PID también: este
+        hilo borra lo que reclama antes de seguir, así que son de una ejecución anterior con
+        el mismo PID (p.ej. tras reiniciar el contenedor).
+        """
+        paths = glob.glob(os.path.join(self.spool_dir, "alerts-*.jsonl"))
+        for path in glob.glob(os.path.join(self.spool_dir, "alerts-*.jsonl.replay-*")):
+            pid = path.rsplit("-", 1)[1]
+            if pid.isdigit() and (int(pid) == os.getpid() or not _process_alive(int(pid))):
+                paths.append(path)
+        return paths
+
+    def _read_spool(self, path: str) -> list:
+        """Alertas de un archivo de la cola; las líneas que no se pueden leer (p.ej. cortadas
+        por una caída a mitad de escritura) se descartan y se cuentan."""
+        alerts = []
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    alerts.append(json.loads(line))
+                except ValueError:
+                    self.spool_invalid += 1
+                    print(f"Advertencia: Línea inválida en la cola de alertas en disco ({os.path.basename(path)}); "
+                          f"se descarta.")
+        return alerts
+
+    def _replay_loop(self):
+        while not self._stop_event.wait(self.replay_interval):
+            for path in self._replay_files():
+                # Reclamamos el archivo renombrándolo (otro proceso podría estar reenviando)
+                claimed = f"{path.split('.replay-')[0]}.replay-{os.getpid()}"
+                try:
+                    with self._spool_lock:
+                        os.rename(path, claimed)
+                except OSError:
+                    continue
+
+                alerts = self._read_spool(claimed)
+                remaining = []
+                for start in range(0, len(alerts), self.batch_size):
+                    batch = alerts[start:start + self.batch_size]
+                    if remaining:
+                        remaining.extend(batch)  # El core sigue caído: no insistimos más en esta pasada
+                        continue
+                    pending = self._deliver(batch)
+                    remaining.extend(pending)
+                    self.replayed += len(batch) - len(pending)
+
+                os.remove(claimed)
+                if remaining:
+                    self._spool(remaining)
+                    self.spooled -= len(remaining)  # Ya estaban contadas
+                    break
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed_attempts": self.failed_attempts,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "rejected": self.rejected,
+            "spool_invalid": self.spool_invalid,
+            "spool_pending": self.spooled_pending(),
+            "last_send_ms": round(self.last_send_ms, 1) if self.last_send_ms is not None else None,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,155 @@
+import itertools
+import threading
+import time
+
+import cv2
+
+
+class AnnotatedFrameHub:
+    """
+    Buffer en memoria del último frame anotado de cada cámara, para servirlo por HTTP
+    (MJPEG) o WebSocket sin ventanas de OpenCV.
+
+    El análisis solo publica (y dibuja) cuando hay espectadores. La codificación JPEG es
+    perezosa: se hace una vez por frame y calidad, la primera vez que alguien lo pide,
+    y los bytes se comparten entre todos los espectadores.
+
+    En los trabajadores del modo "process" no hay espectadores locales: el proceso
+    principal registra uno "remoto" y `forward` envía los JPEG ya codificados.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._viewer_ids = itertools.count(1)
+        self._viewers = {}   # { camera_id: { viewer_id: (fps, quality) } }
+        self._frames = {}    # { camera_id: (seq, frame) }
+        self._encoded = {}   # { camera_id: { quality: (seq, bytes) } }
+        self._encode_locks = {}
+        self._last_forward = {}
+        self._seq = itertools.count(1)
+
+        # Callable(camera_id, jpeg_bytes) para reenviar los frames a otro proceso
+        self.forward = None
+
+    # --- Espectadores ---
+
+    def add_viewer(self, camera_id: int, fps: float, quality: int) -> int:
+        with self._lock:
+            viewer_id = next(self._viewer_ids)
+            self._viewers.setdefault(camera_id, {})[viewer_id] = (fps, quality)
+            return viewer_id
+
+    def remove_viewer(self, camera_id: int, viewer_id: int):
+        with self._lock:
+            viewers = self._viewers.get(camera_id, {})
+            viewers.pop(viewer_id, None)
+            if not viewers:
+                # Nadie mira: liberamos la memoria del último frame
+                self._viewers.pop(camera_id, None)
+                self._frames.pop(camera_id, None)
+                self._encoded.pop(camera_id, None)
+
+    def set_remote_viewer(self, camera_id: int, fps: float = None, quality: int = None):
+        """Registra (o elimina, con fps=None) al espectador remoto de una cámara."""
+        with self._lock:
+            if fps is None:
+                self._viewers.pop(camera_id, None)
+            else:
+                self._viewers[camera_id] = {0: (fps, quality)}
+
+    def has_viewers(self, camera_id: int) -> bool:
+        return bool(self._viewers.get(camera_id))
+
+    def viewer_settings(self, camera_id: int):
+        """(fps máximo, calidad máxima) pedidos por los espectadores de la cámara, o None."""
+        with self._lock:
+            viewers = list(self._viewers.get(camera_id, {}).values())
+        if not viewers:
+            return None
+        return max(fps for fps, _ in viewers), max(quality for _, quality in viewers)
+
+    def viewer_count(self) -> dict:
+        with self._lock:
+            return {camera_id: len(viewers) for camera_id, viewers in self._viewers.items()}
+
+    # --- Publicación (hilo de análisis) ---
+
+    def publish(self, camera_id: int, frame):
+        """Guarda el último frame anotado. No hace nada si nadie lo está mirando."""
+        if not self.has_viewers(camera_id):
+            return
+
+        if self.forward is not None:
+            self._forward(camera_id, frame)
+            return
+
+        # Copiamos: el frame puede ser una vista de memoria compartida que se reutilizará
+        with self._lock:
+            self._frames[camera_id] = (next(self._seq), frame.copy())
+
+    def publish_jpeg(self, camera_id: int, data: bytes):
+        """Guarda un frame ya codificado (llegado desde un proceso trabajador)."""
+        if not self.has_viewers(camera_id):
+            return
+        with self._lock:
+            self._encoded[camera_id] = {None: (next(self._seq), data)}
+
+    def _forward(self, camera_id: int, frame):
+        settings = self.viewer_settings(camera_id)
+        if settings is None:
+            return
+        fps, quality = settings
+
+        # Solo enviamos al ritmo que pidió el espectador más exigente
+        now = time.monotonic()
+        if now - self._last_forward.get(camera_id, 0.0) < 1.0 / fps:
+            return
+        self._last_forward[camera_id] = now
+
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        if ok:
+            self.forward(camera_id, buffer.tobytes())
+
+    # --- Consumo (endpoints) ---
+
+    def latest_jpeg(self, camera_id: int, quality: int):
+        """
+        Retorna (seq, bytes JPEG) del último frame de la cámara, o None si aún no hay ninguno.
+        Si otro espectador ya lo codificó con la misma calidad, se reutilizan esos bytes.
+        """
+        with self._lock:
+            encoded = self._encoded.get(camera_id, {})
+            if None in encoded:
+                return encoded[None]  # Frame remoto: ya viene codificado
+
+            current = self._frames.get(camera_id)
+            if current is None:
+                return None
+            seq, frame = current
+            cached = encoded.get(quality)
+            if cached is not None and cached[0] == seq:
+                return cached
+            encode_lock = self._encode_locks.setdefault(camera_id, threading.Lock())
+
+        with encode_lock:
+            # Puede que otro espectador lo haya codificado mientras esperábamos el lock
+            with self._lock:
+                cached = self._encoded.get(camera_id, {}).get(quality)
+            if cached is not None and cached[0] == seq:
+                return cached
+
+            ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+            if not ok:
+                return None
+            result = (seq, buffer.tobytes())
+            with self._lock:
+                if camera_id in self._viewers:
+                    self._encoded.setdefault(camera_id, {})[quality] = result
+            return result
+
+    def drop(self, camera_id: int):
+        """La cámara dejó de analizarse: olvidamos su último frame."""
+        with self._lock:
+            self._frames.pop(camera_id, None)
+            self._encoded.pop(camera_id, None)
+            self._last_forward.pop(camera_id, None)
@@ -0,0 +1,469 @@
+"""
+Benchmark reproducible del pipeline de análisis, sin pantalla ni cámaras.
+
+Reproduce las etapas de `analyze_camera_stream` con los mismos componentes
+(captura, redimensionado, pre-filtro de movimiento, planificador de inferencia,
+tracker, pre-roll de clips y dibujo/JPEG para espectadores) sobre un video local
+o sobre frames sintéticos, y para cada backend de detección mide:
+
+  - latencia por etapa (p50/p90/p99/máx) y frames/s de una cámara sin límite de tasa,
+  - cuántas cámaras sostiene el nodo a `--target-fps` (rampa con cámaras concurrentes
+    que comparten el planificador de inferencia, como en el modo "thread"),
+  - memoria residente por cámara.
+
+Los resultados se escriben en JSON; con `--baseline` se comparan contra una corrida
+anterior y el proceso termina con código 1 si algo empeoró más que `--tolerance`.
+
+Uso (desde analyticsService/):
+    python benchmark.py --video pasillo.mp4 --backends ultralytics,onnx,onnx-int8,haar,ssd --json bench.json
+    python benchmark.py --synthetic --backends none --target-fps 10
+    python benchmark.py --video pasillo.mp4 --backends onnx --baseline bench_v1.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from clip_recorder import ClipRecorder
+from detectors import Detections, create_detector
+from inference_scheduler import InferenceScheduler
+from motion_gate import MotionGate
+from overlay import draw_boxes
+from tracker import PersonTracker
+
+STAGES = ("capture", "resize", "motion", "inference", "tracker", "clips", "overlay", "total")
+
+
+# --- Fuentes de frames ---
+
+class VideoSource:
+    """Lee un archivo de video en bucle (se reabre al llegar al final)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"No se pudo abrir el video: {path}")
+
+    def read(self) -> np.ndarray:
+        ret, frame = self._cap.read()
+        if not ret:
+            self._cap.release()
+            self._cap = cv2.VideoCapture(self.path)
+            ret, frame = self._cap.read()
+            if not ret:
+                raise RuntimeError(f"El video no tiene frames: {self.path}")
+        return frame
+
+    def release(self):
+        self._cap.release()
+
+
+class SyntheticSource:
+    """Frames generados: fondo con ruido fijo y rectángulos que se mueven (dan trabajo al pre-filtro)."""
+
+    def __init__(self, width: int = 1920, height: int = 1080, people: int = 3, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.width, self.height = width, height
+        self._background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        self._people = people
+        self._index = 0
+
+    def read(self) -> np.ndarray:
+        frame = self._background.copy()
+        box_w, box_h = self.width // 12, self.height // 3
+        for person in range(self._people):
+            x = (self._index * 8 + person * self.width // self._people) % (self.width - box_w)
+            y = self.height // 2 - box_h // 2 + person * 10
+            cv2.rectangle(frame, (x, y), (x + box_w, y + box_h), (40 * person, 80, 200), -1)
+        self._index += 1
+        return frame
+
+    def release(self):
+        pass
+
+
+def open_source(args):
+    return SyntheticSource(args.width, args.height) if args.video is None else VideoSource(args.video)
+
+
+# --- Utilidades ---
+
+def rss_mb() -> float:
+    """Memoria residente actual del proceso en MB."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Pico (KB en Linux)
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p90_ms": round(float(p90), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+# --- Pipeline de una cámara ---
+
+class CameraPipeline:
+    """
+    Las etapas de `analyze_camera_stream` para un frame, cronometradas una por una.
+    `scheduler` es None con el backend "none" (mide el pipeline sin detector).
+    """
+
+    def __init__(self, camera_id: int, scheduler, args, clips_dir: str):
+        self.camera_id = camera_id
+        self.scheduler = scheduler
+        self.scale = args.scale
+        self.infer_every = max(1, args.infer_every)
+        self.viewers = args.viewers
+        self.motion_gate = MotionGate() if args.motion_gate else None
+        self.tracker = PersonTracker()
+        self.recorder = None
+        if args.clips:
+            self.recorder = ClipRecorder(camera_id, clips_dir, fps=10)
+            self.recorder.start()
+        self.samples = {stage: [] for stage in STAGES}
+        self.frames = 0
+        self.inferences = 0
+
+    def _timed(self, stage: str, start: float) -> float:
+        now = time.perf_counter()
+        self.samples[stage].append((now - start) * 1000)
+        return now
+
+    def process(self, source):
+        start = t = time.perf_counter()
+        frame = source.read()
+        t = self._timed("capture", t)
+
+        width, height = int(frame.shape[1] * self.scale), int(frame.shape[0] * self.scale)
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        t = self._timed("resize", t)
+
+        now = time.time()
+        run_inference = self.frames % self.infer_every == 0
+        if self.motion_gate is not None and run_inference:
+            run_inference = self.motion_gate.should_infer(frame, now)
+            t = self._timed("motion", t)
+
+        if run_inference:
+            detections = (self.scheduler.submit(frame, self.camera_id).result()
+                          if self.scheduler is not None else Detections.empty())
+            self.inferences += 1
+            t = self._timed("inference", t)
+            self.tracker.update(detections.boxes, detections.confidences, now)
+        else:
+            self.tracker.predict(now)
+        t = self._timed("tracker", t)
+
+        if self.recorder is not None:
+            self.recorder.add_frame(frame, now)
+            t = self._timed("clips", t)
+
+        if self.viewers:
+            _, boxes, _, _ = self.tracker.tracks()
+            annotated = draw_boxes(frame, boxes, (255, 0, 0), 2)
+            cv2.imencode(".jpg", annotated, [cv2.IMWRITE_JPEG_QUALITY, 70])
+            self._timed("overlay", t)
+
+        self._timed("total", start)
+        self.frames += 1
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.stop()
+
+
+# --- Fases del benchmark ---
+
+def single_camera(scheduler, args, clips_dir: str) -> dict:
+    """Una cámara sin límite de tasa: latencia por etapa y frames/s máximos."""
+    source = open_source(args)
+    pipeline = CameraPipeline(0, scheduler, args, clips_dir)
+    try:
+        for _ in range(args.warmup_frames):
+            pipeline.process(source)
+        pipeline.samples = {stage: [] for stage in STAGES}
+        pipeline.frames = pipeline.inferences = 0
+
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            pipeline.process(source)
+        elapsed = time.perf_counter() - start
+    finally:
+        pipeline.close()
+        source.release()
+
+    return {
+        "frames": pipeline.frames,
+        "fps": round(pipeline.frames / elapsed, 2),
+        "inference_ratio": round(pipeline.inferences / max(1, pipeline.frames), 3),
+        "stages": {stage: percentiles(samples) for stage, samples in pipeline.samples.items() if samples},
+    }
+
+
+def run_cameras(count: int, scheduler, args, clips_dir: str) -> dict:
+    """`count` cámaras concurrentes, cada una a `target_fps`, durante `ramp_seconds`."""
+    stop_event = threading.Event()
+    period = 1.0 / args.target_fps
+    results = [None] * count
+    memory_before = rss_mb()
+    ready = threading.Barrier(count + 1)
+
+    def camera(index: int):
+        source = open_source(args)
+        pipeline = CameraPipeline(index, scheduler, args, clips_dir)
+        try:
+            ready.wait()
+            start = next_tick = time.perf_counter()
+            while not stop_event.is_set():
+                pipeline.process(source)
+                next_tick += period
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    stop_event.wait(delay)
+                else:
+                    next_tick = time.perf_counter()  # Atrasada: no acumulamos deuda de frames
+            elapsed = time.perf_counter() - start
+            results[index] = (pipeline.frames / elapsed, percentiles(pipeline.samples["total"]))
+        finally:
+            pipeline.close()
+            source.release()
+
+    threads = [threading.Thread(target=camera, args=(index,), daemon=True) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    time.sleep(args.ramp_seconds / 2)
+    memory = rss_mb()  # Con todas las cámaras en régimen
+    time.sleep(args.ramp_seconds / 2)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+
+    fps = [result[0] for result in results]
+    return {
+        "cameras": count,
+        "min_fps": round(min(fps), 2),
+        "mean_fps": round(sum(fps) / count, 2),
+        "p99_total_ms": max(result[1].get("p99_ms", 0) for result in results),
+        "memory_mb": round(memory, 1),
+        "memory_per_camera_mb": round(max(0.0, memory - memory_before) / count, 2),
+    }
+
+
+def capacity(scheduler, args, clips_dir: str) -> dict:
+    """
+    Rampa de cámaras: duplica hasta que alguna cámara no alcanza el 95 % de `target_fps`
+    y luego busca por bisección el máximo que sí lo sostiene.
+    """
+    def sustained(step: dict) -> bool:
+        return step["min_fps"] >= 0.95 * args.target_fps
+
+    steps = []
+
+    def measure(count: int) -> bool:
+        step = run_cameras(count, scheduler, args, clips_dir)
+        steps.append(step)
+        print(f"    {count:>3} cámaras: min {step['min_fps']:.1f} fps, media {step['mean_fps']:.1f} fps, "
+              f"{step['memory_per_camera_mb']:.1f} MB/cámara")
+        return sustained(step)
+
+    best, failed = 0, None
+    count = 1
+    while count <= args.max_cameras:
+        if not measure(count):
+            failed = count
+            break
+        best = count
+        count *= 2
+    if failed is None and best < args.max_cameras:
+        failed = args.max_cameras + 1
+    while failed is not None and failed - best > 1:
+        middle = (best + failed) // 2
+        if measure(middle):
+            best = middle
+        else:
+            failed = middle
+
+    ok_steps = [step for step in steps if sustained(step)]
+    return {
+        "target_fps": args.target_fps,
+        "max_cameras": best,
+        "memory_per_camera_mb": max((step["memory_per_camera_mb"] for step in ok_steps), default=None),
+        "steps": sorted(steps, key=lambda step: step["cameras"]),
+    }
+
+
+def benchmark_backend(backend: str, args, clips_dir: str) -> dict:
+    detector, scheduler = None, None
+    result = {"backend": backend}
+    if backend != "none":
+        load_start = time.perf_counter()
+        try:
+            detector = create_detector(backend, conf=args.conf, threads=args.threads)
+        except Exception as e:
+            print(f"  No se pudo cargar el backend '{backend}': {e}")
+            return {**result, "error": str(e)}
+        result["load_s"] = round(time.perf_counter() - load_start, 3)
+        result["warmup_latency_ms"] = round(detector.warmup(), 3)
+        scheduler = InferenceScheduler(detector, max_batch_size=args.batch_size, max_wait_ms=args.max_wait_ms)
+        scheduler.start()
+
+    try:
+        print("  Una cámara sin límite de tasa...")
+        result["single_camera"] = single_camera(scheduler, args, clips_dir)
+        print(f"    {result['single_camera']['fps']:.1f} fps, total p50 "
+              f"{result['single_camera']['stages']['total']['p50_ms']:.2f} ms")
+        if args.max_cameras > 0:
+            print(f"  Capacidad a {args.target_fps:g} fps por cámara...")
+            result["capacity"] = capacity(scheduler, args, clips_dir)
+        if scheduler is not None:
+            result["scheduler"] = scheduler.stats()
+            result["detector"] = detector.stats()
+    finally:
+        if scheduler is not None:
+            scheduler.stop()
+    return result
+
+
+# --- Comparación contra una corrida anterior ---
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Lista de regresiones (métrica, antes, ahora) por encima de `tolerance` (fracción)."""
+    regressions = []
+    for backend, result in current["backends"].items():
+        previous = baseline.get("backends", {}).get(backend)
+        if not previous or "error" in result or "error" in previous:
+            continue
+        checks = [
+            (f"{backend}.single_camera.fps",
+             previous["single_camera"]["fps"], result["single_camera"]["fps"], True),
+            (f"{backend}.single_camera.total.p99_ms",
+             previous["single_camera"]["stages"]["total"]["p99_ms"],
+             result["single_camera"]["stages"]["total"]["p99_ms"], False),
+        ]
+        # La capacidad solo es comparable con la misma tasa objetivo y si la rampa no tocó su tope
+        if "capacity" in previous and "capacity" in result and \
+                previous["capacity"]["target_fps"] == result["capacity"]["target_fps"] and \
+                result["capacity"]["max_cameras"] < current["meta"]["options"]["max_cameras"]:
+            checks.append((f"{backend}.capacity.max_cameras",
+                           previous["capacity"]["max_cameras"], result["capacity"]["max_cameras"], True))
+        for name, before, now, higher_is_better in checks:
+            if not before:
+                continue
+            change = (now - before) / before
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append((name, before, now))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Video local a reproducir en bucle")
+    parser.add_argument("--synthetic", action="store_true", help="Usar frames sintéticos (por defecto sin --video)")
+    parser.add_argument("--width", type=int, default=1920, help="Ancho de los frames sintéticos")
+    parser.add_argument("--height", type=int, default=1080, help="Alto de los frames sintéticos")
+    parser.add_argument("--backends", default="ultralytics",
+                        help="Lista separada por comas: ultralytics, onnx, onnx-int8, openvino, haar, ssd, none")
+    parser.add_argument("--conf", type=float, default=0.6)
+    parser.add_argument("--threads", type=int, default=None, help="Hilos intra-op de onnxruntime")
+    parser.add_argument("--frames", type=int, default=300, help="Frames medidos con una cámara")
+    parser.add_argument("--warmup-frames", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=0.6, help="Factor de redimensionado (FRAME_SCALE)")
+    parser.add_argument("--infer-every", type=int, default=1, help="Inferir uno de cada N frames")
+    parser.add_argument("--motion-gate", action="store_true", help="Activar el pre-filtro de movimiento")
+    parser.add_argument("--clips", action="store_true", help="Incluir el pre-roll de clips")
+    parser.add_argument("--viewers", action="store_true", help="Incluir el dibujo y la codificación JPEG")
+    parser.add_argument("--batch-size", type=int, default=8, help="INFERENCE_MAX_BATCH_SIZE")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="INFERENCE_MAX_WAIT_MS")
+    parser.add_argument("--target-fps", type=float, default=5.0, help="FPS por cámara para la rampa de capacidad")
+    parser.add_argument("--max-cameras", type=int, default=64, help="Tope de la rampa (0 = omitir la rampa)")
+    parser.add_argument("--ramp-seconds", type=float, default=6.0, help="Duración de cada paso de la rampa")
+    parser.add_argument("--json", help="Archivo donde guardar los resultados (por defecto, stdout)")
+    parser.add_argument("--baseline", help="Resultados anteriores (JSON) contra los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Empeoramiento tolerado (fracción)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.synthetic:
+        args.video = None
+
+    probe = open_source(args)
+    first = probe.read()
+    probe.release()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "host": platform.node(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "source": args.video or "synthetic",
+            "source_size": [first.shape[1], first.shape[0]],
+            "options": {key: value for key, value in vars(args).items() if key not in ("json", "baseline")},
+        },
+        "backends": {},
+    }
+
+    with tempfile.TemporaryDirectory() as clips_dir:
+        for backend in [name.strip() for name in args.backends.split(",") if name.strip()]:
+            print(f"Backend '{backend}':")
+            report["backends"][backend] = benchmark_backend(backend, args, clips_dir)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"Resultados guardados en {args.json}")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"]["source"] != report["meta"]["source"]:
+            print("Advertencia: la corrida anterior usó otra fuente de video; la comparación puede no ser válida.")
+        regressions = compare(report, baseline, args.tolerance)
+        for name, before, now in regressions:
+            print(f"REGRESIÓN {name}: {before} -> {now}")
+        if regressions:
+            sys.exit(1)
+        print("Sin regresiones respecto de la corrida anterior.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class CameraRegistry:
+    """
+    Registro persistente (SQLite) de las cámaras configuradas en el servicio.
+
+    Guarda la configuración con la que se inició cada cámara para volver a levantarlas
+    todas al reiniciar el servicio, sin esperar a que se registren de nuevo una por una.
+    Solo se borra una entrada cuando la cámara se detiene explícitamente (no al apagar
+    el servicio). Las escrituras son pequeñas y transaccionales: un corte a mitad de
+    escritura no corrompe el registro.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cameras ("
+            " key TEXT PRIMARY KEY,"
+            " config TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        try:
+            # La configuración puede incluir credenciales de las cámaras
+            os.chmod(path, 0o600)
+        except OSError:
+            pass
+
+    def save(self, key, config: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO cameras (key, config, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET config = excluded.config, updated_at = excluded.updated_at",
+                (str(key), json.dumps(config), time.time())
+            )
+
+    def remove(self, key) -> bool:
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM cameras WHERE key = ?", (str(key),))
+        return cursor.rowcount > 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT config FROM cameras WHERE key = ?", (str(key),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load(self) -> dict:
+        """{ clave: configuración } en el orden en que se registraron (o actualizaron)."""
+        with self._lock:
+            rows = self._db.execute("SELECT key, config FROM cameras ORDER BY updated_at").fetchall()
+        return {key: json.loads(config) for key, config in rows}
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM cameras").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
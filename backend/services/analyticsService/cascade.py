@@ -0,0 +1,220 @@
+import numpy as np
+
+from detectors import Detections
+from motion_gate import MotionGate
+
+
+def merge_regions(boxes: np.ndarray, shape, padding: float = 0.15, min_size: int = 64) -> np.ndarray:
+    """
+    Agranda cada caja en `padding` (fracción de su tamaño, mínimo `min_size` píxeles de
+    lado), la recorta al frame y une las que se superponen hasta que no quede ninguna
+    superpuesta. Así una persona no queda partida entre dos recortes.
+    """
+    if len(boxes) == 0:
+        return np.zeros((0, 4), dtype=np.float32)
+    height, width = shape[:2]
+    boxes = np.asarray(boxes, dtype=np.float32).copy()
+    size = boxes[:, 2:] - boxes[:, :2]
+    grow = np.maximum(size * padding, (min_size - size) / 2)
+    grow = np.maximum(grow, 0)
+    boxes[:, :2] -= grow
+    boxes[:, 2:] += grow
+    boxes = np.clip(boxes, 0, [width, height, width, height])
+
+    merged = [box for box in boxes]
+    changed = True
+    while changed and len(merged) > 1:
+        changed = False
+        result = []
+        while merged:
+            current = merged.pop()
+            index = 0
+            while index < len(merged):
+                other = merged[index]
+                if current[0] < other[2] and other[0] < current[2] and current[1] < other[3] and other[1] < current[3]:
+                    current = np.concatenate([np.minimum(current[:2], other[:2]), np.maximum(current[2:], other[2:])])
+                    merged.pop(index)
+                    changed = True
+                else:
+                    index += 1
+            result.append(current)
+        merged = result
+    return np.array(merged, dtype=np.float32)
+
+
+class DetectionCascade:
+    """
+    Cascada de detección de una cámara: una primera etapa barata propone regiones y el
+    modelo principal solo se ejecuta sobre ellas; una etapa opcional de rostros corre
+    únicamente sobre las personas confirmadas.
+
+    Primera etapa (`proposal`):
+      "motion"   -> rectángulos con movimiento de `MotionGate` (sin costo de inferencia).
+                    Sin movimiento (refresco forzado) se analiza el frame completo.
+      "detector" -> un detector de entrada pequeña (YOLO a 320 px) con confianza baja;
+                    si no propone nada, el frame se descarta sin llamar al modelo principal.
+    A las regiones propuestas se suman las personas de la inferencia anterior, para no
+    perder a quien se quedó quieto.
+
+    El modelo principal recibe un recorte por región; con más de `max_regions` se usa un
+    solo recorte que las contiene a todas, y si cubren más de `full_frame_ratio` del frame
+    se analiza el frame completo. Como YOLO procesa cada imagen a un tamaño fijo, cada
+    recorte cuesta lo mismo que un frame: el ahorro de cómputo viene de los frames
+    descartados y de no buscar rostros en frames sin personas, y el recorte mejora la
+    resolución efectiva de las personas lejanas.
+
+    Las etapas se invocan a través de funciones `submit(imagen) -> Future[Detections]`
+    (los planificadores por lotes compartidos entre cámaras).
+    """
+
+    def __init__(self, detector_submit, proposal: str = "motion", motion_gate: MotionGate = None,
+                 proposal_submit=None, face_submit=None, padding: float = 0.15, max_regions: int = 1,
+                 full_frame_ratio: float = 0.6, min_motion_area: float = 0.001, head_ratio: float = 0.4,
+                 cost_providers: dict = None):
+        if proposal not in ("motion", "detector"):
+            raise ValueError(f"Primera etapa de cascada desconocida: '{proposal}' (se espera 'motion' o 'detector').")
+        if proposal == "detector" and proposal_submit is None:
+            raise ValueError("La primera etapa 'detector' necesita un detector de propuestas.")
+
+        self.detector_submit = detector_submit
+        self.proposal = proposal
+        self.proposal_submit = proposal_submit
+        self.face_submit = face_submit
+        # Sin MotionGate en el pipeline, la cascada mantiene su propio fondo
+        self.motion_gate = motion_gate
+        self._own_gate = motion_gate is None and proposal == "motion"
+        if self._own_gate:
+            self.motion_gate = MotionGate()
+        self.padding = padding
+        self.max_regions = max_regions
+        self.full_frame_ratio = full_frame_ratio
+        self.min_motion_area = min_motion_area
+        self.head_ratio = head_ratio  # Parte superior de la caja de una persona donde se busca el rostro
+        self.cost_providers = cost_providers or {}  # {"proposal"|"detector"|"face": () -> s/imagen o None}
+
+        self._previous = np.zeros((0, 4), dtype=np.float32)
+        self.last_faces = np.zeros((0, 4), dtype=np.float32)
+
+        # Contadores por etapa
+        self.frames = 0
+        self.proposal_calls = 0
+        self.frames_with_candidates = 0
+        self.frames_rejected = 0       # Descartados por la primera etapa (sin llamar al modelo principal)
+        self.frames_full = 0           # Analizados completos (sin regiones o regiones demasiado grandes)
+        self.detector_calls = 0        # Imágenes (recortes o frames) enviadas al modelo principal
+        self.frames_confirmed = 0      # Frames donde el modelo principal encontró personas
+        self.pixels_sent = 0.0         # Suma de la fracción del frame enviada al modelo principal
+        self.face_calls = 0
+        self.faces_found = 0
+
+    def _propose(self, image: np.ndarray) -> np.ndarray:
+        if self.proposal == "motion":
+            # El MotionGate del pipeline ya comparó esta imagen antes de decidir inferir;
+            # uno propio solo se actualiza aquí
+            if self._own_gate:
+                self.motion_gate.motion_ratio(image)
+            return self.motion_gate.motion_regions(image.shape, self.min_motion_area)
+        self.proposal_calls += 1
+        return self.proposal_submit(image).result().boxes
+
+    def detect(self, image: np.ndarray, offset=(0, 0)) -> Detections:
+        """
+        Detecta personas en `image` con la cascada (cajas en coordenadas de `image`).
+        `offset` es la posición de `image` dentro del frame (p.ej. el ROI de las zonas):
+        `last_faces` queda en coordenadas del frame, listo para dibujar.
+        """
+        self.frames += 1
+        height, width = image.shape[:2]
+
+        candidates = self._propose(image)
+        if len(candidates):
+            self.frames_with_candidates += 1
+        elif self.proposal == "detector" and len(self._previous) == 0:
+            self.frames_rejected += 1
+            self.last_faces = np.zeros((0, 4), dtype=np.float32)
+            return Detections.empty()
+
+        regions = merge_regions(np.concatenate([candidates, self._previous]), image.shape, self.padding)
+        if len(regions) > self.max_regions:
+            regions = np.concatenate([regions[:, :2].min(axis=0), regions[:, 2:].max(axis=0)])[None, :]
+        area = float(((regions[:, 2] - regions[:, 0]) * (regions[:, 3] - regions[:, 1])).sum()) if len(regions) else 0.0
+        if len(regions) == 0 or area > self.full_frame_ratio * width * height:
+            self.frames_full += 1
+            regions = np.array([[0, 0, width, height]], dtype=np.float32)
+            area = float(width * height)
+        self.pixels_sent += area / (width * height)
+
+        # Todos los recortes se encolan antes de esperar: el planificador los agrupa en un lote
+        boxes = regions.astype(np.int32)
+        futures = [self.detector_submit(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in boxes.tolist()]
+        self.detector_calls += len(futures)
+        found_boxes, found_conf = [], []
+        for (x1, y1, _, _), future in zip(boxes.tolist(), futures):
+            result = future.result()
+            if len(result):
+                found_boxes.append(result.boxes + np.array([x1, y1, x1, y1], dtype=np.float32))
+                found_conf.append(result.confidences)
+        if found_boxes:
+            self.frames_confirmed += 1
+            detections = Detections(np.concatenate(found_boxes), np.concatenate(found_conf))
+        else:
+            detections = Detections.empty()
+
+        self._previous = detections.boxes
+        if self.face_submit is not None:
+            self.last_faces = self._detect_faces(image, detections) + np.array([*offset, *offset], dtype=np.float32)
+        return detections
+
+    def _detect_faces(self, image: np.ndarray, detections: Detections) -> np.ndarray:
+        """Busca un rostro en la cabeza (parte superior) de cada persona confirmada."""
+        if len(detections) == 0:
+            return np.zeros((0, 4), dtype=np.float32)
+        heads = detections.boxes.copy()
+        heads[:, 3] = heads[:, 1] + (heads[:, 3] - heads[:, 1]) * self.head_ratio
+        heads = np.clip(heads, 0, [image.shape[1], image.shape[0], image.shape[1], image.shape[0]]).astype(np.int32)
+        heads = heads[(heads[:, 2] - heads[:, 0] >= 8) & (heads[:, 3] - heads[:, 1] >= 8)]
+
+        futures = [self.face_submit(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in heads.tolist()]
+        self.face_calls += len(futures)
+        faces = []
+        for (x1, y1, _, _), future in zip(heads.tolist(), futures):
+            result = future.result()
+            if len(result):
+                self.faces_found += 1  # Una por persona: se cuenta si la persona tiene rostro visible
+                faces.append(result.boxes[:1] + np.array([x1, y1, x1, y1], dtype=np.float32))
+        return np.concatenate(faces) if faces else np.zeros((0, 4), dtype=np.float32)
+
+    def _ratio(self, part, total):
+        return round(part / total, 3) if total else 0.0
+
+    def _estimated_saving(self):
+        """
+        Fracción del cómputo ahorrada frente a ejecutar cada modelo (el principal y, si está
+        activa, la etapa de rostros) sobre el frame completo, usando el costo medido por
+        imagen de cada etapa. None mientras no haya mediciones.
+        """
+        costs = {stage: provider() for stage, provider in self.cost_providers.items() if provider is not None}
+        if not self.frames or not costs.get("detector"):
+            return None
+        baseline = self.frames * (costs["detector"] + (costs.get("face") or 0.0))
+        spent = self.detector_calls * costs["detector"]
+        spent += self.proposal_calls * (costs.get("proposal") or 0.0)
+        spent += self.face_calls * (costs.get("face") or 0.0)
+        return round(1.0 - spent / baseline, 3)
+
+    def stats(self) -> dict:
+        stats = {
+            "proposal": self.proposal,
+            "frames": self.frames,
+            "proposal_hit_rate": self._ratio(self.frames_with_candidates, self.frames),
+            "frames_rejected": self.frames_rejected,
+            "frames_full": self.frames_full,
+            "detector_calls": self.detector_calls,
+            "detector_hit_rate": self._ratio(self.frames_confirmed, self.frames - self.frames_rejected),
+            "avg_pixels_sent": self._ratio(self.pixels_sent, self.frames - self.frames_rejected),
+            "estimated_saving": self._estimated_saving(),
+        }
+        if self.face_submit is not None:
+            stats["face_calls"] = self.face_calls
+            stats["face_hit_rate"] = self._ratio(self.faces_found, self.face_calls)
+        return stats
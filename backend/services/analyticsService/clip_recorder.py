@@ -0,0 +1,229 @@
+import collections
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+# Un solo hilo codifica los mp4 de todas las cámaras: los clips son esporádicos y así
+# nunca compiten por CPU con más de un núcleo
+_WRITER_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-writer")
+
+
+class _PendingClip:
+    """Clip disparado que sigue juntando frames de post-roll."""
+
+    def __init__(self, path: str, packets: list, started: float, until: float):
+        self.path = path
+        self.packets = packets  # [(timestamp, bytes JPEG)]
+        self.started = started
+        self.until = until
+
+
+class ClipRecorder:
+    """
+    Grabación de clips por evento para una cámara.
+
+    Mantiene un pre-roll de los últimos `pre_roll` segundos como paquetes JPEG
+    (no arreglos crudos) acotado también en bytes. `trigger()` retorna al instante la
+    ruta del clip; el recorder sigue juntando `post_roll` segundos y un hilo aparte
+    escribe el mp4 en `clips_dir`. Un evento continuo extiende el clip como mucho hasta
+    `max_clip_seconds` desde el disparo; después se escribe y el siguiente disparo abre
+    otro clip (así la memoria sigue acotada y el archivo aparece).
+
+    `add_frame()` es lo único que corre en el bucle de análisis: limita la tasa, copia
+    el frame y lo deja en una cola corta. La compresión JPEG la hace el hilo del
+    recorder; si se atrasa, los frames se descartan (y se cuentan) en vez de esperar.
+    """
+
+    def __init__(self, camera_id: int, clips_dir: str, pre_roll: float = 5.0, post_roll: float = 5.0,
+                 fps: float = 10.0, max_buffer_bytes: int = 8 * 1024 * 1024, jpeg_quality: int = 80,
+                 url_prefix: str = "/clips", max_clip_seconds: float = 30.0):
+        self.camera_id = camera_id
+        self.clips_dir = clips_dir
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.max_clip_seconds = max(max_clip_seconds, post_roll)
+        self.fps = fps
+        self.max_buffer_bytes = max_buffer_bytes
+        self.jpeg_quality = jpeg_quality
+        self.url_prefix = url_prefix
+
+        self._inbox = queue.Queue(maxsize=4)
+        self._ring = collections.deque()  # [(timestamp, bytes JPEG)]
+        self._ring_bytes = 0
+        self._lock = threading.Lock()
+        self._pending = None
+        self._last_accepted = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Contadores
+        self.frames_buffered = 0
+        self.frames_dropped = 0
+        self.clips_triggered = 0
+        self.clips_written = 0
+        self.clips_failed = 0
+        self.last_clip = None
+
+    def start(self):
+        os.makedirs(self.clips_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name=f"clips-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Detiene el recorder; un clip a medio juntar se escribe con lo que tenga."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            _WRITER_POOL.submit(self._write_clip, pending)
+
+    # --- Bucle de análisis ---
+
+    def add_frame(self, frame: np.ndarray, timestamp: float = None):
+        """Ofrece un frame al pre-roll. Nunca bloquea."""
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp - self._last_accepted < 1.0 / self.fps:
+            return
+        self._last_accepted = timestamp
+        try:
+            # Copiamos: el frame puede ser una vista de memoria compartida que se reutilizará
+            self._inbox.put_nowait((timestamp, frame.copy()))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def trigger(self, now: float = None) -> str:
+        """
+        Marca un evento. Retorna la ruta pública del clip (p. ej. "/clips/cam_123_20251109173000.mp4").
+        Si ya hay un clip juntando post-roll, se extiende (hasta `max_clip_seconds`) y se
+        retorna la misma ruta; si ya llegó a ese tope, se cierra y se abre uno nuevo.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            pending = self._pending
+            if pending is not None and now < pending.until:
+                pending.until = min(now + self.post_roll, pending.started + self.max_clip_seconds)
+                return self._public_path(pending.path)
+            finished = pending  # Tope alcanzado (el hilo del recorder aún no lo había escrito)
+
+            stamp = datetime.fromtimestamp(now).strftime("%Y%m%d%H%M%S")
+            path = os.path.join(self.clips_dir, f"cam_{self.camera_id}_{stamp}.mp4")
+            if finished is not None and path == finished.path:
+                path = path[:-len(".mp4")] + f"_{self.clips_triggered}.mp4"
+            self._pending = _PendingClip(path, list(self._ring), now, now + self.post_roll)
+            self.clips_triggered += 1
+        if finished is not None:
+            _WRITER_POOL.submit(self._write_clip, finished)
+        return self._public_path(path)
+
+    def _public_path(self, path: str) -> str:
+        return f"{self.url_prefix}/{os.path.basename(path)}"
+
+    # --- Hilo del recorder ---
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                timestamp, frame = self._inbox.get(timeout=0.5)
+            except queue.Empty:
+                self._flush_if_done(time.time())
+                continue
+
+            ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                continue
+            packet = (timestamp, buffer.tobytes())
+
+            with self._lock:
+                self._ring.append(packet)
+                self._ring_bytes += len(packet[1])
+                # Límite de memoria: por antigüedad y por bytes
+                while self._ring and (timestamp - self._ring[0][0] > self.pre_roll or
+                                      self._ring_bytes > self.max_buffer_bytes):
+                    self._ring_bytes -= len(self._ring.popleft()[1])
+                if self._pending is not None:
+                    self._pending.packets.append(packet)
+            self.frames_buffered += 1
+            self._flush_if_done(timestamp)
+
+    def _flush_if_done(self, now: float):
+        with self._lock:
+            if self._pending is None or now < self._pending.until:
+                return
+            pending, self._pending = self._pending, None
+        _WRITER_POOL.submit(self._write_clip, pending)
+
+    def _write_clip(self, clip: _PendingClip):
+        """
+        Escribe el mp4 en el hilo de escritura compartido. Nadie espera el resultado del
+        pool, así que los errores (disco lleno, JPEG ilegible...) se cuentan y registran aquí.
+        """
+        # Escribimos a un archivo temporal para que nadie lea un mp4 a medias
+        temp_path = clip.path[:-len(".mp4")] + ".part.mp4"
+        try:
+            self._encode(clip, temp_path)
+            os.replace(temp_path, clip.path)
+        except Exception as e:
+            self.clips_failed += 1
+            print(f"[Cámara {self.camera_id}]: Error: No se pudo guardar el clip {clip.path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        self.clips_written += 1
+        self.last_clip = clip.path
+        print(f"[Cámara {self.camera_id}]: Clip guardado en {clip.path} ({len(clip.packets)} frames)")
+
+    @staticmethod
+    def _decode(data: bytes) -> np.ndarray:
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("frame JPEG ilegible")
+        return frame
+
+    def _encode(self, clip: _PendingClip, temp_path: str):
+        """Decodifica los paquetes y los codifica en `temp_path`."""
+        if not clip.packets:
+            raise ValueError("el clip no tiene frames")
+
+        height, width = self._decode(clip.packets[0][1]).shape[:2]
+        duration = clip.packets[-1][0] - clip.packets[0][0]
+        fps = (len(clip.packets) - 1) / duration if duration > 0 else self.fps
+        fps = min(max(fps, 1.0), 30.0)
+
+        writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        if not writer.isOpened():
+            raise RuntimeError("no se pudo crear el archivo de video")
+        try:
+            for _, data in clip.packets:
+                frame = self._decode(data)
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height))
+                writer.write(frame)
+        finally:
+            writer.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered_seconds = self._ring[-1][0] - self._ring[0][0] if len(self._ring) > 1 else 0.0
+            return {
+                "buffer_frames": len(self._ring),
+                "buffer_bytes": self._ring_bytes,
+                "buffer_seconds": round(buffered_seconds, 1),
+                "recording": self._pending is not None,
+                "frames_buffered": self.frames_buffered,
+                "frames_dropped": self.frames_dropped,
+                "clips_triggered": self.clips_triggered,
+                "clips_written": self.clips_written,
+                "clips_failed": self.clips_failed,
+                "last_clip": self.last_clip,
+            }
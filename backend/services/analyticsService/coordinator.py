@@ -0,0 +1,538 @@
+"""
+Coordinador de un clúster de nodos de análisis.
+
+Expone el mismo contrato que un nodo (/analyze y /stop-analyze), así que quien llama
+no cambia: solo apunta al coordinador. Cada nodo es un `main.py` normal arrancado con
+COORDINATOR_URL y NODE_URL; se registra solo y reporta su carga (CPU, ms de inferencia,
+fps logrados, frames en cola) cada pocos segundos.
+
+Las cámaras se reparten con hashing consistente ponderado por la capacidad de cada nodo
+y con un límite de cámaras por nodo (bounded loads). Un ciclo de rebalanceo mueve cámaras
+en vivo (primero se inician en el destino y luego se detienen en el origen) cuando un nodo
+deja de reportar, se drena o queda sobrecargado.
+
+Uso (desde analyticsService/):
+    uvicorn coordinator:app --port 8000
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+import requests
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.middleware.cors import CORSMiddleware
+
+from camera_registry import CameraRegistry
+from placement import HashRing, choose_node, load_bounds
+
+# --- Configuración ---
+NODE_TIMEOUT_S = float(os.getenv("NODE_TIMEOUT_S", "10"))  # Sin reportes en este tiempo = nodo caído
+REBALANCE_INTERVAL_S = float(os.getenv("REBALANCE_INTERVAL_S", "5"))
+MAX_MOVES_PER_ROUND = int(os.getenv("MAX_MOVES_PER_ROUND", "2"))  # Movimientos por carga en cada ciclo
+MOVE_COOLDOWN_S = float(os.getenv("MOVE_COOLDOWN_S", "60"))  # Una cámara movida por carga no se vuelve a mover antes
+BALANCE_FACTOR = float(os.getenv("BALANCE_FACTOR", "1.25"))  # Margen sobre la parte proporcional de cada nodo
+
+# Umbrales de sobrecarga sobre la carga reportada (basta con superar uno)
+OVERLOAD_CPU = float(os.getenv("OVERLOAD_CPU", "0.9"))  # Carga del sistema por núcleo (loadavg de 1 min)
+OVERLOAD_INFERENCE_MS = float(os.getenv("OVERLOAD_INFERENCE_MS", "250"))  # Cómputo por frame
+OVERLOAD_PENDING = int(os.getenv("OVERLOAD_PENDING", "16"))  # Frames esperando inferencia
+
+NODE_REQUEST_TIMEOUT_S = float(os.getenv("NODE_REQUEST_TIMEOUT_S", "30"))  # /analyze puede esperar al relay
+COORDINATOR_REGISTRY_PATH = os.getenv(
+    "COORDINATOR_REGISTRY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "coordinator_registry.db")
+)
+
+app = FastAPI(title="Analytics Coordinator API", version="1.0.0")
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+class CameraRequest(BaseModel):
+    # Igual que en main.py; las zonas se validan en el nodo
+    camera_id: int
+    rtsp_url: str
+    stream_name: Optional[str] = None
+    analysis_url: Optional[str] = None
+    zones: Optional[list] = None
+
+
+class NodeReport(BaseModel):
+    node_id: str
+    url: str
+    capacity: float = 1.0
+    ready: bool = True
+    cameras: List[int] = []
+    load: dict = {}
+
+
+class Node:
+    """Estado de un nodo de análisis según sus últimos reportes."""
+
+    def __init__(self, node_id: str, url: str, capacity: float):
+        self.node_id = node_id
+        self.url = url.rstrip("/")
+        self.capacity = capacity
+        self.ready = False
+        self.load = {}
+        self.cameras = set()  # Cámaras que el nodo dice tener activas
+        self.draining = False
+        self.last_seen = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return time.monotonic() - self.last_seen < NODE_TIMEOUT_S
+
+    def pressure(self) -> float:
+        """Carga relativa al umbral más cercano: >= 1 es sobrecarga."""
+        load = self.load
+        return max(
+            (load.get("cpu") or 0.0) / OVERLOAD_CPU,
+            (load.get("inference_ms") or 0.0) / OVERLOAD_INFERENCE_MS,
+            (load.get("pending") or 0) / OVERLOAD_PENDING,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "node_id": self.node_id,
+            "url": self.url,
+            "capacity": self.capacity,
+            "alive": self.alive,
+            "ready": self.ready,
+            "draining": self.draining,
+            "pressure": round(self.pressure(), 3),
+            "load": self.load,
+            "last_seen_s": round(time.monotonic() - self.last_seen, 1),
+        }
+
+
+# --- Estado del coordinador ---
+nodes: Dict[str, Node] = {}
+cameras: Dict[int, dict] = {}        # Configuración de cada cámara (lo que llegó a /analyze)
+assignments: Dict[int, str] = {}     # Cámara -> nodo que la analiza
+assigned_at: Dict[int, float] = {}
+moved_at: Dict[int, float] = {}      # Último movimiento por carga (para el enfriamiento)
+camera_locks: Dict[int, asyncio.Lock] = {}
+moves_total: Dict[str, int] = {}     # Movimientos por motivo
+ring = HashRing()
+registry = CameraRegistry(COORDINATOR_REGISTRY_PATH)
+rebalance_task = None
+started_at = time.monotonic()
+
+
+def camera_lock(camera_id: int) -> asyncio.Lock:
+    """Serializa las operaciones sobre una misma cámara (inicio, parada, movimiento)."""
+    return camera_locks.setdefault(camera_id, asyncio.Lock())
+
+
+def placeable_nodes() -> dict:
+    """{ nodo: capacidad } de los nodos vivos, con el modelo cargado, que aceptan cámaras."""
+    return {node_id: node.capacity for node_id, node in nodes.items()
+            if node.alive and node.ready and not node.draining}
+
+
+def camera_counts() -> dict:
+    counts = {}
+    for node_id in assignments.values():
+        counts[node_id] = counts.get(node_id, 0) + 1
+    return counts
+
+
+def overloaded_nodes() -> set:
+    return {node_id for node_id, node in nodes.items() if node.pressure() >= 1}
+
+
+def node_post(node: Node, path: str, body: dict) -> requests.Response:
+    return requests.post(f"{node.url}{path}", json=body, timeout=NODE_REQUEST_TIMEOUT_S)
+
+
+async def start_on(camera_id: int, node_id: str) -> bool:
+    """
+    Inicia la cámara en un nodo. Retorna False si el nodo no respondió o falló por su
+    lado (se puede probar con otro); un error de la petición (4xx) se propaga.
+    """
+    node = nodes[node_id]
+    try:
+        response = await asyncio.to_thread(node_post, node, "/analyze", cameras[camera_id])
+    except requests.RequestException as e:
+        print(f"Advertencia: El nodo {node_id} no respondió al iniciar la cámara {camera_id}: {e}")
+        return False
+    if response.status_code == status.HTTP_409_CONFLICT or response.ok:
+        return True  # 409: ya la estaba analizando
+    if response.status_code < 500:
+        try:
+            detail = response.json().get("detail")
+        except ValueError:
+            detail = response.text
+        raise HTTPException(status_code=response.status_code, detail=detail)
+    print(f"Advertencia: El nodo {node_id} no pudo iniciar la cámara {camera_id} ({response.status_code}).")
+    return False
+
+
+async def stop_on(camera_id: int, node_id: str):
+    """Detiene la cámara en un nodo (si el nodo no responde, ya no la está analizando o dejó de reportar)."""
+    node = nodes.get(node_id)
+    if node is None:
+        return
+    try:
+        await asyncio.to_thread(node_post, node, "/stop-analyze", {"camera_id": camera_id, "rtsp_url": ""})
+    except requests.RequestException as e:
+        print(f"Advertencia: El nodo {node_id} no respondió al detener la cámara {camera_id}: {e}")
+    node.cameras.discard(camera_id)
+
+
+def plan_target(camera_id: int, counts: dict, exclude=()) -> Optional[str]:
+    weights = placeable_nodes()
+    ring.set_nodes(weights)
+    bounds = load_bounds(weights, max(len(cameras), 1), BALANCE_FACTOR)
+    return choose_node(ring, camera_id, counts, bounds, overloaded_nodes(), exclude)
+
+
+async def place_camera(camera_id: int, exclude=()) -> Optional[str]:
+    """Elige un nodo y arranca la cámara allí; si falla, prueba con el siguiente."""
+    exclude = set(exclude)
+    while True:
+        node_id = plan_target(camera_id, camera_counts(), exclude)
+        if node_id is None:
+            return None
+        if await start_on(camera_id, node_id):
+            assignments[camera_id] = node_id
+            assigned_at[camera_id] = time.monotonic()
+            nodes[node_id].cameras.add(camera_id)
+            return node_id
+        exclude.add(node_id)
+
+
+async def move_camera(camera_id: int, target: str, reason: str) -> bool:
+    """
+    Mueve una cámara en vivo: se inicia en `target` y, si arrancó, se detiene en el nodo
+    anterior (así no queda sin análisis mientras tanto).
+    """
+    async with camera_lock(camera_id):
+        if camera_id not in cameras:
+            return False  # Se detuvo mientras se planificaba
+        source = assignments.get(camera_id)
+        try:
+            started = await start_on(camera_id, target)
+        except HTTPException as e:
+            print(f"Error: El nodo {target} rechazó la cámara {camera_id}: {e.detail}")
+            started = False
+        if not started:
+            if source is not None and not (nodes.get(source) and nodes[source].alive):
+                assignments.pop(camera_id, None)  # Sin nodo: se vuelve a intentar en el próximo ciclo
+            return False
+
+        assignments[camera_id] = target
+        assigned_at[camera_id] = time.monotonic()
+        nodes[target].cameras.add(camera_id)
+        if reason in ("overloaded", "over_bound"):
+            moved_at[camera_id] = time.monotonic()
+        moves_total[reason] = moves_total.get(reason, 0) + 1
+        if source is not None and source != target and nodes.get(source) and nodes[source].alive:
+            await stop_on(camera_id, source)
+        print(f"Cámara {camera_id} movida de {source or '-'} a {target} ({reason}).")
+        return True
+
+
+async def rebalance() -> list:
+    """
+    Un ciclo de rebalanceo. Retorna los movimientos planificados [(cámara, origen, destino, motivo)].
+      1. Cámaras de nodos caídos o drenándose: se mueven todas (a la vez).
+      2. Cámaras sin nodo (no había nodos o el coordinador se reinició y nadie las adoptó).
+      3. Cámaras que su nodo ya no reporta (el nodo se reinició): se vuelven a iniciar allí.
+      4. Nodos sobrecargados o por encima de su límite ceden hasta MAX_MOVES_PER_ROUND cámaras,
+         empezando por las que el anillo asigna a otro nodo (vuelven "a casa").
+    Al final se detienen las copias que un nodo analiza sin que le correspondan.
+    """
+    now = time.monotonic()
+    counts = camera_counts()
+    plan = []
+
+    def add(camera_id, reason, exclude=()):
+        source = assignments.get(camera_id)
+        target = plan_target(camera_id, counts, exclude)
+        if target is None:
+            return False
+        if source is not None:
+            counts[source] = counts.get(source, 1) - 1
+        counts[target] = counts.get(target, 0) + 1
+        plan.append((camera_id, source, target, reason))
+        return True
+
+    for camera_id, node_id in list(assignments.items()):
+        node = nodes.get(node_id)
+        if node is None or not node.alive:
+            add(camera_id, "node_down", {node_id})
+        elif node.draining:
+            add(camera_id, "draining", {node_id})
+
+    if now - started_at >= NODE_TIMEOUT_S:  # Antes, los nodos aún pueden adoptarlas al reportar
+        for camera_id in cameras:
+            if camera_id not in assignments:
+                add(camera_id, "unassigned")
+
+    planned = {camera_id for camera_id, _, _, _ in plan}
+    for camera_id, node_id in list(assignments.items()):
+        node = nodes.get(node_id)
+        if camera_id in planned or node is None or not node.alive or node.draining:
+            continue
+        if camera_id not in node.cameras and now - assigned_at.get(camera_id, now) > NODE_TIMEOUT_S:
+            plan.append((camera_id, node_id, node_id, "lost"))
+            planned.add(camera_id)
+
+    weights = placeable_nodes()
+    bounds = load_bounds(weights, max(len(cameras), 1), BALANCE_FACTOR)
+    overloaded = overloaded_nodes()
+    budget = MAX_MOVES_PER_ROUND
+    for node_id in sorted(weights, key=lambda node_id: -nodes[node_id].pressure()):
+        excess = counts.get(node_id, 0) - bounds.get(node_id, 0)
+        reason = "over_bound"
+        if node_id in overloaded:
+            excess, reason = max(excess, 1), "overloaded"
+        if excess <= 0 or budget <= 0:
+            continue
+        movable = [camera_id for camera_id, owner in assignments.items()
+                   if owner == node_id and camera_id not in planned
+                   and now - moved_at.get(camera_id, -MOVE_COOLDOWN_S) >= MOVE_COOLDOWN_S]
+        movable.sort(key=lambda camera_id: ring.owner(camera_id) == node_id)
+        for camera_id in movable[:min(excess, budget)]:
+            target = plan_target(camera_id, counts, {node_id})
+            # Solo se mueve si el destino queda mejor que el origen
+            if target is None or target in overloaded or counts.get(target, 0) >= bounds.get(target, 0):
+                break
+            counts[node_id] -= 1
+            counts[target] = counts.get(target, 0) + 1
+            plan.append((camera_id, node_id, target, reason))
+            planned.add(camera_id)
+            budget -= 1
+
+    if plan:
+        await asyncio.gather(*(move_camera(camera_id, target, reason) for camera_id, _, target, reason in plan))
+    await stop_strays()
+    return plan
+
+
+def is_stray(camera_id: int, node_id: str) -> bool:
+    """
+    Si un nodo analiza una cámara que no le corresponde: otro nodo ya la tiene (quedó
+    duplicada) o ya no está registrada (se detuvo mientras el nodo no respondía).
+    """
+    owner = assignments.get(camera_id)
+    if camera_id not in cameras:
+        return time.monotonic() - started_at >= NODE_TIMEOUT_S  # Antes puede faltar el registro
+    return owner is not None and owner != node_id and nodes.get(owner) is not None and camera_id in nodes[owner].cameras
+
+
+async def stop_strays():
+    strays = [(camera_id, node_id) for node_id, node in list(nodes.items()) if node.alive
+              for camera_id in list(node.cameras) if is_stray(camera_id, node_id)]
+    for camera_id, node_id in strays:
+        async with camera_lock(camera_id):
+            if is_stray(camera_id, node_id):
+                print(f"Deteniendo la cámara {camera_id} en {node_id}: no le corresponde.")
+                await stop_on(camera_id, node_id)
+
+
+async def rebalance_loop():
+    while True:
+        await asyncio.sleep(REBALANCE_INTERVAL_S)
+        try:
+            await rebalance()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error en el ciclo de rebalanceo: {e}")
+
+
+# --- Ciclo de vida ---
+@app.on_event("startup")
+async def startup_event():
+    """Carga las cámaras registradas; los nodos las adoptan al reportar o se reubican."""
+    global rebalance_task
+    for key, config in registry.load().items():
+        cameras[int(key)] = config
+    print(f"Coordinador iniciado con {len(cameras)} cámaras registradas.")
+    rebalance_task = asyncio.create_task(rebalance_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Los nodos siguen analizando: al volver, el coordinador adopta sus cámaras."""
+    if rebalance_task is not None:
+        rebalance_task.cancel()
+    registry.close()
+
+
+# --- Endpoints (mismo contrato que un nodo) ---
+@app.post("/analyze")
+async def start_analysis(request: CameraRequest):
+    """Inicia el análisis de una cámara en el nodo que le corresponde."""
+    camera_id = request.camera_id
+    async with camera_lock(camera_id):
+        if camera_id in assignments:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="El análisis para esta cámara ya está en ejecución."
+            )
+        cameras[camera_id] = request.model_dump()
+        try:
+            node_id = await place_camera(camera_id)
+        except HTTPException:
+            cameras.pop(camera_id, None)
+            raise
+        if node_id is None:
+            cameras.pop(camera_id, None)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="No hay nodos de análisis disponibles."
+            )
+        registry.save(camera_id, cameras[camera_id])
+
+    print(f"Análisis iniciado para cámara {camera_id} en el nodo {node_id}.")
+    return {"status": "success", "message": f"Análisis iniciado para la cámara {camera_id}.", "node": node_id}
+
+
+@app.post("/stop-analyze")
+async def stop_analysis(request: CameraRequest):
+    """Detiene el análisis de una cámara (en el nodo que la tenga)."""
+    camera_id = request.camera_id
+    async with camera_lock(camera_id):
+        known = cameras.pop(camera_id, None)
+        registry.remove(camera_id)
+        node_id = assignments.pop(camera_id, None)
+        assigned_at.pop(camera_id, None)
+        moved_at.pop(camera_id, None)
+        if known is None and node_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No se encontró ningún análisis activo para esta cámara."
+            )
+        if node_id is not None:
+            await stop_on(camera_id, node_id)
+
+    print(f"Análisis detenido para cámara {camera_id}.")
+    return {"status": "success", "message": f"Análisis detenido para la cámara {camera_id}."}
+
+
+@app.api_route("/analyze/{camera_id}/{resource}", methods=["GET", "PUT"])
+async def proxy_camera(camera_id: int, resource: str, request: Request):
+    """Reenvía las consultas y ajustes de una cámara (stats, rate, zones) a su nodo."""
+    node = nodes.get(assignments.get(camera_id))
+    if node is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No se encontró ningún análisis activo para esta cámara."
+        )
+    body = await request.json() if request.method == "PUT" else None
+    try:
+        response = await asyncio.to_thread(
+            requests.request, request.method, f"{node.url}/analyze/{camera_id}/{resource}",
+            json=body, params=dict(request.query_params), timeout=NODE_REQUEST_TIMEOUT_S
+        )
+    except requests.RequestException as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"El nodo {node.node_id} no respondió: {e}")
+    if request.method == "PUT" and resource == "zones" and response.ok and camera_id in cameras:
+        # Las zonas viajan con la cámara si se mueve a otro nodo
+        cameras[camera_id] = {**cameras[camera_id], "zones": (body or {}).get("zones") or None}
+        registry.save(camera_id, cameras[camera_id])
+    try:
+        content = response.json()
+    except ValueError:
+        content = {"detail": response.text}
+    if isinstance(content, dict):
+        content.setdefault("node", node.node_id)
+    return JSONResponse(status_code=response.status_code, content=content)
+
+
+# --- Nodos ---
+@app.post("/nodes/heartbeat")
+async def node_heartbeat(report: NodeReport):
+    """Registro y reporte periódico de carga de un nodo."""
+    node = nodes.get(report.node_id)
+    if node is None or node.url != report.url.rstrip("/"):
+        node = Node(report.node_id, report.url, report.capacity)
+        nodes[report.node_id] = node
+        print(f"Nodo {report.node_id} registrado ({report.url}, capacidad {report.capacity}).")
+    elif not node.alive:
+        print(f"Nodo {report.node_id} volvió a reportar.")
+    node.last_seen = time.monotonic()
+    node.capacity = report.capacity
+    node.ready = report.ready
+    node.load = report.load
+    node.cameras = set(report.cameras)
+
+    # Adopción: cámaras conocidas sin nodo que ya corren aquí (p.ej. tras reiniciar el coordinador)
+    for camera_id in report.cameras:
+        if camera_id in cameras and camera_id not in assignments:
+            assignments[camera_id] = report.node_id
+            assigned_at[camera_id] = time.monotonic()
+
+    assigned = sorted(camera_id for camera_id, node_id in assignments.items() if node_id == report.node_id)
+    return {"status": "ok", "assigned": assigned}
+
+
+@app.post("/nodes/{node_id}/drain")
+async def drain_node(node_id: str, enabled: bool = True):
+    """Saca (o devuelve) un nodo del reparto; sus cámaras se mueven en el próximo ciclo."""
+    node = nodes.get(node_id)
+    if node is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Nodo '{node_id}' no encontrado.")
+    node.draining = enabled
+    return {"node": node.to_dict(), "cameras": sum(1 for owner in assignments.values() if owner == node_id)}
+
+
+@app.post("/rebalance")
+async def rebalance_now():
+    """Ejecuta un ciclo de rebalanceo sin esperar al siguiente."""
+    plan = await rebalance()
+    return {"moves": [{"camera_id": camera_id, "from": source, "to": target, "reason": reason}
+                      for camera_id, source, target, reason in plan]}
+
+
+@app.get("/nodes")
+async def list_nodes():
+    """Nodos, su carga reportada y cuántas cámaras tienen asignadas."""
+    counts = camera_counts()
+    weights = placeable_nodes()
+    bounds = load_bounds(weights, max(len(cameras), 1), BALANCE_FACTOR)
+    return {
+        "nodes": [{**node.to_dict(), "cameras": counts.get(node_id, 0), "bound": bounds.get(node_id)}
+                  for node_id, node in nodes.items()],
+        "cameras": len(cameras),
+        "unassigned": sorted(camera_id for camera_id in cameras if camera_id not in assignments),
+        "moves": dict(moves_total),
+    }
+
+
+@app.get("/cameras")
+async def list_cameras():
+    """Cámaras registradas y el nodo que analiza cada una."""
+    return {"cameras": [{**config, "node": assignments.get(camera_id)} for camera_id, config in cameras.items()]}
+
+
+@app.get("/health/live")
+async def health_live():
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """Listo si hay al menos un nodo vivo y con el modelo cargado al que asignar cámaras."""
+    alive = placeable_nodes()
+    body = {"status": "ready" if alive else "no_nodes", "nodes": len(alive)}
+    if not alive:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return body
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
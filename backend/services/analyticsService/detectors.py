@@ -0,0 +1,336 @@
+import os
+import time
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+CLASS_ID_PERSON = 0  # La clase 0 en COCO es "person"
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+DEFAULT_PT_MODEL = os.path.join(RESOURCES_DIR, "yolov8n.pt")
+DEFAULT_ONNX_MODEL = os.path.join(RESOURCES_DIR, "yolov8n.onnx")
+DEFAULT_ONNX_INT8_MODEL = os.path.join(RESOURCES_DIR, "yolov8n.int8.onnx")
+DEFAULT_ONNX_SMALL_MODEL = os.path.join(RESOURCES_DIR, "yolov8n_320.onnx")  # Entrada 320×320 (primera etapa)
+DEFAULT_OPENVINO_MODEL = os.path.join(RESOURCES_DIR, "yolov8n_openvino_model")
+DEFAULT_HAAR_MODEL = os.path.join(RESOURCES_DIR, "haarcascade_frontalface_default.xml")
+DEFAULT_SSD_PROTOTXT = os.path.join(RESOURCES_DIR, "deploy.prototxt.txt")
+DEFAULT_SSD_MODEL = os.path.join(RESOURCES_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+
+
+@dataclass
+class Detections:
+    """Detecciones de un frame como arreglos contiguos (sin objetos por caja)."""
+
+    boxes: np.ndarray        # (N, 4) float32: x1, y1, x2, y2 en píxeles del frame
+    confidences: np.ndarray  # (N,) float32
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @classmethod
+    def empty(cls) -> "Detections":
+        return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32))
+
+
+class DetectorBackend:
+    """
+    Interfaz común de los detectores de personas.
+
+    `detect(frames)` recibe una lista de frames BGR y retorna un `Detections` por frame.
+    Las instancias son invocables para que el `InferenceScheduler` pueda usarlas
+    igual que a un modelo.
+    """
+
+    name = "base"
+
+    def __init__(self, conf: float = 0.6):
+        self.conf = conf
+        self.warmup_latency_ms = None
+        self._latency = None  # EWMA de milisegundos por frame en producción
+        self._frames = 0
+
+    def _detect(self, frames: list) -> list:
+        raise NotImplementedError
+
+    def detect(self, frames: list) -> list:
+        start = time.perf_counter()
+        results = self._detect(frames)
+        per_frame = (time.perf_counter() - start) * 1000 / max(1, len(frames))
+        self._latency = per_frame if self._latency is None else 0.9 * self._latency + 0.1 * per_frame
+        self._frames += len(frames)
+        return results
+
+    __call__ = detect
+
+    def warmup(self, runs: int = 3, shape=(384, 640, 3)) -> float:
+        """Ejecuta inferencias de prueba (reserva memoria, compila kernels) y mide la latencia por frame."""
+        frame = np.zeros(shape, dtype=np.uint8)
+        self._detect([frame])  # La primera suele ser mucho más lenta: no la medimos
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            self._detect([frame])
+        self.warmup_latency_ms = (time.perf_counter() - start) * 1000 / runs
+        return self.warmup_latency_ms
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "conf": self.conf,
+            "warmup_latency_ms": round(self.warmup_latency_ms, 2) if self.warmup_latency_ms is not None else None,
+            "latency_ms": round(self._latency, 2) if self._latency is not None else None,
+            "frames": self._frames,
+        }
+
+
+class UltralyticsDetector(DetectorBackend):
+    """YOLO a través de ultralytics (PyTorch o un modelo exportado a OpenVINO)."""
+
+    name = "ultralytics"
+
+    def __init__(self, model_path: str = DEFAULT_PT_MODEL, conf: float = 0.6, name: str = None):
+        super().__init__(conf)
+        # Importación diferida: ultralytics arrastra torch, que solo necesita este backend
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        if name is not None:
+            self.name = name
+
+    def _detect(self, frames: list) -> list:
+        results = self.model(frames, classes=[CLASS_ID_PERSON], conf=self.conf, verbose=False)
+
+        detections = []
+        for result in results:
+            # Una sola copia tensor -> NumPy por frame: (N, 6) = x1, y1, x2, y2, conf, clase
+            data = result.boxes.data.cpu().numpy()
+            detections.append(Detections(
+                np.ascontiguousarray(data[:, :4], dtype=np.float32),
+                np.ascontiguousarray(data[:, 4], dtype=np.float32)
+            ))
+        return detections
+
+
+class OnnxRuntimeDetector(DetectorBackend):
+    """
+    YOLOv8 exportado a ONNX y ejecutado con onnxruntime en CPU.
+    Evita cargar torch y permite fijar el número de hilos intra-op.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str = DEFAULT_ONNX_MODEL, conf: float = 0.6, iou: float = 0.45,
+                 threads: int = None, name: str = None):
+        super().__init__(conf)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads:
+            options.intra_op_num_threads = threads
+
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.imgsz = model_input.shape[2] if isinstance(model_input.shape[2], int) else 640
+        # Los modelos exportados sin `dynamic=True` solo aceptan lotes de 1
+        self.fixed_batch = isinstance(model_input.shape[0], int)
+        self.iou = iou
+        self.threads = threads
+        if name is not None:
+            self.name = name
+
+    def _letterbox(self, frame: np.ndarray):
+        """Redimensiona manteniendo proporción y rellena hasta imgsz×imgsz (como ultralytics)."""
+        height, width = frame.shape[:2]
+        ratio = min(self.imgsz / height, self.imgsz / width)
+        new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+        pad_x, pad_y = (self.imgsz - new_w) / 2, (self.imgsz - new_h) / 2
+
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+        canvas[top:top + new_h, left:left + new_w] = resized
+        return canvas, ratio, (left, top)
+
+    def _postprocess(self, output: np.ndarray, ratio: float, pad) -> Detections:
+        # output: (84, N) -> cx, cy, w, h + 80 puntuaciones de clase
+        scores = output[4 + CLASS_ID_PERSON]
+        keep = scores >= self.conf
+        if not keep.any():
+            return Detections.empty()
+
+        cx, cy, w, h = output[:4, keep]
+        scores = scores[keep]
+        boxes_xywh = np.stack([cx - w / 2, cy - h / 2, w, h], axis=1)
+        indices = cv2.dnn.NMSBoxes(boxes_xywh.tolist(), scores.tolist(), self.conf, self.iou)
+        indices = np.array(indices, dtype=np.int64).reshape(-1)
+
+        boxes = boxes_xywh[indices]
+        boxes[:, 2:] += boxes[:, :2]
+        boxes[:, [0, 2]] -= pad[0]
+        boxes[:, [1, 3]] -= pad[1]
+        boxes /= ratio
+        return Detections(boxes.astype(np.float32), scores[indices].astype(np.float32))
+
+    def _detect(self, frames: list) -> list:
+        prepared = [self._letterbox(frame) for frame in frames]
+        blob = np.stack([canvas for canvas, _, _ in prepared])
+        blob = np.ascontiguousarray(blob[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+        if self.fixed_batch:
+            outputs = np.concatenate([self.session.run(None, {self.input_name: blob[i:i + 1]})[0]
+                                      for i in range(len(frames))])
+        else:
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+
+        return [self._postprocess(output, ratio, pad) for output, (_, ratio, pad) in zip(outputs, prepared)]
+
+    def stats(self) -> dict:
+        return {**super().stats(), "intra_op_threads": self.threads, "imgsz": self.imgsz}
+
+
+class HaarCascadeDetector(DetectorBackend):
+    """
+    Detector clásico de OpenCV (Haar cascade). Con el modelo por defecto detecta
+    rostros frontales, no personas: sirve como referencia de costo mínimo y como
+    etapa barata de una cascada. No produce confianza (se reporta 1.0).
+    """
+
+    name = "haar"
+
+    def __init__(self, model_path: str = DEFAULT_HAAR_MODEL, scale_factor: float = 1.1, min_neighbors: int = 5,
+                 min_size: int = 30):
+        super().__init__(conf=1.0)
+        if not hasattr(cv2, "CascadeClassifier"):
+            # OpenCV 5 movió los Haar cascades a opencv-contrib
+            raise RuntimeError("Esta versión de OpenCV no incluye CascadeClassifier (usar opencv 4.x o contrib).")
+        self.classifier = cv2.CascadeClassifier(model_path)
+        if self.classifier.empty():
+            raise RuntimeError(f"No se pudo cargar el clasificador Haar: {model_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = (min_size, min_size)
+
+    def _detect(self, frames: list) -> list:
+        detections = []
+        for frame in frames:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            found = self.classifier.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                                     minNeighbors=self.min_neighbors, minSize=self.min_size)
+            if len(found) == 0:
+                detections.append(Detections.empty())
+                continue
+            boxes = np.asarray(found, dtype=np.float32)
+            boxes[:, 2:] += boxes[:, :2]  # x, y, w, h -> x1, y1, x2, y2
+            detections.append(Detections(boxes, np.ones(len(boxes), dtype=np.float32)))
+        return detections
+
+
+class CaffeSsdDetector(DetectorBackend):
+    """
+    SSD ResNet-10 (Caffe, 300×300) con el módulo DNN de OpenCV. Con el modelo por
+    defecto detecta rostros. Procesa el lote completo en una sola pasada.
+    """
+
+    name = "ssd"
+
+    def __init__(self, prototxt_path: str = DEFAULT_SSD_PROTOTXT, model_path: str = DEFAULT_SSD_MODEL,
+                 conf: float = 0.5, input_size: int = 300):
+        super().__init__(conf)
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"No se encontró el modelo SSD: {model_path}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+        self.input_size = input_size
+
+    def _detect(self, frames: list) -> list:
+        blob = cv2.dnn.blobFromImages(frames, 1.0, (self.input_size, self.input_size), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        # (1, 1, N, 7): image_id, label, conf, x1, y1, x2, y2 (normalizados)
+        output = self.net.forward()[0, 0]
+        output = output[output[:, 2] >= self.conf]
+
+        detections = []
+        for index, frame in enumerate(frames):
+            rows = output[output[:, 0] == index]
+            height, width = frame.shape[:2]
+            boxes = np.clip(rows[:, 3:7], 0, 1) * np.array([width, height, width, height], dtype=np.float32)
+            detections.append(Detections(np.ascontiguousarray(boxes, dtype=np.float32),
+                                         np.ascontiguousarray(rows[:, 2], dtype=np.float32)))
+        return detections
+
+
+def export_onnx_model(pt_path: str = DEFAULT_PT_MODEL, onnx_path: str = DEFAULT_ONNX_MODEL, imgsz: int = 640) -> str:
+    """Exporta el modelo PyTorch a ONNX (con lote dinámico). Solo hace falta una vez por modelo."""
+    from ultralytics import YOLO
+
+    exported = YOLO(pt_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+
+def quantize_onnx_model(onnx_path: str = DEFAULT_ONNX_MODEL, int8_path: str = DEFAULT_ONNX_INT8_MODEL) -> str:
+    """Genera una variante INT8 (cuantización dinámica de pesos) del modelo ONNX."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+def create_detector(backend: str = "ultralytics", model_path: str = None, conf: float = 0.6,
+                    threads: int = None) -> DetectorBackend:
+    """
+    Construye el detector configurado:
+      "ultralytics" -> yolov8n.pt con PyTorch
+      "openvino"    -> modelo exportado a OpenVINO (cargado por ultralytics)
+      "onnx"        -> yolov8n.onnx con onnxruntime (se exporta si no existe)
+      "onnx-int8"   -> variante cuantizada INT8 (se genera si no existe)
+                       (con `model_path` se usa ese archivo tal cual: no se exporta ni se cuantiza)
+      "onnx-320"    -> yolov8n exportado con entrada de 320×320 (~4 veces más barato; primera etapa de la cascada)
+      "haar"        -> Haar cascade de OpenCV (rostros; referencia de costo mínimo)
+      "ssd"         -> SSD ResNet-10 Caffe con OpenCV DNN (rostros)
+    """
+    if backend == "ultralytics":
+        return UltralyticsDetector(model_path or DEFAULT_PT_MODEL, conf=conf)
+
+    if backend == "openvino":
+        return UltralyticsDetector(model_path or DEFAULT_OPENVINO_MODEL, conf=conf, name="openvino")
+
+    if backend in ("onnx", "onnx-int8"):
+        if model_path is not None:
+            # Solo se generan los modelos por defecto: uno propio tiene que existir
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"No se encontró el modelo para el backend '{backend}': {model_path}")
+            return OnnxRuntimeDetector(model_path, conf=conf, threads=threads, name=backend)
+
+        onnx_path = DEFAULT_ONNX_MODEL
+        if not os.path.exists(onnx_path):
+            print("Exportando el modelo YOLO a ONNX (solo la primera vez)...")
+            export_onnx_model(DEFAULT_PT_MODEL, onnx_path)
+
+        if backend == "onnx":
+            return OnnxRuntimeDetector(onnx_path, conf=conf, threads=threads)
+
+        int8_path = DEFAULT_ONNX_INT8_MODEL
+        if not os.path.exists(int8_path):
+            print("Generando la variante INT8 del modelo ONNX (solo la primera vez)...")
+            quantize_onnx_model(onnx_path, int8_path)
+        return OnnxRuntimeDetector(int8_path, conf=conf, threads=threads, name="onnx-int8")
+
+    if backend == "onnx-320":
+        small_path = model_path or DEFAULT_ONNX_SMALL_MODEL
+        if not os.path.exists(small_path):
+            print("Exportando el modelo YOLO a ONNX con entrada de 320 px (solo la primera vez)...")
+            export_onnx_model(DEFAULT_PT_MODEL, small_path, imgsz=320)
+        return OnnxRuntimeDetector(small_path, conf=conf, threads=threads, name="onnx-320")
+
+    if backend == "haar":
+        return HaarCascadeDetector(model_path or DEFAULT_HAAR_MODEL)
+
+    if backend == "ssd":
+        return CaffeSsdDetector(model_path=model_path or DEFAULT_SSD_MODEL, conf=min(conf, 0.5))
+
+    raise ValueError(f"Backend de detección desconocido: {backend}")
@@ -0,0 +1,311 @@
+import collections
+import subprocess
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class FrameGrabber:
+    """
+    Etapa de captura desacoplada del análisis (un hilo por cámara).
+
+    Lee el stream RTSP continuamente y conserva únicamente el último frame
+    decodificado en un buffer de una sola posición. Si el análisis es más lento
+    que la cámara, los frames intermedios se descartan (y se cuentan) en lugar
+    de acumularse dentro de OpenCV/FFmpeg, por lo que la latencia queda acotada.
+    También gestiona la conexión y la reconexión con la cámara.
+    """
+
+    prescaled = False  # Entrega los frames con la resolución original del stream
+
+    def __init__(self, camera_id: int, rtsp_url: str, stop_event: threading.Event,
+                 reconnect_delay: float = 15.0, max_frame_age: float = 1.0):
+        self.camera_id = camera_id
+        self.rtsp_url = rtsp_url
+        self.stop_event = stop_event
+        self.reconnect_delay = reconnect_delay
+        self.max_frame_age = max_frame_age
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_time = 0.0
+        self._seq = 0
+        self._last_read_seq = 0
+        self._thread = None
+        self._failures = 0  # Intentos de conexión fallidos seguidos
+
+        # Contadores
+        self.connected = False
+        self.frames_grabbed = 0
+        self.frames_dropped = 0  # Sobrescritos antes de que el análisis los leyera
+        self.frames_stale = 0    # Descartados por ser demasiado antiguos al leerlos
+        self.reconnects = 0
+        self.last_frame_age = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"grabber-{self.camera_id}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def join(self, timeout: float = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def read(self, timeout: float = 1.0):
+        """
+        Espera hasta `timeout` segundos por un frame más nuevo que el último leído.
+        Retorna (frame, seq, timestamp) o None si no hay un frame nuevo y reciente.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != self._last_read_seq or self.stop_event.is_set(),
+                                       timeout):
+                return None
+            if self._seq == self._last_read_seq:
+                return None
+
+            self._last_read_seq = self._seq
+            frame, seq, frame_time = self._frame, self._seq, self._frame_time
+
+        age = time.time() - frame_time
+        if age > self.max_frame_age:
+            # El frame se quedó viejo (p.ej. el stream se congeló): no vale la pena analizarlo
+            self.frames_stale += 1
+            return None
+
+        self.last_frame_age = age
+        return frame, seq, frame_time
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "frames_grabbed": self.frames_grabbed,
+            "frames_dropped": self.frames_dropped,
+            "frames_stale": self.frames_stale,
+            "reconnects": self.reconnects,
+            "last_frame_age_ms": round(self.last_frame_age * 1000, 1),
+        }
+
+    def _retry_delay(self) -> float:
+        """
+        Espera antes del siguiente intento: 1, 2, 4... segundos hasta `reconnect_delay`.
+        Tras un reinicio las cámaras (o el relay) suelen estar disponibles en segundos;
+        esperar de entrada el máximo retrasaría la cobertura sin necesidad.
+        """
+        delay = min(self.reconnect_delay, 2.0 ** self._failures)
+        self._failures += 1
+        return delay
+
+    def _publish(self, frame):
+        with self._cond:
+            if self._seq != self._last_read_seq:
+                # El frame anterior nunca llegó a analizarse
+                self.frames_dropped += 1
+            self._frame = frame
+            self._frame_time = time.time()
+            self._seq += 1
+            self.frames_grabbed += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        # Bucle "Supervisor": mientras no nos digan que paremos, intentamos conectarnos.
+        while not self.stop_event.is_set():
+            cap = cv2.VideoCapture(self.rtsp_url)
+
+            # Reducir buffer para disminuir latencia (el buffer real es el slot de este objeto)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+            if not cap.isOpened():
+                delay = self._retry_delay()
+                print(f"[Cámara {self.camera_id}]: Error al conectar. "
+                      f"Reintentando en {delay:.0f} segundos...")
+                # Espera antes de reintentar para no saturar
+                self.stop_event.wait(delay)
+                continue
+
+            self.connected = True
+            self._failures = 0
+            print(f"[Cámara {self.camera_id}]: Conexión exitosa. Empezando captura...")
+
+            # Bucle "Captura": mientras la cámara esté conectada
+            while not self.stop_event.is_set():
+                ret, frame = cap.read()
+
+                # Si 'ret' es False, perdimos la conexión (cámara apagada, red, etc.)
+                if not ret:
+                    print(f"[Cámara {self.camera_id}]: Stream perdido.")
+                    break
+
+                self._publish(frame)
+
+            cap.release()
+            self.connected = False
+            if not self.stop_event.is_set():
+                self.reconnects += 1
+                print(f"[Cámara {self.camera_id}]: Conexión perdida. Preparando para reconectar.")
+
+        # Despertamos a quien esté esperando un frame para que vea la señal de parada
+        with self._cond:
+            self._cond.notify_all()
+
+
+class FFmpegPipeGrabber(FrameGrabber):
+    """
+    Captura con un único ffmpeg por cámara que decodifica una sola vez:
+
+    - copia el stream original (sin recodificar) a MediaMTX en `relay_url`, para el video en vivo,
+    - y entrega a análisis los frames ya reducidos (`scale`) como BGR crudo por un pipe.
+
+    Así la cámara se abre una sola vez (en vez de una para streamingService y otra para
+    OpenCV) y el redimensionado ocurre dentro de ffmpeg. No debe iniciarse además el
+    mismo stream en streamingService.
+
+    Con `analysis_url` (un substream de baja resolución de la cámara) se decodifica ese
+    stream en lugar del principal, que solo se copia al relay. `width` fija el ancho de
+    los frames entregados (p.ej. el tamaño de entrada del detector) en lugar de `scale`,
+    y `fps` descarta frames dentro de ffmpeg para que lleguen ya a la tasa de análisis.
+    """
+
+    prescaled = True  # ffmpeg ya entrega los frames redimensionados
+
+    def __init__(self, camera_id: int, rtsp_url: str, stop_event: threading.Event,
+                 relay_url: str = None, analysis_url: str = None, scale: float = 0.6,
+                 width: int = None, fps: float = None, reconnect_delay: float = 15.0,
+                 max_frame_age: float = 1.0):
+        super().__init__(camera_id, rtsp_url, stop_event, reconnect_delay, max_frame_age)
+        self.relay_url = relay_url
+        self.analysis_url = analysis_url
+        self.scale = scale
+        self.width = width
+        self.fps = fps
+        self.frame_size = None
+        self._stderr = collections.deque(maxlen=20)
+
+    @property
+    def decode_url(self) -> str:
+        """Stream que se decodifica para el análisis."""
+        return self.analysis_url or self.rtsp_url
+
+    @staticmethod
+    def _input_options(url: str) -> list:
+        # TCP para RTSP (sin pérdida de paquetes); otras fuentes (archivos de prueba) no lo aceptan
+        return ["-rtsp_transport", "tcp"] if url.startswith("rtsp") else []
+
+    def _probe_size(self):
+        """Resolución del stream a decodificar (ancho, alto) con ffprobe, o None si no responde."""
+        try:
+            output = subprocess.run(
+                ["ffprobe", "-v", "error", *self._input_options(self.decode_url), "-select_streams", "v:0",
+                 "-show_entries", "stream=width,height", "-of", "csv=p=0", self.decode_url],
+                capture_output=True, text=True, timeout=self.reconnect_delay
+            ).stdout.strip()
+            width, height = (int(value) for value in output.splitlines()[0].split(",")[:2])
+            return width, height
+        except FileNotFoundError:
+            print(f"[Cámara {self.camera_id}]: Error: ffprobe no está instalado o no está en el PATH.")
+            return None
+        except (subprocess.TimeoutExpired, ValueError, IndexError):
+            return None
+
+    def _output_size(self, source_width: int, source_height: int):
+        """Tamaño de los frames entregados; dimensiones pares (requisito de la mayoría de los formatos)."""
+        scale = self.width / source_width if self.width else self.scale
+        width = max(2, int(source_width * scale) // 2 * 2)
+        height = max(2, int(source_height * scale) // 2 * 2)
+        return width, height
+
+    def _command(self, width: int, height: int) -> list:
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostats"]
+        decode_input = 0
+        if self.relay_url:
+            command += [*self._input_options(self.rtsp_url), "-i", self.rtsp_url]
+            if self.analysis_url:
+                command += [*self._input_options(self.analysis_url), "-i", self.analysis_url]
+                decode_input = 1
+            # Salida 1: el stream original, tal cual, hacia MediaMTX
+            command += ["-map", "0:v:0", "-map", "0:a?", "-c", "copy",
+                        "-f", "rtsp", "-rtsp_transport", "tcp", self.relay_url]
+        else:
+            command += [*self._input_options(self.decode_url), "-i", self.decode_url]
+
+        # Salida 2: frames reducidos (y decimados) en BGR crudo para el análisis
+        filters = [f"fps={self.fps:g}"] if self.fps else []
+        filters.append(f"scale={width}:{height}")
+        command += ["-map", f"{decode_input}:v:0", "-vf", ",".join(filters),
+                    "-pix_fmt", "bgr24", "-f", "rawvideo", "pipe:1"]
+        return command
+
+    def _drain_stderr(self, process):
+        for line in iter(process.stderr.readline, b""):
+            self._stderr.append(line.decode("utf-8", errors="ignore").strip())
+
+    def _stop_on_signal(self, process):
+        """Cierra ffmpeg cuando llega la señal de parada (la lectura del pipe puede estar bloqueada)."""
+        while not self.stop_event.wait(0.5):
+            if process.poll() is not None:
+                return
+        process.terminate()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            size = self._probe_size()
+            if size is None:
+                delay = self._retry_delay()
+                print(f"[Cámara {self.camera_id}]: Error al conectar. "
+                      f"Reintentando en {delay:.0f} segundos...")
+                self.stop_event.wait(delay)
+                continue
+
+            width, height = self._output_size(*size)
+            self.frame_size = (width, height)
+            frame_bytes = width * height * 3
+
+            process = subprocess.Popen(self._command(width, height), stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=frame_bytes)
+            threading.Thread(target=self._drain_stderr, args=(process,), daemon=True).start()
+            threading.Thread(target=self._stop_on_signal, args=(process,), daemon=True).start()
+
+            self.connected = True
+            self._failures = 0
+            print(f"[Cámara {self.camera_id}]: Conexión exitosa (ffmpeg {width}x{height}"
+                  f"{', relay ' + self.relay_url if self.relay_url else ''}). Empezando captura...")
+
+            while not self.stop_event.is_set():
+                # Cada frame es un arreglo nuevo: el anterior puede seguir en uso por el análisis
+                frame = np.empty((height, width, 3), dtype=np.uint8)
+                view = memoryview(frame).cast("B")
+                received = 0
+                while received < frame_bytes:
+                    count = process.stdout.readinto(view[received:])
+                    if not count:
+                        break
+                    received += count
+                if received < frame_bytes:
+                    print(f"[Cámara {self.camera_id}]: Stream perdido. {self._stderr[-1] if self._stderr else ''}")
+                    break
+                self._publish(frame)
+
+            if process.poll() is None:
+                process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            process.stdout.close()
+
+            self.connected = False
+            if not self.stop_event.is_set():
+                self.reconnects += 1
+                print(f"[Cámara {self.camera_id}]: Conexión perdida. Preparando para reconectar.")
+                self.stop_event.wait(min(self.reconnect_delay, 5.0))
+
+        with self._cond:
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "source": "ffmpeg-pipe", "relay_url": self.relay_url,
+                "analysis_url": self.analysis_url, "frame_size": self.frame_size, "fps_limit": self.fps}
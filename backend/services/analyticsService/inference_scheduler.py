@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class InferenceScheduler:
+    """
+    Planificador central de inferencia compartido por todas las cámaras.
+
+    Los hilos de análisis envían sus frames a una cola y un único hilo trabajador
+    los agrupa en micro-lotes dinámicos: espera como máximo `max_wait_ms` a que
+    lleguen más frames (o hasta llenar `max_batch_size`) y ejecuta el modelo una
+    sola vez por lote. Cada cámara recibe su resultado a través de un `Future`.
+    """
+
+    def __init__(self, model, max_batch_size: int = 8, max_wait_ms: float = 10.0, name: str = "inference-scheduler",
+                 **infer_kwargs):
+        self.model = model
+        self.name = name  # Nombre del hilo (hay un planificador por modelo de la cascada)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.infer_kwargs = infer_kwargs
+
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Estadísticas básicas del planificador
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._frames = 0
+        self._inference_time = 0.0
+        self._frame_cost = None  # Media móvil (EWMA) de segundos de cómputo por frame
+
+    def start(self):
+        """Inicia el hilo trabajador (idempotente)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Detiene el hilo trabajador y cancela las peticiones pendientes."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        while True:
+            try:
+                _, _, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            future.cancel()
+
+    def submit(self, frame: np.ndarray, camera_id: int) -> Future:
+        """
+        Encola un frame para inferencia.
+        Retorna un `Future` que se resuelve con el resultado del modelo para ese frame.
+        """
+        future = Future()
+        if self._stop_event.is_set():
+            future.set_exception(RuntimeError("El planificador de inferencia está detenido."))
+            return future
+        self._queue.put((camera_id, frame, future))
+        return future
+
+    def pending(self) -> int:
+        """Número de frames esperando inferencia."""
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._lock:
+            batches = self._batches
+            frames = self._frames
+            inference_time = self._inference_time
+        return {
+            "batches": batches,
+            "frames": frames,
+            "avg_batch_size": frames / batches if batches else 0.0,
+            "avg_batch_ms": (inference_time / batches) * 1000 if batches else 0.0,
+            "frame_cost_ms": self._frame_cost * 1000 if self._frame_cost is not None else None,
+            "pending": self.pending(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    def frame_cost(self):
+        """Segundos de cómputo por frame (medidos sobre los últimos lotes) o None si aún no hay datos."""
+        return self._frame_cost
+
+    def _collect_batch(self):
+        """Bloquea hasta tener al menos un frame y luego completa el lote hasta el tiempo límite."""
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Aprovechamos lo que ya esté en cola sin esperar más
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+
+            # Descartamos peticiones cuyo llamador ya no espera el resultado
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            frames = [frame for _, frame, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = self.model(frames, **self.infer_kwargs)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._batches += 1
+                self._frames += len(batch)
+                self._inference_time += elapsed
+                cost = elapsed / len(batch)
+                self._frame_cost = cost if self._frame_cost is None else 0.8 * self._frame_cost + 0.2 * cost
+
+            results = list(results)
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+            if len(results) < len(batch):
+                # Ningún frame puede quedar sin respuesta: su cámara esperaría para siempre
+                error = RuntimeError(f"El modelo devolvió {len(results)} resultado(s) para un lote de "
+                                     f"{len(batch)} frame(s).")
+                for _, _, future in batch[len(results):]:
+                    future.set_exception(error)
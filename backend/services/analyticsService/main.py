@@ -1,32 +1,311 @@
+import asyncio
 import threading
 import time
 import cv2
 import numpy as np
 import requests
 import os
-from fastapi import FastAPI, HTTPException, status
-from pydantic import BaseModel
+from datetime import datetime
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from starlette.middleware.cors import CORSMiddleware
-from ultralytics import YOLO
+
+from alert_dispatcher import AlertDispatcher
+from cascade import DetectionCascade
+from camera_registry import CameraRegistry
+from annotated_output import AnnotatedFrameHub
+from clip_recorder import ClipRecorder
+from detectors import Detections, create_detector
+from frame_grabber import FFmpegPipeGrabber, FrameGrabber
+from inference_scheduler import InferenceScheduler
+from metrics import REGISTRY, Counter, Histogram, family, merge, render
+from model_loader import ModelLoader
+from motion_gate import MotionGate
+from overlay import draw_boxes
+from rate_controller import CameraRateView, InferenceRateController
+from tracker import PersonTracker
+from process_engine import ProcessAnalysisEngine
+from profiler import SamplingProfiler
+from relay import ensure_relay, relay_url
+from shared_frames import SharedFrameSource
+from zones import ZoneSet
 
 # --- Configuración ---
 
-# Configuración del modelo YOLO
-try:
-    YOLO_MODEL = YOLO('resources/yolov8n.pt')
-    print("Modelo YOLO cargado exitosamente.")
-except Exception as e:
-    print(f"Error al cargar el modelo YOLO: {e}")
-    YOLO_MODEL = None
+# Modo de ejecución de los pipelines de cámara:
+#   "thread"  -> un hilo por cámara dentro de este proceso (por defecto)
+#   "process" -> las cámaras se reparten entre un pool de procesos trabajadores
+ANALYTICS_EXECUTION_MODE = os.getenv("ANALYTICS_EXECUTION_MODE", "thread")
+ANALYTICS_WORKER_PROCESSES = int(os.getenv("ANALYTICS_WORKER_PROCESSES", str(os.cpu_count() or 1)))
+
+# En modo "process", decodificar cada cámara en su propio proceso de captura y pasar
+# los frames al trabajador por memoria compartida (sin copias ni pickling)
+ANALYTICS_CAPTURE_PROCESSES = os.getenv("ANALYTICS_CAPTURE_PROCESSES", "0") == "1"
+SHARED_FRAME_SLOTS = int(os.getenv("SHARED_FRAME_SLOTS", "4"))
+
+# Verdadero dentro de un proceso trabajador del modo "process"
+IS_ANALYTICS_WORKER = "ANALYTICS_WORKER_INDEX" in os.environ
+
+# Configuración del detector YOLO
+#   DETECTOR_BACKEND: "ultralytics" (PyTorch), "onnx", "onnx-int8", "onnx-320", "openvino"
+#                     (o "haar"/"ssd", solo rostros)
+#   DETECTOR_THREADS: hilos intra-op de onnxruntime (vacío = valor por defecto)
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "ultralytics")
+DETECTOR_MODEL_PATH = os.getenv("DETECTOR_MODEL_PATH") or None
+DETECTOR_THREADS = int(os.getenv("DETECTOR_THREADS", "0")) or None
+DETECTION_CONF = 0.6  # Confianza mínima para contar una persona
+MODEL_LOAD_RETRY_S = float(os.getenv("MODEL_LOAD_RETRY_S", "30"))  # Espera entre intentos si la carga falla
 
-# Constantes para detección de personas
-CLASS_ID_PERSON = 0  # La clase 0 en COCO es "person"
+# El modelo se carga en segundo plano (MODEL_LOADER, más abajo) para que la API responda
+# de inmediato; DETECTOR e INFERENCE_SCHEDULER quedan en None hasta que termine.
+DETECTOR = None
+
+def load_detector():
+    """Construye y calienta el detector (se ejecuta en el hilo de `ModelLoader`)."""
+    detector = create_detector(DETECTOR_BACKEND, DETECTOR_MODEL_PATH, conf=DETECTION_CONF, threads=DETECTOR_THREADS)
+    # Calentamos el modelo para que la primera cámara no pague la inicialización
+    latency_ms = detector.warmup()
+    print(f"Modelo YOLO cargado exitosamente (backend '{detector.name}', {latency_ms:.1f} ms/frame).")
+    return detector
+
+# Constantes para dibujar detecciones
 COLOR_AZUL = (255, 0, 0)  # Color BGR para cuadros de detección
+COLOR_ROSTRO = (0, 255, 0)  # Rostros encontrados por la cascada
 GROSOR_LINEA = 2
 
+# Ventanas de OpenCV con el video anotado (SHOW_WINDOWS=0 para servidores sin pantalla).
+# El video anotado también se sirve por /video/{camera_id}/mjpeg y /video/{camera_id}/ws.
+# Si nadie mira, no se dibuja nada.
+SHOW_WINDOWS = os.getenv("SHOW_WINDOWS", "1") == "1"
+SHOW_LABELS = os.getenv("SHOW_LABELS", "1") == "1"  # Etiquetas de texto sobre cada caja
+
+# Configuración del planificador de inferencia por lotes (compartido entre cámaras)
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+
+INFERENCE_SCHEDULER = None
+
+# Cascada de detección (ver cascade.py):
+#   DETECTION_CASCADE: "none" (modelo principal sobre cada frame muestreado), "motion" (solo sobre
+#                      las regiones con movimiento) o "detector" (un YOLO de 320 px propone regiones
+#                      y descarta los frames sin candidatos)
+#   CASCADE_FACES: buscar rostros (SSD res10) solo en las personas confirmadas
+DETECTION_CASCADE = os.getenv("DETECTION_CASCADE", "none")
+CASCADE_PROPOSAL_BACKEND = os.getenv("CASCADE_PROPOSAL_BACKEND", "onnx-320")
+CASCADE_PROPOSAL_MODEL_PATH = os.getenv("CASCADE_PROPOSAL_MODEL_PATH") or None
+CASCADE_PROPOSAL_CONF = float(os.getenv("CASCADE_PROPOSAL_CONF", "0.25"))  # Baja: la etapa debe dejar pasar dudosos
+CASCADE_MAX_REGIONS = int(os.getenv("CASCADE_MAX_REGIONS", "1"))  # Recortes por frame (más = se unen en uno)
+CASCADE_FACES = os.getenv("CASCADE_FACES", "0") == "1"
+
+# Planificadores de los modelos auxiliares de la cascada (None = etapa desactivada)
+PROPOSAL_SCHEDULER = None
+FACE_SCHEDULER = None
+
+# Configuración de la captura
+FRAME_SCALE = 0.6  # Factor de redimensionado de cada frame antes del análisis
+RECONNECT_DELAY_S = 15  # Espera antes de reintentar la conexión con una cámara
+MAX_FRAME_AGE_S = float(os.getenv("MAX_FRAME_AGE_S", "1.0"))  # Frames más viejos se descartan
+
+# Decodificación para el análisis:
+#   "opencv" -> OpenCV decodifica a resolución completa y se redimensiona en Python
+#   "ffmpeg" -> ffmpeg redimensiona y descarta frames antes de entregarlos (FFmpegPipeGrabber),
+#               así los frames llegan ya al tamaño y a la tasa de análisis
+# Si la cámara tiene un substream de baja resolución, se indica en CameraRequest.analysis_url.
+ANALYSIS_DECODER = os.getenv("ANALYSIS_DECODER", "opencv")
+ANALYSIS_WIDTH = int(os.getenv("ANALYSIS_WIDTH", "0"))  # Ancho de los frames analizados (0 = usar FRAME_SCALE)
+ANALYSIS_FPS = float(os.getenv("ANALYSIS_FPS", "0"))  # Frames/s entregados por ffmpeg (0 = todos)
+
+# Origen del video a analizar (para no abrir cada cámara dos veces):
+#   "camera" -> OpenCV abre la cámara directamente (comportamiento original)
+#   "relay"  -> se consume el stream que streamingService publica en MediaMTX; antes de
+#               empezar se le pide el stream y se espera a que esté listo (handshake)
+#   "pipe"   -> un único ffmpeg por cámara copia el stream a MediaMTX y entrega a
+#               análisis los frames ya reducidos por un pipe (no usar streamingService
+#               para esas cámaras)
+ANALYTICS_SOURCE = os.getenv("ANALYTICS_SOURCE", "camera")
+STREAMING_SERVICE_URL = os.getenv("STREAMING_SERVICE_URL", "http://localhost:8001")
+MEDIAMTX_RTSP_URL = os.getenv("MEDIAMTX_RTSP_URL", "rtsp://localhost:8554")
+RELAY_READY_TIMEOUT_S = float(os.getenv("RELAY_READY_TIMEOUT_S", "15"))
+
+# Configuración del pre-filtro de movimiento (omite YOLO cuando la escena está quieta)
+MOTION_GATE_ENABLED = os.getenv("MOTION_GATE_ENABLED", "1") == "1"
+MOTION_AREA_THRESHOLD = float(os.getenv("MOTION_AREA_THRESHOLD", "0.002"))  # Fracción del frame que debe cambiar
+MOTION_REFRESH_INTERVAL_S = float(os.getenv("MOTION_REFRESH_INTERVAL_S", "5"))  # Inferencia forzada cada N segundos
+
+# Configuración del controlador de tasa de inferencia (reemplaza "YOLO cada 10 frames")
+INFERENCE_TARGET_DPS = float(os.getenv("INFERENCE_TARGET_DPS", "20"))  # Detecciones/s para todo el nodo
+INFERENCE_MIN_INTERVAL_S = float(os.getenv("INFERENCE_MIN_INTERVAL_S", "0.1"))
+INFERENCE_MAX_INTERVAL_S = float(os.getenv("INFERENCE_MAX_INTERVAL_S", "5"))
+OCCUPIED_CAMERA_WEIGHT = float(os.getenv("OCCUPIED_CAMERA_WEIGHT", "3"))  # Prioridad de cámaras con personas
+
+# En modo "process" cada trabajador administra su parte del presupuesto del nodo
+RATE_CONTROLLER = InferenceRateController(
+    target_dps=INFERENCE_TARGET_DPS / (ANALYTICS_WORKER_PROCESSES if IS_ANALYTICS_WORKER else 1),
+    min_interval=INFERENCE_MIN_INTERVAL_S,
+    max_interval=INFERENCE_MAX_INTERVAL_S,
+    occupied_weight=OCCUPIED_CAMERA_WEIGHT
+)
+
+def start_inference(detector):
+    """Con el modelo listo, levanta el planificador por lotes y lo conecta al controlador de tasa."""
+    global DETECTOR, INFERENCE_SCHEDULER
+    scheduler = InferenceScheduler(
+        detector,
+        max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+        max_wait_ms=INFERENCE_MAX_WAIT_MS
+    )
+    scheduler.start()
+    RATE_CONTROLLER.cost_provider = scheduler.frame_cost
+    DETECTOR = detector
+    INFERENCE_SCHEDULER = scheduler
+    start_cascade_stages()
+
+def start_cascade_stages():
+    """
+    Carga los modelos auxiliares de la cascada, cada uno con su propio planificador por lotes.
+    Si alguno no se puede cargar, su etapa queda desactivada (sin propuestas se usa el
+    movimiento) y el análisis sigue con el modelo principal.
+    """
+    global PROPOSAL_SCHEDULER, FACE_SCHEDULER
+    stages = []
+    if DETECTION_CASCADE == "detector":
+        stages.append(("proposal", CASCADE_PROPOSAL_BACKEND, CASCADE_PROPOSAL_MODEL_PATH, CASCADE_PROPOSAL_CONF))
+    if DETECTION_CASCADE != "none" and CASCADE_FACES:
+        stages.append(("face", "ssd", None, 0.5))
+
+    for stage, backend, model_path, conf in stages:
+        try:
+            detector = create_detector(backend, model_path, conf=conf, threads=DETECTOR_THREADS)
+        except Exception as e:
+            print(f"Advertencia: Etapa '{stage}' de la cascada desactivada ({backend}): {e}")
+            continue
+        scheduler = InferenceScheduler(
+            detector,
+            max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=INFERENCE_MAX_WAIT_MS,
+            name=f"inference-{stage}"
+        )
+        scheduler.start()
+        if stage == "proposal":
+            PROPOSAL_SCHEDULER = scheduler
+        else:
+            FACE_SCHEDULER = scheduler
+        print(f"Etapa '{stage}' de la cascada lista (backend '{detector.name}').")
+
+def create_cascade(camera_id: int, motion_gate: MotionGate = None) -> DetectionCascade:
+    """Cascada de una cámara con las etapas que se pudieron cargar."""
+    proposal_submit = face_submit = None
+    if PROPOSAL_SCHEDULER is not None:
+        proposal_submit = lambda image: PROPOSAL_SCHEDULER.submit(image, camera_id)
+    if FACE_SCHEDULER is not None:
+        face_submit = lambda image: FACE_SCHEDULER.submit(image, camera_id)
+    return DetectionCascade(
+        lambda image: INFERENCE_SCHEDULER.submit(image, camera_id),
+        proposal=DETECTION_CASCADE if proposal_submit is not None else "motion",
+        motion_gate=motion_gate,
+        proposal_submit=proposal_submit,
+        face_submit=face_submit,
+        max_regions=CASCADE_MAX_REGIONS,
+        cost_providers={
+            "detector": INFERENCE_SCHEDULER.frame_cost,
+            "proposal": PROPOSAL_SCHEDULER.frame_cost if PROPOSAL_SCHEDULER is not None else None,
+            "face": FACE_SCHEDULER.frame_cost if FACE_SCHEDULER is not None else None,
+        }
+    )
+
+# En modo "process" el proceso principal no analiza: el modelo solo se carga en los trabajadores.
+# Se arranca en el evento "startup" (o al iniciar cada trabajador), no al importar.
+MODEL_LOADER = None
+if ANALYTICS_EXECUTION_MODE != "process" or IS_ANALYTICS_WORKER:
+    MODEL_LOADER = ModelLoader(load_detector, retry_delay=MODEL_LOAD_RETRY_S)
+    MODEL_LOADER.on_ready = start_inference
+
+# Configuración de los clips de cada alerta (pre-roll + post-roll en mp4, servidos en /clips)
+CLIPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "clips")
+CLIP_RECORDING_ENABLED = os.getenv("CLIP_RECORDING_ENABLED", "1") == "1"
+CLIP_PRE_ROLL_S = float(os.getenv("CLIP_PRE_ROLL_S", "5"))
+CLIP_POST_ROLL_S = float(os.getenv("CLIP_POST_ROLL_S", "5"))
+CLIP_MAX_S = float(os.getenv("CLIP_MAX_S", "30"))  # Duración máxima de un clip con el evento aún activo
+CLIP_FPS = float(os.getenv("CLIP_FPS", "10"))  # Frames por segundo guardados en el pre-roll
+CLIP_BUFFER_MB = float(os.getenv("CLIP_BUFFER_MB", "8"))  # Memoria máxima del pre-roll por cámara
+
 # URL del backend de Spring Boot (a donde enviaremos las alertas)
 # Asegúrate de que esta URL sea accesible desde este servicio de Python
-SPRING_BOOT_ALERT_URL = "http://localhost:8080/api/internal/alerts"
+SPRING_BOOT_ALERT_URL = os.getenv("SPRING_BOOT_ALERT_URL", "http://localhost:8080/api/internal/alerts")
+
+# Configuración del envío de alertas (en segundo plano, nunca bloquea el análisis)
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "1000"))
+ALERT_DEDUP_WINDOW_S = float(os.getenv("ALERT_DEDUP_WINDOW_S", "30"))  # Alertas iguales se fusionan
+ALERT_SPOOL_DIR = os.getenv("ALERT_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "alert_spool"))
+LOITERING_THRESHOLD_S = float(os.getenv("LOITERING_THRESHOLD_S", "60"))  # Permanencia que dispara "LOITERING"
+
+# Las alertas se generan donde corre el análisis (este proceso o cada trabajador)
+ALERT_DISPATCHER = None
+if ANALYTICS_EXECUTION_MODE != "process" or IS_ANALYTICS_WORKER:
+    ALERT_DISPATCHER = AlertDispatcher(
+        SPRING_BOOT_ALERT_URL,
+        ALERT_SPOOL_DIR,
+        queue_size=ALERT_QUEUE_SIZE,
+        dedup_window=ALERT_DEDUP_WINDOW_S
+    )
+    ALERT_DISPATCHER.start()
+
+# --- Métricas (formato Prometheus en /metrics) ---
+# En el bucle de frames solo se suman números sobre objetos ya resueltos por cámara;
+# los contadores que ya existen en otros componentes se leen al consultar /metrics.
+CAPTURE_LATENCY = Histogram("analytics_capture_latency_seconds",
+                            "Antigüedad del frame cuando el análisis lo toma", ["camera_id"])
+RESIZE_SECONDS = Histogram("analytics_resize_seconds", "Tiempo de redimensionado por frame", ["camera_id"])
+INFERENCE_SECONDS = Histogram("analytics_inference_seconds",
+                              "Tiempo de inferencia por frame (incluye la espera del lote)", ["camera_id"])
+FRAMES_PROCESSED = Counter("analytics_frames_processed_total", "Frames analizados", ["camera_id"])
+FRAMES_SKIPPED = Counter("analytics_frames_skipped_total",
+                         "Frames sin inferencia (reason: rate = controlador de tasa, motion = sin movimiento)",
+                         ["camera_id", "reason"])
+ALERTS_EMITTED = Counter("analytics_alerts_emitted_total", "Alertas generadas", ["camera_id", "event_type"])
+ALERT_SEND_LATENCY = Histogram("analytics_alert_send_latency_seconds",
+                               "Desde que se encola una alerta hasta que el core la acepta",
+                               ["camera_id", "event_type"],
+                               buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+# Proceso que reporta (en modo "process" cada trabajador expone sus propias series)
+METRICS_PROCESS = os.getenv("ANALYTICS_WORKER_INDEX", "main")
+
+def record_alert_delivery(alerts: list):
+    """Latencia de envío de cada alerta aceptada por el core (las reenviadas desde disco no cuentan)."""
+    now = time.monotonic()
+    for alert in alerts:
+        queued_at = alert.get("_queued_at")
+        if queued_at is not None:
+            ALERT_SEND_LATENCY.labels(alert["camera_id"], alert["event_type"]).observe(now - queued_at)
+
+if ALERT_DISPATCHER is not None:
+    ALERT_DISPATCHER.on_delivered = record_alert_delivery
+
+# Perfilador por muestreo (apagado hasta que se active por la API)
+PROFILER = SamplingProfiler()
+
+# Registro persistente de cámaras: al reiniciar el servicio se vuelven a levantar todas,
+# a la vez pero escalonadas cada WARM_RESTART_STAGGER_S segundos (solo el proceso principal)
+CAMERA_REGISTRY_ENABLED = os.getenv("CAMERA_REGISTRY_ENABLED", "1") == "1"
+CAMERA_REGISTRY_PATH = os.getenv("CAMERA_REGISTRY_PATH",
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_registry.db"))
+WARM_RESTART_STAGGER_S = float(os.getenv("WARM_RESTART_STAGGER_S", "0.2"))
+
+# Modo clúster: con COORDINATOR_URL este nodo se registra en el coordinador (coordinator.py)
+# y le reporta su carga; el coordinador decide qué cámaras analiza. Vacío = nodo independiente.
+COORDINATOR_URL = os.getenv("COORDINATOR_URL", "").rstrip("/")
+NODE_URL = os.getenv("NODE_URL", "http://localhost:8000")  # Dirección por la que el coordinador llega a este nodo
+NODE_ID = os.getenv("NODE_ID") or NODE_URL
+NODE_CAPACITY = float(os.getenv("NODE_CAPACITY", str(os.cpu_count() or 1)))  # Peso en el reparto de cámaras
+NODE_REPORT_INTERVAL_S = float(os.getenv("NODE_REPORT_INTERVAL_S", "2"))
+
+CAMERA_REGISTRY = None
+# En un clúster las cámaras las registra y reubica el coordinador, no cada nodo
+if CAMERA_REGISTRY_ENABLED and not IS_ANALYTICS_WORKER and not COORDINATOR_URL:
+    CAMERA_REGISTRY = CameraRegistry(CAMERA_REGISTRY_PATH)
 
 # --- Aplicación FastAPI ---
 app = FastAPI(
@@ -34,6 +313,9 @@ app = FastAPI(
     description="Procesa streams RTSP y envía alertas a Spring Boot."
 )
 
+# Los clips de las alertas (AlertPayload.clip_path) se sirven desde aquí
+app.mount("/clips", StaticFiles(directory=CLIPS_DIR, check_dir=False), name="clips")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:3000", "*"],  # Ajustar según puerto de desarrollo
@@ -43,10 +325,46 @@ app.add_middleware(
 )
 
 # --- Modelos de Datos (Pydantic) ---
+# Zona poligonal de una cámara; puntos [x, y] normalizados entre 0 y 1
+class ZoneConfig(BaseModel):
+    name: str
+    points: List[List[float]]
+    kind: str = "include"  # "include" o "exclude"
+    intrusion: bool = False  # Alerta "INTRUSION" cuando alguien entra a la zona
+    max_occupancy: Optional[int] = None  # Alerta "OCCUPANCY_EXCEEDED" al superar este número de personas
+
+class CameraZonesConfig(BaseModel):
+    zones: List[ZoneConfig]
+
 # Esto es lo que recibimos de Spring Boot
 class CameraRequest(BaseModel):
     camera_id: int
     rtsp_url: str
+    stream_name: Optional[str] = None  # Nombre del stream en MediaMTX (por defecto "cam_{camera_id}")
+    analysis_url: Optional[str] = None  # Substream de baja resolución para el análisis (rtsp_url se usa para ver)
+    zones: Optional[List[ZoneConfig]] = None  # Zonas de la cámara (también se pueden cambiar en caliente)
+
+# Inicio y parada de varias cámaras en una sola petición
+class BulkCameraRequest(BaseModel):
+    cameras: List[CameraRequest]
+
+class BulkStopRequest(BaseModel):
+    camera_ids: Optional[List[int]] = None  # None = todas las cámaras activas
+
+# Ajustes en caliente de la tasa de inferencia
+# Por cámara: reemplaza la configuración completa (null = cálculo automático, peso 1)
+class CameraRateConfig(BaseModel):
+    weight: Optional[float] = Field(None, gt=0)
+    min_interval_s: Optional[float] = Field(None, gt=0)
+    max_interval_s: Optional[float] = Field(None, gt=0)
+    fixed_interval_s: Optional[float] = Field(None, gt=0)
+
+# Del nodo: solo se modifican los campos enviados
+class NodeRateConfig(BaseModel):
+    target_dps: Optional[float] = Field(None, gt=0)
+    min_interval_s: Optional[float] = Field(None, gt=0)
+    max_interval_s: Optional[float] = Field(None, gt=0)
+    occupied_weight: Optional[float] = Field(None, gt=0)
 
 # Esto es lo que enviamos A Spring Boot
 class AlertPayload(BaseModel):
@@ -62,64 +380,117 @@ class AlertPayload(BaseModel):
 # Usamos un 'Event' para poder enviar una señal de "parada" al hilo.
 active_analysis_threads = {}
 
+# Componentes de cada pipeline en ejecución (cada uno expone un método stats()).
+# { 123: {"capture": FrameGrabber}, ... }
+camera_pipelines = {}
+
+# Zonas de cada cámara de este proceso; se reemplazan enteras al reconfigurarlas.
+# { 123: ZoneSet, ... }
+camera_zones = {}
+
+# Motor multiproceso (solo en modo "process"); se crea al arrancar la aplicación
+process_engine = None
+
+# Cámaras que se están iniciando (esperando el relay); evita arrancar dos veces la misma
+starting_analyses = set()
+
+# Tarea que vuelve a levantar las cámaras del registro al arrancar
+restore_task = None
+
+# Tarea que reporta la carga al coordinador (solo en modo clúster)
+report_task = None
+
+# Último frame anotado de cada cámara, para los espectadores por HTTP/WebSocket
+FRAME_HUB = AnnotatedFrameHub()
+
 # --- Lógica de Análisis (se ejecuta en un Hilo) ---
 
-def detect_persons_in_frame(frame: np.ndarray, camera_id: int):
+def detect_persons_in_frame(frame: np.ndarray, camera_id: int, zones: ZoneSet = None,
+                            cascade: DetectionCascade = None) -> Detections:
     """
     Detecta personas en un frame usando YOLO.
-    Dibuja cuadros azules alrededor de las personas detectadas.
-    Retorna el frame con las detecciones dibujadas y el número de personas detectadas.
+    El frame se envía al planificador central, que lo agrupa con los de otras cámaras.
+    Con `zones`, el detector recibe solo el rectángulo de las zonas de interés y se
+    descartan las personas fuera de ellas (o dentro de una zona excluida).
+    Con `cascade`, YOLO solo recibe las regiones que propone la primera etapa.
+    Retorna las detecciones como arreglos NumPy (cajas N×4 y confianzas N).
     """
-    if YOLO_MODEL is None:
-        return frame, 0
+    if INFERENCE_SCHEDULER is None:
+        return Detections.empty()
 
-    # Detecta solo personas con confianza >= 0.6
-    results = YOLO_MODEL(frame, classes=[CLASS_ID_PERSON], conf=0.6, verbose=False)
+    roi, offset = zones.crop(frame) if zones is not None else (frame, (0, 0))
 
-    num_persons = 0
+    # Detecta solo personas con confianza >= 0.6 (bloquea hasta que se procese el lote)
+    if cascade is not None:
+        detections = cascade.detect(roi, offset)
+    else:
+        detections = INFERENCE_SCHEDULER.submit(roi, camera_id).result()
 
-    # Dibujar cuadros azules alrededor de cada persona detectada
-    for box in results[0].boxes:
-        num_persons += 1
-
-        # Obtiene las coordenadas del cuadro
-        x1, y1, x2, y2 = box.xyxy[0]
-        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-
-        # Dibuja el rectángulo azul
-        cv2.rectangle(
-            img=frame,
-            pt1=(x1, y1),
-            pt2=(x2, y2),
-            color=COLOR_AZUL,
-            thickness=GROSOR_LINEA
-        )
-
-        # Añade etiqueta de confianza
-        conf = float(box.conf[0])
-        label = f"Persona: {conf:.2f}"
-        cv2.putText(frame, label, (x1, y1 - 10),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, COLOR_AZUL, 2)
+    if zones is not None:
+        # Coordenadas del ROI -> coordenadas del frame
+        boxes = detections.boxes + np.array([*offset, *offset], dtype=np.float32)
+        detections = zones.filter(Detections(boxes, detections.confidences), frame.shape)
 
     # Imprime en consola si se detectaron personas
+    if len(detections) > 0:
+        print(f"[Cámara {camera_id}]: {len(detections)} persona(s) detectada(s)")
 
-    if num_persons > 0:
-        print(f"[Cámara {camera_id}]: {num_persons} persona(s) detectada(s)")
+    return detections
 
-    return frame, num_persons
+def draw_tracks(frame: np.ndarray, tracker: PersonTracker):
+    """
+    Dibuja cuadros azules alrededor de las personas seguidas por el tracker,
+    en su posición actual, con su id de track y su confianza (si SHOW_LABELS).
+    """
+    track_ids, boxes, scores, _ = tracker.tracks()
+    labels = None
+    if SHOW_LABELS:
+        labels = [f"Persona #{track_id}: {conf:.2f}" for track_id, conf in zip(track_ids.tolist(), scores.tolist())]
+    return draw_boxes(frame, boxes, COLOR_AZUL, GROSOR_LINEA, labels)
+
+def emit_alert(camera_id: int, event_type: str, details: str, clip_path: str = "", dedup_key=None):
+    """
+    Encola una alerta para Spring Boot sin bloquear el bucle de análisis.
+    El envío (lotes, reintentos, cola en disco) lo hace el `AlertDispatcher` en otro hilo.
+    `dedup_key` distingue eventos del mismo tipo (track, zona) para que no se fusionen.
+    """
+    if ALERT_DISPATCHER is None:
+        return False
+    alert = AlertPayload(
+        camera_id=camera_id,
+        timestamp=datetime.now().isoformat(timespec="seconds"),
+        event_type=event_type,
+        details=details,
+        clip_path=clip_path
+    )
+    ALERTS_EMITTED.labels(camera_id, event_type).inc()
+    return ALERT_DISPATCHER.submit(alert.model_dump(), dedup_key)
 
-def capture_frame_five_s(camera_id: int, frame: np.ndarray, current_time: float, last_saved_time: float, clips_dir: str):
+def check_loitering(camera_id: int, tracker: PersonTracker, alerted_tracks: set,
+                    recorder: ClipRecorder = None):
     """
-    Guarda un frame cada 5 segundos en la carpeta clips.
-    Retorna el tiempo actualizado de la última captura.
+    Emite "LOITERING" (una vez por track) cuando una persona permanece más de LOITERING_THRESHOLD_S.
+    Si la cámara graba clips, la alerta lleva la ruta del clip del evento.
     """
-    if current_time - last_saved_time >= 5:
-        filename = f"cam_{camera_id}_{int(current_time)}.jpg"
-        filepath = os.path.join(clips_dir, filename)
-        cv2.imwrite(filepath, frame)
-        print(f"[Cámara {camera_id}]: Frame guardado en {filepath}")
-        return current_time
-    return last_saved_time
+    track_ids, _, _, dwell = tracker.tracks()
+    alerted_tracks.intersection_update(track_ids.tolist())  # Olvidamos los tracks que ya no existen
+    for track_id, seconds in zip(track_ids.tolist(), dwell.tolist()):
+        if seconds >= LOITERING_THRESHOLD_S and track_id not in alerted_tracks:
+            alerted_tracks.add(track_id)
+            clip_path = recorder.trigger() if recorder is not None else ""
+            emit_alert(camera_id, "LOITERING", f"Persona #{track_id} permanece hace {seconds:.0f} s en la escena.",
+                       clip_path, dedup_key=track_id)
+
+def check_zones(camera_id: int, zones: ZoneSet, tracker: PersonTracker, shape, recorder: ClipRecorder = None):
+    """Emite las alertas de las reglas de zona (intrusión, ocupación máxima)."""
+    track_ids, boxes, _, _ = tracker.tracks()
+    for event_type, details, dedup_key in zones.evaluate(track_ids, boxes, shape):
+        clip_path = recorder.trigger() if recorder is not None else ""
+        emit_alert(camera_id, event_type, details, clip_path, dedup_key)
+
+def analysis_scale(frame_width: int) -> float:
+    """Factor de redimensionado para que el frame quede con ANALYSIS_WIDTH (o FRAME_SCALE)."""
+    return ANALYSIS_WIDTH / frame_width if ANALYSIS_WIDTH else FRAME_SCALE
 
 def rescale_frame(frame, scale=0.75):
     width = int(frame.shape[1] * scale)
@@ -128,107 +499,630 @@ def rescale_frame(frame, scale=0.75):
 
     return cv2.resize(frame, dimensions, interpolation=cv2.INTER_AREA)
 
-def analyze_camera_stream(camera_id: int, rtsp_url: str, stop_event: threading.Event):
+def analyze_camera_stream(camera_id: int, rtsp_url: str, stop_event: threading.Event,
+                          shared_memory: bool = False, publish_url: str = None, analysis_url: str = None):
     """
     Esta función se ejecuta en un hilo separado por cada cámara.
-    Maneja la conexión, el procesamiento y la reconexión.
+    La captura (conexión y reconexión) corre en su propio hilo (`FrameGrabber`) o,
+    con `shared_memory`, en un proceso de captura que publica los frames en memoria
+    compartida (`SharedFrameSource`); aquí solo se procesa el frame más reciente.
+    Con `publish_url` (modo "pipe") un ffmpeg decodifica la cámara una sola vez y
+    además la republica en esa URL (`FFmpegPipeGrabber`). Si hay `analysis_url`, se
+    analiza ese substream en lugar de `rtsp_url`.
     """
-    print(f"[Cámara {camera_id}]: Iniciando hilo de análisis para {rtsp_url}")
+    print(f"[Cámara {camera_id}]: Iniciando hilo de análisis para {analysis_url or rtsp_url}")
 
-    clips_dir = os.path.join(os.path.dirname(__file__), "clips")
-    os.makedirs(clips_dir, exist_ok=True)
+    if MODEL_LOADER is not None and not MODEL_LOADER.ready:
+        # En cola: sin modelo no se abre la cámara (analizar sin detector no detectaría a nadie)
+        print(f"[Cámara {camera_id}]: En espera hasta que termine de cargar el modelo...")
+        while not MODEL_LOADER.wait(1.0):
+            if stop_event.is_set():
+                return
 
-    # Bucle "Supervisor": mientras no nos digan que paremos, intentamos conectarnos.
-    last_saved_time = time.time()
-    frame_count = 0  # Contador para procesar YOLO cada N frames
-    last_detection_frame = None  # Guardar último frame con detecciones
+    window_name = f"AntervIA - Camera Detection {camera_id}"
 
-    while not stop_event.is_set():
-        cap = cv2.VideoCapture(rtsp_url)
+    if publish_url is not None or ANALYSIS_DECODER == "ffmpeg":
+        grabber = FFmpegPipeGrabber(
+            camera_id,
+            rtsp_url,
+            stop_event,
+            relay_url=publish_url,
+            analysis_url=analysis_url,
+            scale=FRAME_SCALE,
+            width=ANALYSIS_WIDTH or None,
+            fps=ANALYSIS_FPS or None,
+            reconnect_delay=RECONNECT_DELAY_S,
+            max_frame_age=MAX_FRAME_AGE_S
+        )
+    elif shared_memory:
+        grabber = SharedFrameSource(camera_id, stop_event, max_frame_age=MAX_FRAME_AGE_S)
+    else:
+        grabber = FrameGrabber(
+            camera_id,
+            analysis_url or rtsp_url,
+            stop_event,
+            reconnect_delay=RECONNECT_DELAY_S,
+            max_frame_age=MAX_FRAME_AGE_S
+        )
+    camera_pipelines[camera_id] = {"capture": grabber}
 
-        # Optimización: Reducir buffer para disminuir latencia
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    motion_gate = None
+    if MOTION_GATE_ENABLED:
+        motion_gate = MotionGate(
+            area_threshold=MOTION_AREA_THRESHOLD,
+            refresh_interval=MOTION_REFRESH_INTERVAL_S
+        )
+        camera_pipelines[camera_id]["motion"] = motion_gate
 
-        if not cap.isOpened():
-            print(f"[Cámara {camera_id}]: Error al conectar. Reintentando en 15 segundos...")
-            # Espera 15s antes de reintentar para no saturar
-            stop_event.wait(15)
-            continue
+    cascade = None
+    if DETECTION_CASCADE != "none":
+        cascade = create_cascade(camera_id, motion_gate)
+        camera_pipelines[camera_id]["cascade"] = cascade
 
-        print(f"[Cámara {camera_id}]: Conexión exitosa. Empezando análisis...")
+    # El tracker mantiene las cajas (con ids estables) entre inferencias
+    tracker = PersonTracker()
+    camera_pipelines[camera_id]["tracker"] = tracker
+    loitering_alerted = set()  # Tracks que ya generaron alerta de merodeo
 
-        # Bucle "Procesamiento": mientras la cámara esté conectada
-        while cap.isOpened() and not stop_event.is_set():
-            ret, frame = cap.read()
+    # Pre-roll comprimido de los últimos segundos, para el clip de cada alerta
+    recorder = None
+    if CLIP_RECORDING_ENABLED:
+        recorder = ClipRecorder(
+            camera_id,
+            CLIPS_DIR,
+            pre_roll=CLIP_PRE_ROLL_S,
+            post_roll=CLIP_POST_ROLL_S,
+            max_clip_seconds=CLIP_MAX_S,
+            fps=CLIP_FPS,
+            max_buffer_bytes=int(CLIP_BUFFER_MB * 1024 * 1024)
+        )
+        recorder.start()
+        camera_pipelines[camera_id]["clips"] = recorder
+
+    # El controlador decide cada cuánto le toca inferencia a esta cámara
+    RATE_CONTROLLER.register(camera_id)
+    camera_pipelines[camera_id]["rate"] = CameraRateView(RATE_CONTROLLER, camera_id)
 
-            # Si 'ret' es False, perdimos la conexión (cámara apagada, red, etc.)
-            if not ret:
-                print(f"[Cámara {camera_id}]: Stream perdido.")
-                break  # Sale del bucle de procesamiento y vuelve al supervisor
+    grabber.start()
 
-            # Redimensiona el frame
-            frame = rescale_frame(frame, 0.6)
+    # Series de métricas de esta cámara (resueltas una vez, fuera del bucle)
+    capture_latency = CAPTURE_LATENCY.labels(camera_id)
+    resize_seconds = RESIZE_SECONDS.labels(camera_id)
+    inference_seconds = INFERENCE_SECONDS.labels(camera_id)
+    frames_processed = FRAMES_PROCESSED.labels(camera_id)
+    skipped_by_rate = FRAMES_SKIPPED.labels(camera_id, "rate")
+    skipped_by_motion = FRAMES_SKIPPED.labels(camera_id, "motion")
 
-            # Optimización: Procesar YOLO solo cada 3 frames para mejor rendimiento
-            if frame_count % 10 == 0:
-                frame_with_detections, num_persons = detect_persons_in_frame(frame, camera_id)
-                last_detection_frame = frame_with_detections.copy()
-            else:
-                # Usar el último frame procesado si existe, sino el frame actual
-                frame_with_detections = last_detection_frame if last_detection_frame is not None else frame
+    # Bucle "Procesamiento": toma siempre el último frame capturado
+    while not stop_event.is_set():
+        item = grabber.read(timeout=1.0)
+        if item is None:
+            continue  # Sin frame nuevo (o demasiado viejo); volvemos a esperar
+        frame, _, frame_time = item
+        capture_latency.observe(time.time() - frame_time)
+        frames_processed.inc()
 
-            frame_count += 1
+        # Redimensiona el frame (salvo que el proceso de captura ya lo haya hecho)
+        if not grabber.prescaled:
+            resize_start = time.perf_counter()
+            frame = rescale_frame(frame, analysis_scale(frame.shape[1]))
+            resize_seconds.observe(time.perf_counter() - resize_start)
 
-            # # Guarda el frame cada 5 segundos
-            # current_time = time.time()
-            # last_saved_time = capture_frame_five_s(camera_id, frame_with_detections, current_time, last_saved_time, clips_dir)
+        # Las zonas se leen en cada frame: la API puede reemplazarlas en caliente
+        zones = camera_zones.get(camera_id)
 
-            cv2.imshow(f"AntervIA - Camera Detection {camera_id}", frame_with_detections)
-            cv2.waitKey(1)
+        # Optimización: Procesar YOLO solo cuando el controlador de tasa lo indique y solo
+        # si hubo movimiento (o toca un refresco forzado) para mejor rendimiento.
+        # Con zonas, el movimiento solo se busca dentro del ROI.
+        now = time.time()
+        run_inference = RATE_CONTROLLER.should_infer(camera_id, now)
+        if not run_inference:
+            skipped_by_rate.inc()
+        elif motion_gate is not None and \
+                not motion_gate.should_infer(zones.crop(frame)[0] if zones else frame, now):
+            run_inference = False
+            skipped_by_motion.inc()
 
-        # --- Fin del bucle de procesamiento ---
-        cap.release()
-        cv2.destroyAllWindows()  # Destruímos todas las ventanas
-        if not stop_event.is_set():
-            print(f"[Cámara {camera_id}]: Conexión perdida. Preparando para reconectar.")
+        if run_inference:
+            inference_start = time.perf_counter()
+            detections = detect_persons_in_frame(frame, camera_id, zones, cascade)
+            inference_seconds.observe(time.perf_counter() - inference_start)
+            RATE_CONTROLLER.report(camera_id, len(detections), now)
+            tracker.update(detections.boxes, detections.confidences, now)
+            check_loitering(camera_id, tracker, loitering_alerted, recorder)
+            if zones is not None:
+                check_zones(camera_id, zones, tracker, frame.shape, recorder)
+        else:
+            # Sin inferencia: el tracker extrapola las cajas a la hora de este frame
+            tracker.predict(now)
 
+        # El frame crudo (sin cajas) entra al pre-roll; la compresión ocurre en otro hilo
+        if recorder is not None:
+            recorder.add_frame(frame, now)
+
+        # Solo dibujamos si alguien va a ver el video anotado
+        has_viewers = FRAME_HUB.has_viewers(camera_id)
+        if SHOW_WINDOWS or has_viewers:
+            # Las cajas se dibujan siempre sobre el frame actual (no sobre uno viejo)
+            frame_with_detections = draw_tracks(frame, tracker)
+            if zones is not None:
+                zones.draw(frame_with_detections)
+            if cascade is not None and len(cascade.last_faces):
+                draw_boxes(frame_with_detections, cascade.last_faces, COLOR_ROSTRO, thickness=1)
+            if has_viewers:
+                FRAME_HUB.publish(camera_id, frame_with_detections)
+            if SHOW_WINDOWS:
+                cv2.imshow(window_name, frame_with_detections)
+                cv2.waitKey(1)
+
+    # --- Fin del bucle de procesamiento ---
+    grabber.join(timeout=5)
+    if recorder is not None:
+        recorder.stop()
+    RATE_CONTROLLER.unregister(camera_id)
+    camera_pipelines.pop(camera_id, None)
+    drop_camera_metrics(camera_id)
+    FRAME_HUB.drop(camera_id)
+    if SHOW_WINDOWS:
+        cv2.destroyWindow(window_name)  # Solo la ventana de esta cámara
     print(f"[Cámara {camera_id}]: Hilo de análisis detenido limpiamente.")
 
-# --- Endpoints de la API ---
-@app.post("/analyze")
-async def start_analysis(request: CameraRequest):
+def drop_camera_metrics(camera_id: int):
+    """Elimina las series de una cámara detenida (para no acumular cámaras que ya no existen)."""
+    for metric in (CAPTURE_LATENCY, RESIZE_SECONDS, INFERENCE_SECONDS, FRAMES_PROCESSED):
+        metric.remove(camera_id)
+    for reason in ("rate", "motion"):
+        FRAMES_SKIPPED.remove(camera_id, reason)
+
+def collect_pipeline_metrics() -> list:
+    """Métricas que se leen de los componentes al consultar /metrics (sin costo en el bucle)."""
+    capture = [(camera_id, components["capture"].stats()) for camera_id, components in list(camera_pipelines.items())
+               if "capture" in components]
+    worker = {"process": METRICS_PROCESS}
+    families = [
+        family("analytics_frames_grabbed_total", "counter", "Frames decodificados por la captura",
+               [({"camera_id": str(cid)}, stats["frames_grabbed"]) for cid, stats in capture]),
+        family("analytics_frames_dropped_total", "counter",
+               "Frames descartados antes del análisis (reason: overwritten = llegó uno más nuevo, stale = muy viejo)",
+               [({"camera_id": str(cid), "reason": "overwritten"}, stats["frames_dropped"]) for cid, stats in capture] +
+               [({"camera_id": str(cid), "reason": "stale"}, stats["frames_stale"]) for cid, stats in capture]),
+        family("analytics_reconnects_total", "counter", "Reconexiones con la cámara",
+               [({"camera_id": str(cid)}, stats["reconnects"]) for cid, stats in capture]),
+        family("analytics_camera_connected", "gauge", "1 si la captura está conectada",
+               [({"camera_id": str(cid)}, int(stats["connected"])) for cid, stats in capture]),
+        family("analytics_active_cameras", "gauge", "Cámaras analizándose en este proceso",
+               [(worker, len(camera_pipelines))]),
+    ]
+    cascades = [(str(camera_id), components["cascade"]) for camera_id, components in list(camera_pipelines.items())
+                if "cascade" in components]
+    if cascades:
+        samples = []
+        for cid, cascade in cascades:
+            inferred = cascade.frames - cascade.frames_rejected
+            samples += [
+                ({"camera_id": cid, "stage": "proposal", "outcome": "hit"}, cascade.frames_with_candidates),
+                ({"camera_id": cid, "stage": "proposal", "outcome": "miss"},
+                 cascade.frames - cascade.frames_with_candidates),
+                ({"camera_id": cid, "stage": "detector", "outcome": "hit"}, cascade.frames_confirmed),
+                ({"camera_id": cid, "stage": "detector", "outcome": "miss"}, inferred - cascade.frames_confirmed),
+            ]
+            if cascade.face_submit is not None:
+                samples += [
+                    ({"camera_id": cid, "stage": "face", "outcome": "hit"}, cascade.faces_found),
+                    ({"camera_id": cid, "stage": "face", "outcome": "miss"}, cascade.face_calls - cascade.faces_found),
+                ]
+        families += [
+            family("analytics_cascade_stage_total", "counter",
+                   "Resultados de cada etapa de la cascada (proposal/detector: frames, face: personas)", samples),
+            family("analytics_cascade_detector_calls_total", "counter",
+                   "Imágenes (recortes o frames) enviadas al modelo principal por la cascada",
+                   [({"camera_id": cid}, cascade.detector_calls) for cid, cascade in cascades]),
+        ]
+    if MODEL_LOADER is not None:
+        loader = MODEL_LOADER.status()
+        families += [
+            family("analytics_model_ready", "gauge", "1 si el modelo terminó de cargar",
+                   [(worker, int(loader["state"] == "ready"))]),
+            family("analytics_model_load_seconds", "gauge", "Duración de la carga del modelo (con calentamiento)",
+                   [(worker, loader["load_seconds"])]),
+        ]
+    if INFERENCE_SCHEDULER is not None:
+        scheduler = INFERENCE_SCHEDULER.stats()
+        families += [
+            family("analytics_inference_batches_total", "counter", "Lotes de inferencia ejecutados",
+                   [(worker, scheduler["batches"])]),
+            family("analytics_inference_pending", "gauge", "Frames esperando inferencia",
+                   [(worker, scheduler["pending"])]),
+        ]
+    if ALERT_DISPATCHER is not None:
+        dispatcher = ALERT_DISPATCHER.stats()
+        families += [
+            family("analytics_alerts_queued", "gauge", "Alertas en cola de envío", [(worker, dispatcher["queued"])]),
+            family("analytics_alerts_sent_total", "counter", "Alertas aceptadas por el core",
+                   [(worker, dispatcher["sent"])]),
+            family("analytics_alerts_dropped_total", "counter", "Alertas descartadas por cola llena",
+                   [(worker, dispatcher["dropped"])]),
+            family("analytics_alerts_spooled_total", "counter", "Alertas guardadas en disco por fallas del core",
+                   [(worker, dispatcher["spooled"])]),
+            family("analytics_alerts_rejected_total", "counter", "Alertas rechazadas por el core (4xx)",
+                   [(worker, dispatcher["rejected"])]),
+        ]
+    return families
+
+REGISTRY.add_collector(collect_pipeline_metrics)
+
+def metrics_families() -> list:
+    """Métricas de este proceso (en modo "process", cada trabajador responde las suyas)."""
+    return REGISTRY.collect()
+
+def profiler_start(interval: float, duration: float = None):
+    return PROFILER.start(interval, duration)
+
+def profiler_stop():
+    return PROFILER.stop()
+
+def profiler_report(output: str = "top", limit: int = 25, thread: str = None):
+    if output == "collapsed":
+        return PROFILER.collapsed(prefix=f"{METRICS_PROCESS};", thread=thread)
+    return {"process": METRICS_PROCESS, **PROFILER.status(), "top": PROFILER.top(limit, thread)}
+
+def collect_camera_stats(camera_id: int):
+    """Reúne las estadísticas de los componentes del pipeline de una cámara de este proceso."""
+    components = camera_pipelines.get(camera_id)
+    if components is None:
+        if MODEL_LOADER is not None and not MODEL_LOADER.ready:
+            return {"camera_id": camera_id, "queued": True, "model": MODEL_LOADER.status()}
+        return None
+    stats = {"camera_id": camera_id, **{name: c.stats() for name, c in components.items()}}
+    zones = camera_zones.get(camera_id)
+    if zones is not None:
+        stats["zones"] = zones.stats()
+    return stats
+
+def configure_camera_zones(camera_id: int, zones: list):
+    """Reemplaza las zonas de una cámara de este proceso (lista vacía = sin zonas). Retorna la configuración."""
+    if zones:
+        camera_zones[camera_id] = ZoneSet.from_config(zones)
+    else:
+        camera_zones.pop(camera_id, None)
+    return zones
+
+def camera_zone_config(camera_id: int):
+    """Configuración de las zonas de una cámara de este proceso."""
+    zones = camera_zones.get(camera_id)
+    return zones.to_config() if zones is not None else []
+
+def configure_camera_rate(camera_id: int, overrides: dict):
+    """Aplica ajustes de tasa a una cámara de este proceso. Retorna la configuración o None."""
+    return RATE_CONTROLLER.configure_camera(camera_id, **overrides)
+
+def configure_node_rate(settings: dict, num_processes: int = 1):
+    """Aplica ajustes del nodo al controlador de este proceso (repartiendo el presupuesto)."""
+    if settings.get("target_dps") is not None:
+        settings = {**settings, "target_dps": settings["target_dps"] / num_processes}
+    RATE_CONTROLLER.configure_node(**settings)
+    return RATE_CONTROLLER.stats()
+
+def rate_stats():
+    """Estado del controlador de tasa de este proceso."""
+    return RATE_CONTROLLER.stats()
+
+def model_status():
+    """Estado de la carga del modelo en este proceso (None si aquí no se analiza)."""
+    return MODEL_LOADER.status() if MODEL_LOADER is not None else None
+
+async def model_readiness() -> dict:
     """
-    Endpoint para iniciar el análisis de una cámara.
-    Spring Boot llama a este endpoint.
+    Si el modelo está listo donde corre el análisis: este proceso o, en modo "process",
+    todos los trabajadores (cada uno carga el suyo).
+    """
+    if process_engine is not None:
+        statuses = await asyncio.to_thread(process_engine.call_all, "model_status")
+    elif MODEL_LOADER is not None:
+        statuses = [MODEL_LOADER.status()]
+    else:
+        statuses = []  # Modo "process" antes de levantar el pool
+    ready = bool(statuses) and all(item is not None and item["state"] == "ready" for item in statuses)
+    return {"ready": ready, "models": statuses}
+
+def local_load() -> dict:
+    """Carga de este proceso para el reporte al coordinador."""
+    scheduler = INFERENCE_SCHEDULER.stats() if INFERENCE_SCHEDULER is not None else None
+    return {
+        "cameras": len(camera_pipelines),
+        "frames": sum(value for _, _, value in FRAMES_PROCESSED.samples()),
+        "inference_ms": scheduler["frame_cost_ms"] if scheduler else None,
+        "pending": scheduler["pending"] if scheduler else 0,
+    }
+
+async def node_load() -> dict:
+    """Carga de todo el nodo: suma la de los trabajadores en modo "process"."""
+    if process_engine is not None:
+        loads = await asyncio.to_thread(process_engine.call_all, "local_load")
+    else:
+        loads = [local_load()]
+    costs = [load["inference_ms"] for load in loads if load["inference_ms"] is not None]
+    cpu_count = os.cpu_count() or 1
+    return {
+        "cpu": round(os.getloadavg()[0] / cpu_count, 3) if hasattr(os, "getloadavg") else None,
+        "cameras": sum(load["cameras"] for load in loads),
+        "frames": sum(load["frames"] for load in loads),
+        "inference_ms": round(sum(costs) / len(costs), 2) if costs else None,
+        "pending": sum(load["pending"] for load in loads),
+    }
+
+async def report_to_coordinator():
+    """
+    Reporta cada NODE_REPORT_INTERVAL_S segundos la carga y las cámaras activas de este
+    nodo al coordinador. El primer reporte registra el nodo; si deja de reportar, el
+    coordinador mueve sus cámaras a otros nodos.
+    """
+    last_frames, last_time = None, None
+    reachable = None
+    while True:
+        try:
+            load = await node_load()
+            now = time.monotonic()
+            # Frames analizados por segundo desde el reporte anterior (los contadores de
+            # una cámara detenida desaparecen, por eso no puede ser negativo)
+            load["fps"] = (round(max(0.0, load["frames"] - last_frames) / (now - last_time), 2)
+                           if last_time is not None else None)
+            last_frames, last_time = load["frames"], now
+            readiness = await model_readiness()
+            report = {
+                "node_id": NODE_ID,
+                "url": NODE_URL,
+                "capacity": NODE_CAPACITY,
+                "ready": readiness["ready"],
+                "cameras": sorted(active_analysis_threads),
+                "load": load,
+            }
+            response = await asyncio.to_thread(
+                requests.post, f"{COORDINATOR_URL}/nodes/heartbeat", json=report, timeout=5
+            )
+            response.raise_for_status()
+            if not reachable:
+                print(f"Nodo {NODE_ID} conectado al coordinador {COORDINATOR_URL}.")
+            reachable = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if reachable is not False:  # Solo se avisa al perder la conexión, no en cada intento
+                print(f"Advertencia: No se pudo reportar al coordinador {COORDINATOR_URL}: {e}")
+            reachable = False
+        await asyncio.sleep(NODE_REPORT_INTERVAL_S)
+
+# --- Ciclo de vida de la aplicación ---
+@app.on_event("startup")
+async def startup_event():
+    """
+    Empieza a cargar el modelo (sin esperarlo), en modo "process" levanta el pool de
+    procesos trabajadores y luego vuelve a iniciar las cámaras guardadas en el registro.
     """
+    global process_engine
+    if MODEL_LOADER is not None:
+        # En segundo plano: el servidor empieza a atender mientras se carga el modelo
+        MODEL_LOADER.start()
+
+    if ANALYTICS_EXECUTION_MODE == "process":
+        cpu_count = os.cpu_count() or 1
+        process_engine = ProcessAnalysisEngine(
+            ANALYTICS_WORKER_PROCESSES,
+            threads_per_worker=max(1, cpu_count // max(1, ANALYTICS_WORKER_PROCESSES)),
+            # Con ANALYSIS_DECODER="ffmpeg" la decodificación ya ocurre en un proceso ffmpeg
+            capture_processes=ANALYTICS_CAPTURE_PROCESSES and ANALYSIS_DECODER != "ffmpeg",
+            frame_scale=FRAME_SCALE,
+            frame_slots=SHARED_FRAME_SLOTS,
+            reconnect_delay=RECONNECT_DELAY_S,
+            frame_width=ANALYSIS_WIDTH
+        )
+        process_engine.on_frame = FRAME_HUB.publish_jpeg
+        process_engine.start()
+
+    global restore_task
+    if CAMERA_REGISTRY is not None and len(CAMERA_REGISTRY):
+        # En segundo plano: el servicio responde mientras las cámaras se van levantando
+        restore_task = asyncio.create_task(restore_cameras())
+
+    global report_task
+    if COORDINATOR_URL:
+        report_task = asyncio.create_task(report_to_coordinator())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Detiene todos los análisis activos y el pool de procesos (si existe).
+    El registro no se toca: las cámaras se vuelven a levantar en el próximo arranque.
+    """
+    if restore_task is not None:
+        restore_task.cancel()
+    if report_task is not None:
+        report_task.cancel()
+    if MODEL_LOADER is not None:
+        MODEL_LOADER.stop()
+    for stop_event in list(active_analysis_threads.values()):
+        stop_event.set()
+    active_analysis_threads.clear()
+    if process_engine is not None:
+        process_engine.shutdown()
+    if ALERT_DISPATCHER is not None:
+        ALERT_DISPATCHER.stop()  # Lo que no se alcanzó a enviar queda en disco
+    if CAMERA_REGISTRY is not None:
+        CAMERA_REGISTRY.close()
+
+async def launch_analysis(request: CameraRequest):
+    """Inicia el pipeline de una cámara. Lanza HTTPException si no se puede."""
     camera_id = request.camera_id
     rtsp_url = request.rtsp_url
+    stream_name = request.stream_name or f"cam_{camera_id}"
+    analysis_url = request.analysis_url
+    publish_url = None
 
-    if camera_id in active_analysis_threads:
+    if camera_id in active_analysis_threads or camera_id in starting_analyses:
         print(f"Advertencia: Se intentó iniciar análisis para {camera_id}, pero ya estaba activo.")
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="El análisis para esta cámara ya está en ejecución."
         )
 
-    # Creamos un "evento" para poder detener el hilo más tarde
-    stop_event = threading.Event()
+    zones = validate_zones(request.zones) if request.zones is not None else None
 
-    # Creamos el hilo (thread)
-    analysis_thread = threading.Thread(
-        target=analyze_camera_stream,
-        args=(camera_id, rtsp_url, stop_event),
-        daemon=True  # Hilo 'daemon' para que termine si la app principal muere
-    )
+    starting_analyses.add(camera_id)
+    try:
+        if ANALYTICS_SOURCE == "relay":
+            # Handshake: streamingService publica la cámara y avisa cuando MediaMTX ya la tiene
+            try:
+                ready = await asyncio.to_thread(ensure_relay, STREAMING_SERVICE_URL, stream_name, rtsp_url,
+                                                None, RELAY_READY_TIMEOUT_S)
+            except requests.RequestException as e:
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=f"No se pudo preparar el relay en streamingService: {e}"
+                )
+            if not ready:
+                # El grabber reintentará la conexión por su cuenta
+                print(f"Advertencia: El relay de la cámara {camera_id} aún no está listo.")
+            if analysis_url is None:
+                # Sin substream se analiza el relay; con substream, la cámara lo sirve aparte
+                analysis_url = relay_url(MEDIAMTX_RTSP_URL, stream_name)
+        elif ANALYTICS_SOURCE == "pipe":
+            publish_url = relay_url(MEDIAMTX_RTSP_URL, stream_name)
+
+        if process_engine is not None:
+            # Modo "process": el pipeline corre en un trabajador; el evento de parada es remoto
+            active_analysis_threads[camera_id] = process_engine.start_camera(
+                camera_id, rtsp_url, publish_url, analysis_url
+            )
+            if zones is not None:
+                await asyncio.to_thread(process_engine.call_camera, camera_id, "configure_camera_zones",
+                                        camera_id, zones)
+        else:
+            if zones is not None:
+                configure_camera_zones(camera_id, zones)
 
-    # Guardamos la referencia al evento de parada
-    active_analysis_threads[camera_id] = stop_event
+            # Creamos un "evento" para poder detener el hilo más tarde
+            stop_event = threading.Event()
 
-    # Iniciamos el hilo
-    analysis_thread.start()
+            # Creamos el hilo (thread)
+            analysis_thread = threading.Thread(
+                target=analyze_camera_stream,
+                args=(camera_id, rtsp_url, stop_event, False, publish_url, analysis_url),
+                name=f"analysis-{camera_id}",
+                daemon=True  # Hilo 'daemon' para que termine si la app principal muere
+            )
+
+            # Guardamos la referencia al evento de parada
+            active_analysis_threads[camera_id] = stop_event
+
+            # Iniciamos el hilo
+            analysis_thread.start()
+    finally:
+        starting_analyses.discard(camera_id)
 
     print(f"Análisis iniciado para cámara {camera_id}.")
-    return {"status": "success", "message": f"Análisis iniciado para la cámara {camera_id}."}
+
+def halt_analysis(camera_id: int):
+    """Detiene el pipeline de una cámara. Lanza HTTPException si no estaba activo."""
+    if camera_id not in active_analysis_threads:
+        print(f"Advertencia: Se intentó detener análisis para {camera_id}, pero no estaba activo.")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No se encontró ningún análisis activo para esta cámara."
+        )
+
+    # Obtenemos el evento de parada y le damos la señal
+    stop_event = active_analysis_threads[camera_id]
+    stop_event.set()  # Esto hará que el bucle 'while not stop_event.is_set()' termine
+
+    # Limpiamos el diccionario
+    del active_analysis_threads[camera_id]
+
+    print(f"Análisis detenido para cámara {camera_id}.")
+
+async def launch_many(requests_: list, stagger: float = 0.0) -> list:
+    """
+    Inicia varias cámaras a la vez. Cada una arranca `stagger` segundos después de la
+    anterior (para no abrir todas las conexiones RTSP en el mismo instante), pero sin
+    esperar a que la anterior termine: el tiempo total no crece con los reintentos de
+    ninguna cámara. Retorna el resultado de cada una, en el mismo orden.
+    """
+    async def launch_one(index: int, request: CameraRequest) -> dict:
+        if stagger:
+            await asyncio.sleep(index * stagger)
+        try:
+            await launch_analysis(request)
+        except HTTPException as e:
+            state = "already_running" if e.status_code == status.HTTP_409_CONFLICT else "error"
+            return {"camera_id": request.camera_id, "status": state, "detail": e.detail}
+        except Exception as e:
+            return {"camera_id": request.camera_id, "status": "error", "detail": str(e)}
+        return {"camera_id": request.camera_id, "status": "started"}
+
+    return list(await asyncio.gather(*(launch_one(index, request) for index, request in enumerate(requests_))))
+
+def remember_camera(request: CameraRequest):
+    if CAMERA_REGISTRY is not None:
+        CAMERA_REGISTRY.save(request.camera_id, request.model_dump())
+
+def forget_camera(camera_id: int):
+    if CAMERA_REGISTRY is not None:
+        CAMERA_REGISTRY.remove(camera_id)
+
+async def restore_cameras():
+    """Vuelve a iniciar todas las cámaras del registro (arranque en caliente)."""
+    started_at = time.time()
+    requests_ = []
+    for key, config in CAMERA_REGISTRY.load().items():
+        try:
+            requests_.append(CameraRequest(**config))
+        except ValueError as e:
+            print(f"Advertencia: Configuración inválida en el registro para la cámara {key}: {e}")
+
+    print(f"Restaurando {len(requests_)} cámaras desde el registro...")
+    results = await launch_many(requests_, WARM_RESTART_STAGGER_S)
+    failed = [result for result in results if result["status"] == "error"]
+    for result in failed:
+        # Se queda en el registro: se reintenta en el próximo arranque o con /analyze
+        print(f"Error al restaurar la cámara {result['camera_id']}: {result['detail']}")
+    print(f"Registro restaurado: {len(results) - len(failed)}/{len(results)} cámaras "
+          f"en {time.time() - started_at:.1f}s.")
+
+# --- Endpoints de la API ---
+@app.get("/health/live")
+async def health_live():
+    """El proceso responde (no dice nada del modelo): para reiniciarlo si se cuelga."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """
+    Listo para analizar: el modelo está cargado. Mientras no lo esté responde 503
+    (con el estado y el error de la carga) para que no se le envíe tráfico.
+    """
+    readiness = await model_readiness()
+    body = {
+        "status": "ready" if readiness["ready"] else (
+            "failed" if any(item and item["state"] == "failed" for item in readiness["models"]) else "loading"),
+        **readiness,
+        "restoring": restore_task is not None and not restore_task.done(),
+    }
+    if not readiness["ready"]:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return body
+
+@app.post("/analyze")
+async def start_analysis(request: CameraRequest):
+    """
+    Endpoint para iniciar el análisis de una cámara.
+    Spring Boot llama a este endpoint.
+    """
+    await launch_analysis(request)
+    remember_camera(request)
+    if not (await model_readiness())["ready"]:
+        # Aceptada: el hilo de la cámara arranca el análisis en cuanto el modelo termina de cargar
+        return {"status": "queued",
+                "message": f"Análisis de la cámara {request.camera_id} en cola hasta que cargue el modelo."}
+    return {"status": "success", "message": f"Análisis iniciado para la cámara {request.camera_id}."}
 
 @app.post("/stop-analyze")
 async def stop_analysis(request: CameraRequest):
@@ -238,19 +1132,369 @@ async def stop_analysis(request: CameraRequest):
     """
     camera_id = request.camera_id
 
+    # Detener explícitamente es la única forma de sacar una cámara del registro
+    forget_camera(camera_id)
+    halt_analysis(camera_id)
+
+    return {"status": "success", "message": f"Análisis detenido para la cámara {camera_id}."}
+
+@app.post("/analyze/bulk")
+async def start_analysis_bulk(request: BulkCameraRequest):
+    """
+    Inicia varias cámaras en una sola petición (a la vez, escalonadas). No falla si
+    alguna no se puede iniciar: retorna el resultado de cada una.
+    """
+    results = await launch_many(request.cameras, WARM_RESTART_STAGGER_S)
+    for camera, result in zip(request.cameras, results):
+        if result["status"] == "started":
+            remember_camera(camera)
+    started = sum(1 for result in results if result["status"] == "started")
+    print(f"Inicio masivo: {started}/{len(results)} cámaras iniciadas.")
+    return {"started": started, "results": results}
+
+@app.post("/stop-analyze/bulk")
+async def stop_analysis_bulk(request: BulkStopRequest):
+    """Detiene varias cámaras (o todas, si no se indica `camera_ids`) y las saca del registro."""
+    camera_ids = request.camera_ids if request.camera_ids is not None else list(active_analysis_threads)
+    results = []
+    for camera_id in camera_ids:
+        forget_camera(camera_id)
+        try:
+            halt_analysis(camera_id)
+            results.append({"camera_id": camera_id, "status": "stopped"})
+        except HTTPException as e:
+            results.append({"camera_id": camera_id, "status": "not_running", "detail": e.detail})
+    stopped = sum(1 for result in results if result["status"] == "stopped")
+    return {"stopped": stopped, "results": results}
+
+@app.get("/cameras")
+async def list_cameras():
+    """Cámaras del registro persistente y si su análisis está activo ahora."""
+    registered = CAMERA_REGISTRY.load() if CAMERA_REGISTRY is not None else {}
+    cameras = [
+        {**config, "active": int(key) in active_analysis_threads}
+        for key, config in registered.items()
+    ]
+    return {
+        "registry_enabled": CAMERA_REGISTRY is not None,
+        "restoring": restore_task is not None and not restore_task.done(),
+        "active": len(active_analysis_threads),
+        "cameras": cameras,
+    }
+
+@app.get("/analyze/{camera_id}/stats")
+async def analysis_stats(camera_id: int):
+    """Contadores del pipeline de una cámara (frames capturados, descartados, reconexiones...)."""
+    stats = None
+    if camera_id in active_analysis_threads:
+        if process_engine is not None:
+            stats = await asyncio.to_thread(process_engine.camera_stats, camera_id)
+        else:
+            stats = collect_camera_stats(camera_id)
+
+    if stats is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No se encontró ningún análisis activo para esta cámara."
+        )
+    return stats
+
+@app.get("/analyze/{camera_id}/rate")
+async def get_camera_rate(camera_id: int):
+    """Intervalo de inferencia actual y ajustes manuales de una cámara."""
+    stats = await analysis_stats(camera_id)
+    return {"camera_id": camera_id, **stats["rate"]}
+
+@app.put("/analyze/{camera_id}/rate")
+async def update_camera_rate(camera_id: int, config: CameraRateConfig):
+    """
+    Ajusta en caliente la tasa de inferencia de una cámara.
+    Los campos min/max/fixed en null vuelven al cálculo automático.
+    """
+    overrides = {
+        "weight": config.weight,
+        "min_interval": config.min_interval_s,
+        "max_interval": config.max_interval_s,
+        "fixed_interval": config.fixed_interval_s,
+    }
+
+    result = None
+    if camera_id in active_analysis_threads:
+        if process_engine is not None:
+            result = await asyncio.to_thread(process_engine.call_camera, camera_id, "configure_camera_rate",
+                                             camera_id, overrides)
+        else:
+            result = configure_camera_rate(camera_id, overrides)
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No se encontró ningún análisis activo para esta cámara."
+        )
+    return {"camera_id": camera_id, **result}
+
+def validate_zones(zones: List[ZoneConfig]) -> list:
+    """Convierte las zonas recibidas a dicts, validándolas antes de enviarlas al pipeline."""
+    config = [zone.model_dump() for zone in zones]
+    try:
+        ZoneSet.from_config(config)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return config
+
+@app.get("/analyze/{camera_id}/zones")
+async def get_camera_zones(camera_id: int):
+    """Zonas configuradas de una cámara."""
+    result = None
+    if camera_id in active_analysis_threads:
+        if process_engine is not None:
+            result = await asyncio.to_thread(process_engine.call_camera, camera_id, "camera_zone_config", camera_id)
+        else:
+            result = camera_zone_config(camera_id)
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No se encontró ningún análisis activo para esta cámara."
+        )
+    return {"camera_id": camera_id, "zones": result}
+
+@app.put("/analyze/{camera_id}/zones")
+async def update_camera_zones(camera_id: int, config: CameraZonesConfig):
+    """
+    Reemplaza en caliente las zonas de una cámara (una lista vacía las elimina).
+    Las máscaras se recalculan una sola vez, con el siguiente frame.
+    """
+    zones = validate_zones(config.zones)
+
+    result = None
+    if camera_id in active_analysis_threads:
+        if process_engine is not None:
+            result = await asyncio.to_thread(process_engine.call_camera, camera_id, "configure_camera_zones",
+                                             camera_id, zones)
+        else:
+            result = configure_camera_zones(camera_id, zones)
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No se encontró ningún análisis activo para esta cámara."
+        )
+    if CAMERA_REGISTRY is not None:
+        # Las zonas sobreviven al reinicio junto con el resto de la configuración
+        config = CAMERA_REGISTRY.get(camera_id)
+        if config is not None:
+            CAMERA_REGISTRY.save(camera_id, {**config, "zones": zones or None})
+    return {"camera_id": camera_id, "zones": result}
+
+@app.get("/inference/rate")
+async def get_node_rate():
+    """Presupuesto de inferencia del nodo y reparto actual entre cámaras."""
+    if process_engine is not None:
+        return {"workers": await asyncio.to_thread(process_engine.call_all, "rate_stats")}
+    return RATE_CONTROLLER.stats()
+
+@app.put("/inference/rate")
+async def update_node_rate(config: NodeRateConfig):
+    """Ajusta en caliente el presupuesto de inferencia del nodo y los límites por defecto."""
+    settings = {
+        "target_dps": config.target_dps,
+        "min_interval": config.min_interval_s,
+        "max_interval": config.max_interval_s,
+        "occupied_weight": config.occupied_weight,
+    }
+    if process_engine is not None:
+        results = await asyncio.to_thread(process_engine.call_all, "configure_node_rate", settings,
+                                          process_engine.num_workers)
+        return {"workers": results}
+    return configure_node_rate(settings)
+
+# --- Observabilidad ---
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas en formato de texto de Prometheus (de este proceso y de cada trabajador)."""
+    families = metrics_families()
+    if process_engine is not None:
+        families = merge(families, *await asyncio.to_thread(process_engine.call_all, "metrics_families"))
+    return PlainTextResponse(render(families), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/debug/profiler/start")
+async def start_profiler(interval_ms: float = Query(10.0, ge=1, le=1000), duration_s: float = Query(0, ge=0)):
+    """
+    Activa el perfilador por muestreo (en este proceso y en los trabajadores).
+    Con `duration_s` > 0 se apaga solo; si no, hasta /debug/profiler/stop.
+    """
+    duration = duration_s or None
+    result = {"main": profiler_start(interval_ms / 1000, duration)}
+    if process_engine is not None:
+        result["workers"] = await asyncio.to_thread(process_engine.call_all, "profiler_start",
+                                                    interval_ms / 1000, duration)
+    return result
+
+@app.post("/debug/profiler/stop")
+async def stop_profiler():
+    result = {"main": profiler_stop()}
+    if process_engine is not None:
+        result["workers"] = await asyncio.to_thread(process_engine.call_all, "profiler_stop")
+    return result
+
+@app.get("/debug/profiler")
+async def profiler_results(output: str = Query("top", pattern="^(top|collapsed)$"), limit: int = Query(25, ge=1),
+                           thread: Optional[str] = None):
+    """
+    Resultados del perfilador: "top" (funciones con más muestras, JSON) o "collapsed"
+    (pilas colapsadas en texto, para flamegraph.pl o speedscope). `thread` filtra por
+    prefijo del nombre del hilo (p.ej. "analysis-" o "inference-scheduler").
+    """
+    reports = [profiler_report(output, limit, thread)]
+    if process_engine is not None:
+        reports += await asyncio.to_thread(process_engine.call_all, "profiler_report", output, limit, thread)
+    if output == "collapsed":
+        return PlainTextResponse("\n".join(report for report in reports if report) + "\n")
+    return {"processes": [report for report in reports if report is not None]}
+
+# --- Video anotado (modo headless) ---
+
+def set_remote_viewer(camera_id: int, fps: float = None, quality: int = None):
+    """(Trabajador) Activa o desactiva el envío de frames anotados de una cámara al proceso principal."""
+    FRAME_HUB.set_remote_viewer(camera_id, fps, quality)
+    return True
+
+async def _add_viewer(camera_id: int, fps: float, quality: int) -> int:
     if camera_id not in active_analysis_threads:
-        print(f"Advertencia: Se intentó detener análisis para {camera_id}, pero no estaba activo.")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No se encontró ningún análisis activo para esta cámara."
         )
+    viewer_id = FRAME_HUB.add_viewer(camera_id, fps, quality)
+    await _sync_remote_viewer(camera_id)
+    return viewer_id
 
-    # Obtenemos el evento de parada y le damos la señal
-    stop_event = active_analysis_threads[camera_id]
-    stop_event.set()  # Esto hará que el bucle 'while not stop_event.is_set()' termine
+async def _remove_viewer(camera_id: int, viewer_id: int):
+    FRAME_HUB.remove_viewer(camera_id, viewer_id)
+    await _sync_remote_viewer(camera_id)
 
-    # Limpiamos el diccionario
-    del active_analysis_threads[camera_id]
+async def _sync_remote_viewer(camera_id: int):
+    """En modo "process", avisa al trabajador de la cámara del fps/calidad que se necesitan."""
+    if process_engine is None:
+        return
+    settings = FRAME_HUB.viewer_settings(camera_id)
+    fps, quality = settings if settings is not None else (None, None)
+    await asyncio.to_thread(process_engine.call_camera, camera_id, "set_remote_viewer", camera_id, fps, quality)
 
-    print(f"Análisis detenido para cámara {camera_id}.")
-    return {"status": "success", "message": f"Análisis detenido para la cámara {camera_id}."}
\ No newline at end of file
+async def _jpeg_frames(camera_id: int, fps: float, quality: int):
+    """Generador de frames JPEG nuevos de una cámara al ritmo pedido por el cliente."""
+    last_seq = None
+    interval = 1.0 / fps
+    while camera_id in active_analysis_threads:
+        started = time.monotonic()
+        latest = await asyncio.to_thread(FRAME_HUB.latest_jpeg, camera_id, quality)
+        if latest is not None and latest[0] != last_seq:
+            last_seq = latest[0]
+            yield latest[1]
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+@app.get("/video/{camera_id}/mjpeg")
+async def video_mjpeg(camera_id: int, fps: float = Query(5.0, gt=0, le=30), quality: int = Query(70, ge=10, le=95)):
+    """Video anotado de una cámara como MJPEG sobre HTTP (se puede usar directo en un <img>)."""
+    viewer_id = await _add_viewer(camera_id, fps, quality)
+
+    async def stream():
+        try:
+            async for data in _jpeg_frames(camera_id, fps, quality):
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " +
+                       str(len(data)).encode() + b"\r\n\r\n" + data + b"\r\n")
+        finally:
+            await _remove_viewer(camera_id, viewer_id)
+
+    return StreamingResponse(stream(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+@app.get("/video/{camera_id}/snapshot.jpg")
+async def video_snapshot(camera_id: int, quality: int = Query(80, ge=10, le=95), timeout: float = Query(3.0, gt=0, le=10)):
+    """Un único frame anotado de la cámara."""
+    viewer_id = await _add_viewer(camera_id, 1.0 / timeout, quality)
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            latest = await asyncio.to_thread(FRAME_HUB.latest_jpeg, camera_id, quality)
+            if latest is not None:
+                return Response(content=latest[1], media_type="image/jpeg")
+            await asyncio.sleep(0.05)
+    finally:
+        await _remove_viewer(camera_id, viewer_id)
+
+    raise HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail="La cámara no produjo ningún frame a tiempo."
+    )
+
+@app.websocket("/video/{camera_id}/ws")
+async def video_websocket(websocket: WebSocket, camera_id: int, fps: float = 5.0, quality: int = 70):
+    """Video anotado de una cámara como mensajes binarios JPEG por WebSocket."""
+    fps = min(max(fps, 0.1), 30.0)
+    quality = min(max(quality, 10), 95)
+    if camera_id not in active_analysis_threads:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    viewer_id = await _add_viewer(camera_id, fps, quality)
+    try:
+        async for data in _jpeg_frames(camera_id, fps, quality):
+            await websocket.send_bytes(data)
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # El cliente se desconectó
+    finally:
+        await _remove_viewer(camera_id, viewer_id)
+
+def alert_stats():
+    """Estado del envío de alertas de este proceso."""
+    return ALERT_DISPATCHER.stats() if ALERT_DISPATCHER is not None else None
+
+@app.get("/alerts/stats")
+async def alerts_stats():
+    """Alertas encoladas, fusionadas, enviadas, descartadas y pendientes en disco."""
+    if process_engine is not None:
+        return {"workers": await asyncio.to_thread(process_engine.call_all, "alert_stats")}
+    return await asyncio.to_thread(alert_stats)
+
+@app.get("/workers")
+async def list_workers():
+    """Procesos trabajadores y cámaras asignadas (solo en modo "process")."""
+    if process_engine is None:
+        return {"mode": ANALYTICS_EXECUTION_MODE, "workers": []}
+    return {"mode": ANALYTICS_EXECUTION_MODE, "workers": process_engine.workers()}
+
+@app.get("/inference/stats")
+async def inference_stats():
+    """Estadísticas del planificador de inferencia por lotes de este proceso."""
+    if INFERENCE_SCHEDULER is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El modelo YOLO no está cargado."
+        )
+    stats = {**INFERENCE_SCHEDULER.stats(), "detector": DETECTOR.stats()}
+    if DETECTION_CASCADE != "none":
+        stats["cascade"] = {
+            "mode": DETECTION_CASCADE,
+            "proposal": PROPOSAL_SCHEDULER.stats() if PROPOSAL_SCHEDULER is not None else None,
+            "face": FACE_SCHEDULER.stats() if FACE_SCHEDULER is not None else None,
+        }
+    return stats
+
+def detector_stats():
+    """Backend de detección de este proceso y su latencia medida."""
+    return DETECTOR.stats() if DETECTOR is not None else None
+
+@app.get("/inference/backend")
+async def inference_backend():
+    """Backend de detección en uso, latencia de calentamiento y latencia por frame en producción."""
+    if process_engine is not None:
+        return {"workers": await asyncio.to_thread(process_engine.call_all, "detector_stats")}
+    if DETECTOR is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El modelo YOLO no está cargado."
+        )
+    return DETECTOR.stats()
\ No newline at end of file
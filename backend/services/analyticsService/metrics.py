@@ -0,0 +1,215 @@
+import bisect
+import math
+import threading
+
+# Límites (en segundos) de los histogramas de latencia: de 1 ms a 10 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # El último es +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """
+    Métrica con etiquetas al estilo Prometheus.
+
+    Pensada para el bucle de frames: `labels()` cachea el hijo de cada combinación de
+    etiquetas y las actualizaciones son una suma sobre un atributo, sin locks. Cada
+    serie (p.ej. una cámara) la actualiza un solo hilo, así que no hay carreras.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def remove(self, *values):
+        """Elimina la serie de una combinación de etiquetas (p.ej. al detener una cámara)."""
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in values), None)
+
+    def _series(self):
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), child) for key, child in self._children.items()]
+
+    def samples(self) -> list:
+        return [(self.name, labels, child.value) for labels, child in self._series()]
+
+    def family(self) -> dict:
+        return {"name": self.name, "type": self.type, "help": self.documentation, "samples": self.samples()}
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry: "Registry" = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> list:
+        samples = []
+        for labels, child in self._series():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), list(child.counts)):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_count", labels, cumulative))
+            samples.append((f"{self.name}_sum", labels, child.sum))
+        return samples
+
+
+class Registry:
+    """
+    Conjunto de métricas de un proceso. Los "collectors" son funciones que construyen
+    familias al momento de consultar /metrics (para valores que ya existen en otros
+    objetos, como los contadores de cada `FrameGrabber`).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric: Metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self) -> list:
+        """Familias como estructuras simples (se pueden enviar entre procesos)."""
+        families = [metric.family() for metric in self._metrics]
+        for collector in self._collectors:
+            families.extend(collector())
+        return families
+
+
+def family(name: str, metric_type: str, documentation: str, samples: list) -> dict:
+    """Familia construida a mano por un collector: samples = [(labels, valor)]."""
+    return {"name": name, "type": metric_type, "help": documentation,
+            "samples": [(name, labels, value) for labels, value in samples]}
+
+
+def merge(*family_lists) -> list:
+    """Une las familias de varios procesos (mismo nombre -> se concatenan las muestras)."""
+    merged = {}
+    for families in family_lists:
+        for item in families or []:
+            existing = merged.get(item["name"])
+            if existing is None:
+                merged[item["name"]] = {**item, "samples": list(item["samples"])}
+            else:
+                existing["samples"].extend(item["samples"])
+    return list(merged.values())
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(families: list) -> str:
+    """Formato de exposición de texto de Prometheus (versión 0.0.4)."""
+    lines = []
+    for item in families:
+        lines.append(f"# HELP {item['name']} {_escape(item['help'])}")
+        lines.append(f"# TYPE {item['name']} {item['type']}")
+        for name, labels, value in item["samples"]:
+            if value is None:
+                continue
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
@@ -0,0 +1,82 @@
+import threading
+import time
+
+
+class ModelLoader:
+    """
+    Carga el detector en un hilo propio para que la API responda desde el primer momento.
+
+    Importar torch/ultralytics y calentar el modelo tarda varios segundos; mientras tanto
+    el servicio ya acepta peticiones y las cámaras esperan en `wait()`. Si la carga falla
+    no se sigue sin modelo: el estado queda en "failed" (visible en /health/ready) y se
+    reintenta cada `retry_delay` segundos.
+
+    Estados: "pending" -> "loading" -> "ready" | "failed".
+    """
+
+    def __init__(self, factory, retry_delay: float = 30.0):
+        self.factory = factory  # Callable sin argumentos que retorna el detector ya calentado
+        self.retry_delay = retry_delay
+        self.on_ready = None    # Callback(detector), se invoca desde el hilo de carga antes de quedar "ready"
+
+        self.detector = None
+        self.state = "pending"
+        self.error = None
+        self.attempts = 0
+        self.load_seconds = None
+
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._created_at = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Bloquea hasta que el modelo esté listo (o hasta `timeout`). Retorna si está listo."""
+        return self._ready.wait(timeout)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.state = "loading"
+            self.attempts += 1
+            start = time.monotonic()
+            try:
+                detector = self.factory()
+                # Si `on_ready` falla el modelo no sirve (nadie lo usaría): cuenta como carga fallida
+                if self.on_ready is not None:
+                    self.on_ready(detector)
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                print(f"Error al cargar el modelo (intento {self.attempts}): {e}. "
+                      f"Reintentando en {self.retry_delay:.0f} segundos...")
+                self._stop_event.wait(self.retry_delay)
+                continue
+
+            self.load_seconds = time.monotonic() - start
+            self.detector = detector
+            self.error = None
+            self.state = "ready"
+            self._ready.set()
+            return
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "attempts": self.attempts,
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "age_seconds": round(time.monotonic() - self._created_at, 1),
+        }
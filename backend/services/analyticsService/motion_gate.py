@@ -0,0 +1,108 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Pre-filtro barato que decide, frame a frame, si vale la pena ejecutar YOLO.
+
+    Compara una versión reducida y en escala de grises del frame contra un fondo
+    que se actualiza lentamente (media móvil). Si la fracción de píxeles que cambió
+    supera `area_threshold` hay movimiento y se infiere; si no, se omite la inferencia.
+    Cada `refresh_interval` segundos se fuerza una inferencia igualmente, para que una
+    persona quieta siga detectándose.
+    """
+
+    def __init__(self, area_threshold: float = 0.002, refresh_interval: float = 5.0,
+                 downscale_width: int = 160, pixel_threshold: int = 25, learning_rate: float = 0.05):
+        self.area_threshold = area_threshold
+        self.refresh_interval = refresh_interval
+        self.downscale_width = downscale_width
+        self.pixel_threshold = pixel_threshold
+        self.learning_rate = learning_rate
+
+        self._background = None
+        self._last_inference = 0.0
+        self.last_mask = None  # Máscara binaria (reducida) del último frame comparado
+
+        # Contadores
+        self.frames_checked = 0
+        self.frames_gated = 0
+        self.frames_inferred = 0
+        self.frames_forced = 0
+        self.last_motion_ratio = 0.0
+
+    def _preprocess(self, frame: np.ndarray) -> np.ndarray:
+        height = max(1, int(frame.shape[0] * self.downscale_width / frame.shape[1]))
+        small = cv2.resize(frame, (self.downscale_width, height), interpolation=cv2.INTER_NEAREST)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def motion_ratio(self, frame: np.ndarray) -> float:
+        """Fracción del frame que difiere del fondo (y actualiza el fondo)."""
+        gray = self._preprocess(frame)
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            self.last_mask = None
+            return 1.0  # Sin referencia todavía: tratamos el frame como "con movimiento"
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+        self.last_mask = mask
+        return cv2.countNonZero(mask) / mask.size
+
+    def motion_regions(self, shape, min_area: float = 0.001) -> np.ndarray:
+        """
+        Rectángulos con movimiento en el último frame comparado, en píxeles de un frame
+        de tamaño `shape` (N×4: x1, y1, x2, y2). Se descartan los más chicos que `min_area`
+        (fracción del frame): ruido del sensor, hojas, etc.
+        """
+        if self.last_mask is None:
+            return np.zeros((0, 4), dtype=np.float32)
+        # Une las manchas de una misma persona antes de buscar contornos
+        mask = cv2.dilate(self.last_mask, np.ones((3, 3), dtype=np.uint8), iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return np.zeros((0, 4), dtype=np.float32)
+
+        rects = np.array([cv2.boundingRect(contour) for contour in contours], dtype=np.float32)
+        rects = rects[rects[:, 2] * rects[:, 3] >= min_area * mask.size]
+        rects[:, 2:] += rects[:, :2]  # x, y, w, h -> x1, y1, x2, y2
+        scale_x, scale_y = shape[1] / mask.shape[1], shape[0] / mask.shape[0]
+        return rects * np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+
+    def should_infer(self, frame: np.ndarray, now: float = None) -> bool:
+        """Retorna True si hay que ejecutar la inferencia sobre este frame."""
+        now = time.time() if now is None else now
+        self.frames_checked += 1
+
+        self.last_motion_ratio = self.motion_ratio(frame)
+        if self.last_motion_ratio >= self.area_threshold:
+            self._last_inference = now
+            self.frames_inferred += 1
+            return True
+
+        if now - self._last_inference >= self.refresh_interval:
+            # Refresco forzado: escena quieta, pero podría haber alguien inmóvil
+            self._last_inference = now
+            self.frames_inferred += 1
+            self.frames_forced += 1
+            return True
+
+        self.frames_gated += 1
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "frames_checked": self.frames_checked,
+            "frames_gated": self.frames_gated,
+            "frames_inferred": self.frames_inferred,
+            "frames_forced": self.frames_forced,
+            "gated_ratio": round(self.frames_gated / self.frames_checked, 3) if self.frames_checked else 0.0,
+            "last_motion_ratio": round(self.last_motion_ratio, 4),
+            "area_threshold": self.area_threshold,
+            "refresh_interval_s": self.refresh_interval,
+        }
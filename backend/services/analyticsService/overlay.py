@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+
+
+def draw_boxes(frame: np.ndarray, boxes: np.ndarray, color, thickness: int = 2, labels=None,
+               font_scale: float = 0.5):
+    """
+    Dibuja todas las cajas (N×4, x1,y1,x2,y2) con una única llamada a `cv2.polylines`
+    en lugar de un `cv2.rectangle` por caja. Las etiquetas son opcionales: `putText`
+    no se puede agrupar, así que solo se pagan cuando alguien las va a ver.
+    """
+    if len(boxes) == 0:
+        return frame
+
+    boxes = np.asarray(boxes).astype(np.int32)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    # Cada caja como un polígono de 4 esquinas: (N, 4, 2)
+    polygons = np.stack([
+        np.stack([x1, y1], axis=1),
+        np.stack([x2, y1], axis=1),
+        np.stack([x2, y2], axis=1),
+        np.stack([x1, y2], axis=1),
+    ], axis=1)
+    cv2.polylines(frame, list(polygons), isClosed=True, color=color, thickness=thickness)
+
+    if labels is not None:
+        for label, x, y in zip(labels, x1.tolist(), y1.tolist()):
+            cv2.putText(frame, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, 2)
+
+    return frame
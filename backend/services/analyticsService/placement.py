@@ -0,0 +1,82 @@
+import bisect
+import hashlib
+import math
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Anillo de hashing consistente con pesos.
+
+    Cada nodo ocupa `peso * vnodes_per_unit` puntos del anillo (nodos virtuales), así
+    que recibe una porción de cámaras proporcional a su capacidad. Al agregar o quitar
+    un nodo solo cambian de dueño las cámaras de los segmentos que ese nodo gana o
+    pierde; el resto se queda donde estaba.
+    """
+
+    def __init__(self, vnodes_per_unit: int = 32):
+        self.vnodes_per_unit = vnodes_per_unit
+        self.weights = {}
+        self._points = []  # Hashes ordenados
+        self._owners = []  # Nodo dueño de cada punto
+
+    def set_nodes(self, weights: dict):
+        """Reconstruye el anillo con { nodo: peso } (no hace nada si no cambió)."""
+        weights = {node: weight for node, weight in weights.items() if weight > 0}
+        if weights == self.weights:
+            return
+        self.weights = weights
+        points = []
+        for node, weight in weights.items():
+            for index in range(max(1, round(weight * self.vnodes_per_unit))):
+                points.append((_hash(f"{node}#{index}"), node))
+        points.sort()
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def candidates(self, key) -> list:
+        """Nodos distintos en el orden del anillo a partir de `key` (el primero es el dueño)."""
+        if not self._points:
+            return []
+        start = bisect.bisect(self._points, _hash(str(key)))
+        seen = []
+        for offset in range(len(self._points)):
+            node = self._owners[(start + offset) % len(self._points)]
+            if node not in seen:
+                seen.append(node)
+                if len(seen) == len(self.weights):
+                    break
+        return seen
+
+    def owner(self, key):
+        candidates = self.candidates(key)
+        return candidates[0] if candidates else None
+
+
+def load_bounds(weights: dict, total_cameras: int, balance_factor: float = 1.25) -> dict:
+    """
+    Máximo de cámaras por nodo ("consistent hashing with bounded loads"): su parte
+    proporcional a la capacidad, con un margen de `balance_factor`.
+    """
+    total_weight = sum(weights.values())
+    if not total_weight:
+        return {}
+    return {node: max(1, math.ceil(balance_factor * total_cameras * weight / total_weight))
+            for node, weight in weights.items()}
+
+
+def choose_node(ring: HashRing, key, counts: dict, bounds: dict, overloaded=(), exclude=()):
+    """
+    Primer nodo, en el orden del anillo, que no esté sobrecargado ni en su límite de
+    cámaras. Si todos lo están, el menos ocupado en proporción a su límite.
+    """
+    candidates = [node for node in ring.candidates(key) if node not in exclude]
+    for node in candidates:
+        if node not in overloaded and counts.get(node, 0) < bounds.get(node, 0):
+            return node
+    if not candidates:
+        return None
+    return min(candidates, key=lambda node: (node in overloaded, counts.get(node, 0) / max(1, bounds.get(node, 1))))
@@ -0,0 +1,301 @@
+import itertools
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import Future
+
+from shared_frames import capture_process_main
+
+
+def _worker_main(worker_index: int, threads_per_worker: int, command_queue, response_queue):
+    """
+    Punto de entrada de cada proceso trabajador.
+    Carga el modelo una sola vez (en segundo plano, sin bloquear los comandos) y ejecuta
+    los pipelines de sus cámaras como hilos, igual que el modo "thread" pero con su propio GIL.
+    """
+    # Marcamos el proceso como trabajador antes de importar main para que prepare el modelo
+    os.environ["ANALYTICS_WORKER_INDEX"] = str(worker_index)
+    # Repartimos los núcleos entre procesos para que no compitan entre sí
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads_per_worker))
+
+    import main
+
+    # Las cámaras que lleguen antes de que termine la carga esperan el modelo en su hilo
+    main.MODEL_LOADER.start()
+
+    # Los frames anotados que pide el proceso principal viajan ya codificados en JPEG
+    main.FRAME_HUB.forward = lambda camera_id, data: response_queue.put(("frame", camera_id, data))
+
+    stop_events = {}
+    while True:
+        command = command_queue.get()
+        action = command[0]
+
+        if action == "start":
+            _, camera_id, rtsp_url, shared_memory, publish_url, analysis_url = command
+            stop_event = threading.Event()
+            threading.Thread(
+                target=main.analyze_camera_stream,
+                args=(camera_id, rtsp_url, stop_event, shared_memory, publish_url, analysis_url),
+                name=f"analysis-{camera_id}",
+                daemon=True
+            ).start()
+            stop_events[camera_id] = stop_event
+
+        elif action == "stop":
+            _, camera_id = command
+            stop_event = stop_events.pop(camera_id, None)
+            if stop_event is not None:
+                stop_event.set()
+
+        elif action == "call":
+            # Invoca una función de main dentro del trabajador y devuelve su resultado
+            _, request_id, function_name, args = command
+            try:
+                result = getattr(main, function_name)(*args)
+            except Exception as e:
+                print(f"Error en el trabajador {worker_index} al ejecutar {function_name}: {e}")
+                result = None
+            response_queue.put(("result", request_id, result))
+
+        elif action == "shutdown":
+            for stop_event in stop_events.values():
+                stop_event.set()
+            if main.ALERT_DISPATCHER is not None:
+                main.ALERT_DISPATCHER.stop()  # Guarda en disco las alertas sin enviar
+            break
+
+
+class RemoteStopEvent:
+    """
+    Sustituto de `threading.Event` para cámaras que corren en un proceso trabajador.
+    Permite que /stop-analyze siga llamando a `.set()` sin saber dónde corre el análisis.
+    """
+
+    def __init__(self, engine: "ProcessAnalysisEngine", camera_id: int):
+        self._engine = engine
+        self._camera_id = camera_id
+        self._is_set = False
+
+    def set(self):
+        if not self._is_set:
+            self._is_set = True
+            self._engine.stop_camera(self._camera_id)
+
+    def is_set(self) -> bool:
+        return self._is_set
+
+
+class ProcessAnalysisEngine:
+    """
+    Reparte los pipelines de cámara entre un pool de procesos trabajadores.
+
+    Cada cámara se asigna al trabajador con menos cámaras. Si un trabajador muere,
+    se vuelve a lanzar y se le reenvían sus cámaras. Con `capture_processes`, cada
+    cámara además tiene su propio proceso de captura que entrega los frames al
+    trabajador a través de un `SharedFrameRing`.
+    """
+
+    def __init__(self, num_workers: int, threads_per_worker: int = 1, capture_processes: bool = False,
+                 frame_scale: float = 0.6, frame_slots: int = 4, reconnect_delay: float = 15.0,
+                 frame_width: int = 0):
+        self.num_workers = max(1, num_workers)
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.capture_processes = capture_processes
+        self.frame_scale = frame_scale
+        self.frame_width = frame_width
+        self.frame_slots = frame_slots
+        self.reconnect_delay = reconnect_delay
+        self._ctx = mp.get_context("spawn")
+
+        self._lock = threading.Lock()
+        self._workers = []  # [(proceso, cola de comandos)]
+        self._assignments = {}  # { camera_id: (worker_index, rtsp_url, publish_url, analysis_url) }
+        self._captures = {}  # { camera_id: (proceso de captura, evento de parada) }
+        self._response_queue = self._ctx.Queue()
+        self._pending = {}  # { request_id: Future }
+        self._request_ids = itertools.count()
+        self._stop_event = threading.Event()
+
+        # Callable(camera_id, jpeg_bytes) que recibe los frames anotados de los trabajadores
+        self.on_frame = None
+
+    def start(self):
+        for index in range(self.num_workers):
+            self._workers.append(self._spawn_worker(index))
+
+        threading.Thread(target=self._read_responses, name="engine-responses", daemon=True).start()
+        threading.Thread(target=self._watch_workers, name="engine-watchdog", daemon=True).start()
+        print(f"Motor de análisis multiproceso iniciado con {self.num_workers} trabajadores.")
+
+    def shutdown(self, timeout: float = 5.0):
+        self._stop_event.set()
+        with self._lock:
+            workers = list(self._workers)
+            captures = list(self._captures.values())
+            self._assignments.clear()
+            self._captures.clear()
+
+        for _, command_queue in workers:
+            command_queue.put(("shutdown",))
+        for _, stop_event in captures:
+            stop_event.set()
+        for process in [process for process, _ in workers] + [process for process, _ in captures]:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+        self._response_queue.put(None)
+
+    def _uses_capture_process(self, publish_url: str) -> bool:
+        # Con un ffmpeg por cámara (modo "pipe") la decodificación ya ocurre en otro proceso
+        return self.capture_processes and publish_url is None
+
+    def start_camera(self, camera_id: int, rtsp_url: str, publish_url: str = None,
+                     analysis_url: str = None) -> RemoteStopEvent:
+        with self._lock:
+            # Asignamos la cámara al trabajador menos cargado
+            load = [0] * self.num_workers
+            for assignment in self._assignments.values():
+                load[assignment[0]] += 1
+            worker_index = load.index(min(load))
+
+            self._assignments[camera_id] = (worker_index, rtsp_url, publish_url, analysis_url)
+            shared_memory = self._uses_capture_process(publish_url)
+            if shared_memory:
+                # El proceso de captura decodifica el substream de análisis si la cámara lo tiene
+                self._captures[camera_id] = self._spawn_capture(camera_id, analysis_url or rtsp_url)
+            self._workers[worker_index][1].put(("start", camera_id, rtsp_url, shared_memory, publish_url,
+                                                analysis_url))
+
+        print(f"Cámara {camera_id} asignada al trabajador {worker_index}.")
+        return RemoteStopEvent(self, camera_id)
+
+    def stop_camera(self, camera_id: int):
+        with self._lock:
+            assignment = self._assignments.pop(camera_id, None)
+            if assignment is not None:
+                self._workers[assignment[0]][1].put(("stop", camera_id))
+            capture = self._captures.pop(camera_id, None)
+
+        if capture is not None:
+            process, stop_event = capture
+            stop_event.set()
+            # Damos tiempo a que cierre y libere su memoria compartida
+            threading.Thread(target=self._reap_capture, args=(process,), daemon=True).start()
+
+    @staticmethod
+    def _reap_capture(process, timeout: float = 5.0):
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+
+    def _call(self, worker_index: int, function_name: str, args: tuple, timeout: float):
+        """Ejecuta `main.<function_name>(*args)` en un trabajador y espera el resultado."""
+        with self._lock:
+            request_id = next(self._request_ids)
+            future = Future()
+            self._pending[request_id] = future
+            self._workers[worker_index][1].put(("call", request_id, function_name, args))
+
+        try:
+            return future.result(timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def call_camera(self, camera_id: int, function_name: str, *args, timeout: float = 2.0):
+        """Ejecuta una función de main en el trabajador dueño de la cámara. Retorna None si no existe."""
+        with self._lock:
+            assignment = self._assignments.get(camera_id)
+        if assignment is None:
+            return None
+        return self._call(assignment[0], function_name, args, timeout)
+
+    def call_all(self, function_name: str, *args, timeout: float = 2.0) -> list:
+        """Ejecuta una función de main en todos los trabajadores; retorna la lista de resultados."""
+        return [self._call(index, function_name, args, timeout) for index in range(self.num_workers)]
+
+    def camera_stats(self, camera_id: int, timeout: float = 2.0):
+        """Pide al trabajador dueño de la cámara sus contadores. Retorna None si no existe."""
+        with self._lock:
+            assignment = self._assignments.get(camera_id)
+        stats = self.call_camera(camera_id, "collect_camera_stats", camera_id, timeout=timeout)
+        if stats is not None:
+            stats["worker"] = assignment[0]
+        return stats
+
+    def workers(self) -> list:
+        with self._lock:
+            return [
+                {
+                    "worker": index,
+                    "pid": process.pid,
+                    "alive": process.is_alive(),
+                    "cameras": sorted(cid for cid, assignment in self._assignments.items() if assignment[0] == index),
+                }
+                for index, (process, _) in enumerate(self._workers)
+            ]
+
+    def _spawn_worker(self, index: int):
+        command_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.threads_per_worker, command_queue, self._response_queue),
+            name=f"analytics-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        return process, command_queue
+
+    def _spawn_capture(self, camera_id: int, rtsp_url: str):
+        stop_event = self._ctx.Event()
+        process = self._ctx.Process(
+            target=capture_process_main,
+            args=(camera_id, rtsp_url, stop_event, self.frame_scale, self.frame_slots, self.reconnect_delay,
+                  self.frame_width),
+            name=f"analytics-capture-{camera_id}",
+            daemon=True
+        )
+        process.start()
+        return process, stop_event
+
+    def _read_responses(self):
+        while not self._stop_event.is_set():
+            try:
+                message = self._response_queue.get()
+            except (EOFError, OSError):
+                break  # La cola se cerró (apagado del intérprete)
+            if message is None:
+                break
+
+            kind, key, payload = message
+            if kind == "frame":
+                if self.on_frame is not None:
+                    self.on_frame(key, payload)
+                continue
+
+            future = self._pending.get(key)
+            if future is not None and not future.done():
+                future.set_result(payload)
+
+    def _watch_workers(self):
+        while not self._stop_event.wait(1.0):
+            with self._lock:
+                for index, (process, _) in enumerate(self._workers):
+                    if process.is_alive() or self._stop_event.is_set():
+                        continue
+
+                    print(f"Advertencia: El trabajador {index} murió (código {process.exitcode}). Relanzando...")
+                    self._workers[index] = self._spawn_worker(index)
+                    command_queue = self._workers[index][1]
+                    for camera_id, (worker_index, rtsp_url, publish_url, analysis_url) in self._assignments.items():
+                        if worker_index == index:
+                            command_queue.put(("start", camera_id, rtsp_url,
+                                               self._uses_capture_process(publish_url), publish_url, analysis_url))
+
+                for camera_id, (process, _) in list(self._captures.items()):
+                    if process.is_alive() or self._stop_event.is_set():
+                        continue
+
+                    print(f"Advertencia: El proceso de captura de la cámara {camera_id} murió. Relanzando...")
+                    _, rtsp_url, _, analysis_url = self._assignments[camera_id]
+                    self._captures[camera_id] = self._spawn_capture(camera_id, analysis_url or rtsp_url)
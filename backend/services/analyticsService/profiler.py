@@ -0,0 +1,129 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """
+    Perfilador por muestreo que se activa en caliente (sin reiniciar el servicio).
+
+    Un hilo propio toma cada `interval` segundos la pila de todos los hilos con
+    `sys._current_frames()` y cuenta cuántas veces aparece cada pila. No instrumenta
+    nada: apagado no cuesta nada y encendido el costo es proporcional a la frecuencia
+    de muestreo, no a la cantidad de frames procesados.
+
+    Los resultados se exportan como pilas "colapsadas" (formato de flamegraph.pl y
+    speedscope) o como las funciones con más muestras.
+    """
+
+    def __init__(self, max_depth: int = 64):
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._stacks = collections.Counter()  # { (hilo, (función raíz, ..., función hoja)): muestras }
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.interval = None
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.01, duration: float = None) -> dict:
+        """Empieza a muestrear (descarta los resultados anteriores). `duration` lo apaga solo."""
+        if self.running:
+            return self.status()
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        self.interval = interval
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(duration,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self.status()
+
+    def stop(self) -> dict:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        return self.status()
+
+    def _run(self, duration: float):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration if duration else None
+        while not self._stop_event.wait(self.interval):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            sampled = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                sampled.append((names.get(thread_id, str(thread_id)), tuple(reversed(stack))))
+            with self._lock:
+                self._stacks.update(sampled)
+                self.samples += 1
+        self.stopped_at = time.time()
+
+    def status(self) -> dict:
+        end = self.stopped_at or time.time()
+        return {
+            "running": self.running,
+            "interval_ms": round(self.interval * 1000, 2) if self.interval else None,
+            "samples": self.samples,
+            "seconds": round(end - self.started_at, 1) if self.started_at else 0.0,
+            "distinct_stacks": len(self._stacks),
+        }
+
+    def _snapshot(self, thread: str = None) -> list:
+        """Pilas muestreadas, opcionalmente solo de los hilos cuyo nombre empieza con `thread`."""
+        with self._lock:
+            stacks = list(self._stacks.items())
+        if thread:
+            stacks = [item for item in stacks if item[0][0].startswith(thread)]
+        return stacks
+
+    def collapsed(self, prefix: str = "", thread: str = None) -> str:
+        """Una línea por pila: "hilo;raíz;...;hoja muestras"."""
+        stacks = self._snapshot(thread)
+        lines = []
+        for (thread_name, stack), count in sorted(stacks, key=lambda item: -item[1]):
+            frames = ";".join((prefix + thread_name,) + stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines)
+
+    def top(self, limit: int = 25, thread: str = None) -> list:
+        """
+        Funciones con más muestras: `self` (en la cima de la pila) y `total` (en cualquier
+        nivel). `total_pct` es relativo a las muestras tomadas, sumando todos los hilos.
+        """
+        own = collections.Counter()
+        total = collections.Counter()
+        stacks = self._snapshot(thread)
+        samples = self.samples
+        for (_, stack), count in stacks:
+            if not stack:
+                continue
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        return [
+            {
+                "function": function,
+                "self_samples": own[function],
+                "total_samples": count,
+                "total_pct": round(100.0 * count / samples, 1) if samples else 0.0,
+            }
+            for function, count in total.most_common(limit)
+        ]
@@ -0,0 +1,208 @@
+import threading
+import time
+
+
+def _check_positive(**values):
+    """Lanza ValueError si algún valor (distinto de None) no es positivo."""
+    for name, value in values.items():
+        if value is not None and value <= 0:
+            raise ValueError(f"'{name}' debe ser mayor que 0 (recibido {value}).")
+
+
+class CameraRate:
+    """Estado y configuración de la tasa de inferencia de una cámara."""
+
+    def __init__(self, camera_id: int):
+        self.camera_id = camera_id
+        self.interval = 1.0  # Intervalo actual entre inferencias (segundos)
+        self.last_inference = 0.0
+        self.last_persons_seen = 0.0
+        self.last_num_persons = 0
+        self.inferences = 0
+
+        # Ajustes manuales (None = usar los valores del nodo)
+        self.weight = 1.0
+        self.min_interval = None
+        self.max_interval = None
+        self.fixed_interval = None
+
+    def config(self) -> dict:
+        return {
+            "weight": self.weight,
+            "min_interval_s": self.min_interval,
+            "max_interval_s": self.max_interval,
+            "fixed_interval_s": self.fixed_interval,
+        }
+
+
+class InferenceRateController:
+    """
+    Controlador de la tasa de inferencia por cámara (sustituye a "YOLO cada 10 frames").
+
+    Reparte un presupuesto de detecciones por segundo del nodo (`target_dps`) entre las
+    cámaras activas. El presupuesto real nunca supera la capacidad medida del nodo
+    (1 / coste por frame de la inferencia). Las cámaras con personas a la vista pesan
+    `occupied_weight` veces más que las vacías, de modo que reciben inferencias más a
+    menudo. Cada intervalo se acota entre `min_interval` y `max_interval`.
+    """
+
+    def __init__(self, target_dps: float = 20.0, min_interval: float = 0.1, max_interval: float = 5.0,
+                 occupied_weight: float = 3.0, occupied_hold: float = 5.0, utilization: float = 0.8,
+                 cost_provider=None):
+        self.target_dps = target_dps
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.occupied_weight = occupied_weight
+        self.occupied_hold = occupied_hold  # Segundos que una cámara sigue "ocupada" tras ver a alguien
+        self.utilization = utilization  # Fracción de la capacidad medida que estamos dispuestos a usar
+        self.cost_provider = cost_provider  # Callable -> segundos de cómputo por frame (o None)
+
+        self._lock = threading.Lock()
+        self._cameras = {}
+
+    # --- Registro de cámaras ---
+
+    def register(self, camera_id: int) -> CameraRate:
+        with self._lock:
+            rate = self._cameras.setdefault(camera_id, CameraRate(camera_id))
+            self._recompute()
+            return rate
+
+    def unregister(self, camera_id: int):
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+            self._recompute()
+
+    # --- Bucle de análisis ---
+
+    def should_infer(self, camera_id: int, now: float = None) -> bool:
+        """True si a la cámara ya le toca una nueva inferencia."""
+        now = time.time() if now is None else now
+        rate = self._cameras.get(camera_id)
+        if rate is None:
+            return True
+        return now - rate.last_inference >= rate.interval
+
+    def report(self, camera_id: int, num_persons: int, now: float = None):
+        """Registra el resultado de una inferencia y recalcula los intervalos."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rate = self._cameras.get(camera_id)
+            if rate is None:
+                return
+            rate.last_inference = now
+            rate.last_num_persons = num_persons
+            rate.inferences += 1
+            if num_persons > 0:
+                rate.last_persons_seen = now
+            self._recompute(now)
+
+    # --- Configuración en caliente ---
+
+    def configure_node(self, target_dps: float = None, min_interval: float = None,
+                       max_interval: float = None, occupied_weight: float = None):
+        _check_positive(target_dps=target_dps, min_interval=min_interval,
+                        max_interval=max_interval, occupied_weight=occupied_weight)
+        with self._lock:
+            if target_dps is not None:
+                self.target_dps = target_dps
+            if min_interval is not None:
+                self.min_interval = min_interval
+            if max_interval is not None:
+                self.max_interval = max_interval
+            if occupied_weight is not None:
+                self.occupied_weight = occupied_weight
+            self._recompute()
+
+    def configure_camera(self, camera_id: int, **overrides) -> dict:
+        """
+        Ajusta una cámara: weight, min_interval, max_interval, fixed_interval.
+        Un valor None en min/max/fixed vuelve al comportamiento automático.
+        Retorna None si la cámara no está registrada. Lanza ValueError (sin cambiar nada)
+        si algún valor no es positivo.
+        """
+        _check_positive(**overrides)
+        with self._lock:
+            rate = self._cameras.get(camera_id)
+            if rate is None:
+                return None
+            for key, value in overrides.items():
+                if key == "weight" and value is None:
+                    value = 1.0
+                setattr(rate, key, value)
+            self._recompute()
+            return rate.config()
+
+    # --- Cálculo ---
+
+    def effective_budget(self) -> float:
+        """Detecciones por segundo que el nodo puede repartir entre sus cámaras."""
+        budget = self.target_dps
+        cost = self.cost_provider() if self.cost_provider is not None else None
+        if cost:
+            budget = min(budget, self.utilization / cost)
+        return max(budget, 1e-3)
+
+    def _weight(self, rate: CameraRate, now: float) -> float:
+        occupied = now - rate.last_persons_seen <= self.occupied_hold
+        return rate.weight * (self.occupied_weight if occupied else 1.0)
+
+    def _recompute(self, now: float = None):
+        now = time.time() if now is None else now
+        if not self._cameras:
+            return
+
+        budget = self.effective_budget()
+        weights = {camera_id: self._weight(rate, now) for camera_id, rate in self._cameras.items()}
+        total_weight = sum(weights.values())
+
+        for camera_id, rate in self._cameras.items():
+            if rate.fixed_interval is not None:
+                rate.interval = rate.fixed_interval
+                continue
+
+            low = rate.min_interval if rate.min_interval is not None else self.min_interval
+            high = rate.max_interval if rate.max_interval is not None else self.max_interval
+            # Cada cámara recibe una parte del presupuesto proporcional a su peso
+            share = budget * weights[camera_id] / total_weight if total_weight > 0 else 0.0
+            if share <= 0:
+                rate.interval = high  # Sin parte del presupuesto: la tasa mínima
+                continue
+            rate.interval = min(max(1.0 / share, low), high)
+
+    def camera_stats(self, camera_id: int):
+        rate = self._cameras.get(camera_id)
+        if rate is None:
+            return None
+        now = time.time()
+        return {
+            "interval_s": round(rate.interval, 3),
+            "target_hz": round(1.0 / rate.interval, 3) if rate.interval else None,
+            "occupied": now - rate.last_persons_seen <= self.occupied_hold,
+            "last_num_persons": rate.last_num_persons,
+            "inferences": rate.inferences,
+            **rate.config(),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            cameras = {camera_id: self.camera_stats(camera_id) for camera_id in self._cameras}
+        return {
+            "target_dps": self.target_dps,
+            "effective_budget_dps": round(self.effective_budget(), 3),
+            "min_interval_s": self.min_interval,
+            "max_interval_s": self.max_interval,
+            "occupied_weight": self.occupied_weight,
+            "cameras": cameras,
+        }
+
+
+class CameraRateView:
+    """Adaptador para exponer el estado de una cámara dentro de `camera_pipelines`."""
+
+    def __init__(self, controller: InferenceRateController, camera_id: int):
+        self.controller = controller
+        self.camera_id = camera_id
+
+    def stats(self) -> dict:
+        return self.controller.camera_stats(self.camera_id)
@@ -0,0 +1,40 @@
+import threading
+import time
+
+import requests
+
+
+def relay_url(mediamtx_base: str, stream_name: str) -> str:
+    """URL del stream reenviado por MediaMTX (lo que publica streamingService)."""
+    return f"{mediamtx_base.rstrip('/')}/{stream_name}"
+
+
+def ensure_relay(streaming_url: str, stream_name: str, rtsp_url: str, stop_event: threading.Event = None,
+                 timeout: float = 15.0) -> bool:
+    """
+    Handshake con streamingService antes de analizar desde el relay de MediaMTX.
+
+    Pide que el stream se publique (si ya estaba activo no pasa nada) y espera a que
+    ffmpeg reporte progreso, es decir, a que MediaMTX ya tenga el video. Retorna True
+    si el relay quedó listo dentro de `timeout` segundos. Lanza
+    `requests.RequestException` si streamingService no responde.
+    """
+    base = streaming_url.rstrip("/")
+    response = requests.post(f"{base}/stream/start", json={"stream_name": stream_name, "rtsp_url": rtsp_url},
+                             timeout=10)
+    if response.status_code not in (200, 400):  # 400: el stream ya estaba activo
+        response.raise_for_status()
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if stop_event is not None and stop_event.is_set():
+            return False
+        # Long-poll: streamingService responde apenas ffmpeg reporta progreso
+        wait = max(0.1, min(5.0, deadline - time.monotonic()))
+        response = requests.get(f"{base}/stream/{stream_name}/ready", params={"timeout": wait}, timeout=wait + 5)
+        if response.status_code == 404:
+            return False  # El stream falló y streamingService lo descartó
+        response.raise_for_status()
+        if response.json().get("ready"):
+            return True
+    return False
@@ -0,0 +1,373 @@
+import os
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# Lo único que viaja entre procesos por cada frame: dónde está y de cuándo es
+FrameHandle = namedtuple("FrameHandle", ["camera_id", "slot", "seq", "timestamp"])
+
+# Encabezado del segmento compartido (int64). El productor escribe "status" al final,
+# así el consumidor nunca ve un encabezado a medio inicializar. "ring_id" distingue cada
+# segmento creado con el mismo nombre (p.ej. tras relanzar el proceso de captura).
+_HEADER_FIELDS = [
+    "status", "height", "width", "channels", "num_slots", "ring_id",
+    "frames_written", "frames_blocked", "frames_lost", "reconnects", "connected",
+]
+_H = {name: index for index, name in enumerate(_HEADER_FIELDS)}
+_HEADER_BYTES = len(_HEADER_FIELDS) * 8
+_COUNTERS = _HEADER_FIELDS[6:]
+
+RING_OPEN = 1
+RING_CLOSED = 2
+
+# Estados de cada slot. El productor solo toca slots libres y el consumidor solo
+# slots listos/en lectura, por lo que no hace falta ningún lock entre procesos.
+SLOT_FREE = 0
+SLOT_READY = 1
+SLOT_READING = 2
+
+
+def ring_name(camera_id: int) -> str:
+    return f"antervia_cam_{camera_id}"
+
+
+class SharedFrameRing:
+    """
+    Ring buffer de frames BGR preasignados en `multiprocessing.shared_memory` (uno por cámara).
+
+    El productor (proceso de captura) escribe directamente dentro de un slot y publica
+    un `FrameHandle`; el consumidor (proceso de análisis) obtiene una vista NumPy del
+    slot sin copiarlo y lo libera al terminar. Si todos los slots están ocupados el
+    productor espera (backpressure) y, pasado el tiempo límite, descarta el frame.
+    """
+
+    def __init__(self, camera_id: int, shm: shared_memory.SharedMemory, owner: bool):
+        self.camera_id = camera_id
+        self._shm = shm
+        self.owner = owner
+
+        self._header = np.ndarray((len(_HEADER_FIELDS),), dtype=np.int64, buffer=shm.buf)
+        height, width, channels, num_slots = (
+            int(self._header[_H["height"]]), int(self._header[_H["width"]]),
+            int(self._header[_H["channels"]]), int(self._header[_H["num_slots"]]),
+        )
+        self.shape = (height, width, channels)
+        self.num_slots = num_slots
+        self.ring_id = int(self._header[_H["ring_id"]])
+
+        offset = _HEADER_BYTES
+        self._slot_state = np.ndarray((num_slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += num_slots * 8
+        self._slot_seq = np.ndarray((num_slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += num_slots * 8
+        self._slot_time = np.ndarray((num_slots,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += num_slots * 8
+        self._frames = np.ndarray((num_slots, *self.shape), dtype=np.uint8, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def _size(shape, num_slots: int) -> int:
+        return _HEADER_BYTES + num_slots * 24 + num_slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, camera_id: int, shape, num_slots: int = 4) -> "SharedFrameRing":
+        """Crea (o recrea) el segmento de la cámara. Lo llama el productor."""
+        name = ring_name(camera_id)
+        size = cls._size(shape, num_slots)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Segmento huérfano de un productor anterior (p.ej. uno que murió): se marca
+            # cerrado para que un consumidor que aún lo tenga mapeado se reconecte
+            stale = shared_memory.SharedMemory(name=name)
+            if stale.size >= _HEADER_BYTES:
+                stale_header = np.ndarray((len(_HEADER_FIELDS),), dtype=np.int64, buffer=stale.buf)
+                stale_header[_H["status"]] = RING_CLOSED
+                del stale_header
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((len(_HEADER_FIELDS),), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_H["height"]], header[_H["width"]], header[_H["channels"]] = shape
+        header[_H["num_slots"]] = num_slots
+        header[_H["ring_id"]] = int.from_bytes(os.urandom(8), "big") >> 1
+        header[_H["status"]] = RING_OPEN
+        return cls(camera_id, shm, owner=True)
+
+    @classmethod
+    def attach(cls, camera_id: int):
+        """Se conecta al segmento de la cámara. Retorna None si todavía no existe o ya se cerró."""
+        try:
+            shm = shared_memory.SharedMemory(name=ring_name(camera_id))
+        except FileNotFoundError:
+            return None
+
+        header = np.ndarray((len(_HEADER_FIELDS),), dtype=np.int64, buffer=shm.buf)
+        if header[_H["status"]] != RING_OPEN:
+            del header
+            shm.close()
+            return None
+        del header
+        return cls(camera_id, shm, owner=False)
+
+    @staticmethod
+    def published_id(camera_id: int):
+        """
+        `ring_id` del segmento publicado ahora con el nombre de la cámara (None si no hay).
+        Si un productor murió sin cerrar su segmento, otro proceso pudo borrarlo y el nuevo
+        productor crear uno distinto: el consumidor lo detecta comparando este id.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=ring_name(camera_id))
+        except FileNotFoundError:
+            return None
+        try:
+            if shm.size < _HEADER_BYTES:
+                return None
+            header = np.ndarray((len(_HEADER_FIELDS),), dtype=np.int64, buffer=shm.buf)
+            ring_id = int(header[_H["ring_id"]]) if header[_H["status"]] == RING_OPEN else None
+            del header
+            return ring_id
+        finally:
+            shm.close()
+
+    # --- Lado productor ---
+
+    def acquire(self, timeout: float):
+        """Reserva un slot libre esperando hasta `timeout` segundos. Retorna (slot, vista) o None."""
+        deadline = time.monotonic() + timeout
+        blocked = False
+        while True:
+            free = np.flatnonzero(self._slot_state == SLOT_FREE)
+            if free.size:
+                slot = int(free[0])
+                return slot, self._frames[slot]
+            if not blocked:
+                blocked = True
+                self._header[_H["frames_blocked"]] += 1
+            if time.monotonic() >= deadline:
+                self._header[_H["frames_lost"]] += 1
+                return None
+            time.sleep(0.001)
+
+    def commit(self, slot: int) -> FrameHandle:
+        """Publica el slot recién escrito para el consumidor."""
+        seq = int(self._header[_H["frames_written"]]) + 1
+        timestamp = time.time()
+        self._slot_seq[slot] = seq
+        self._slot_time[slot] = timestamp
+        self._slot_state[slot] = SLOT_READY
+        self._header[_H["frames_written"]] = seq
+        return FrameHandle(self.camera_id, slot, seq, timestamp)
+
+    def set_connected(self, connected: bool):
+        self._header[_H["connected"]] = int(connected)
+
+    def count_reconnect(self):
+        self._header[_H["reconnects"]] += 1
+
+    # --- Lado consumidor ---
+
+    def latest(self):
+        """
+        Toma el frame listo más reciente y libera los más viejos (que ya no se analizarán).
+        Retorna (FrameHandle, número de frames descartados) o (None, 0).
+        """
+        ready = np.flatnonzero(self._slot_state == SLOT_READY)
+        if ready.size == 0:
+            return None, 0
+
+        slot = int(ready[np.argmax(self._slot_seq[ready])])
+        self._slot_state[slot] = SLOT_READING
+        skipped = ready[ready != slot]
+        self._slot_state[skipped] = SLOT_FREE
+        return FrameHandle(self.camera_id, slot, int(self._slot_seq[slot]), float(self._slot_time[slot])), len(skipped)
+
+    def view(self, handle: FrameHandle) -> np.ndarray:
+        """Vista (sin copia) del frame apuntado por el handle; válida hasta `release`."""
+        return self._frames[handle.slot]
+
+    def release(self, handle: FrameHandle):
+        self._slot_state[handle.slot] = SLOT_FREE
+
+    # --- Común ---
+
+    @property
+    def closed(self) -> bool:
+        return self._header[_H["status"]] != RING_OPEN
+
+    def counters(self) -> dict:
+        return {name: int(self._header[_H[name]]) for name in _COUNTERS}
+
+    def close(self):
+        if self.owner:
+            self._header[_H["status"]] = RING_CLOSED
+
+        # Soltamos las vistas antes de cerrar el segmento
+        del self._header, self._slot_state, self._slot_seq, self._slot_time, self._frames
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # Aún hay una vista viva de un frame; el mapeo se libera cuando desaparezca
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def capture_process_main(camera_id: int, rtsp_url: str, stop_event, scale: float = 0.6,
+                         num_slots: int = 4, reconnect_delay: float = 15.0, width: int = 0):
+    """
+    Punto de entrada del proceso de captura de una cámara.
+    Decodifica el stream y redimensiona cada frame directamente dentro de un slot del ring
+    (a `width` píxeles de ancho si se indica; si no, por el factor `scale`).
+    """
+    ring = None
+    failures = 0
+    try:
+        while not stop_event.is_set():
+            cap = cv2.VideoCapture(rtsp_url)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+            if not cap.isOpened():
+                # Igual que FrameGrabber: 1, 2, 4... segundos hasta `reconnect_delay`
+                delay = min(reconnect_delay, 2.0 ** failures)
+                failures += 1
+                print(f"[Cámara {camera_id}]: Error al conectar. Reintentando en {delay:.0f} segundos...")
+                stop_event.wait(delay)
+                continue
+
+            failures = 0
+            print(f"[Cámara {camera_id}]: Conexión exitosa (proceso de captura).")
+            while not stop_event.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    print(f"[Cámara {camera_id}]: Stream perdido.")
+                    break
+
+                if ring is None:
+                    # El ring se dimensiona con la resolución ya redimensionada del primer frame
+                    factor = width / frame.shape[1] if width else scale
+                    shape = (int(frame.shape[0] * factor), int(frame.shape[1] * factor), frame.shape[2])
+                    ring = SharedFrameRing.create(camera_id, shape, num_slots)
+                ring.set_connected(True)
+
+                # Backpressure: si el análisis no libera slots, esperamos como mucho un frame
+                acquired = ring.acquire(timeout=0.04)
+                if acquired is None:
+                    continue
+                slot, view = acquired
+
+                # Redimensiona escribiendo directo en memoria compartida (sin copias intermedias)
+                height, width = ring.shape[:2]
+                cv2.resize(frame, (width, height), dst=view, interpolation=cv2.INTER_AREA)
+                ring.commit(slot)
+
+            cap.release()
+            if ring is not None:
+                ring.set_connected(False)
+                if not stop_event.is_set():
+                    ring.count_reconnect()
+    finally:
+        if ring is not None:
+            ring.close()
+
+
+class SharedFrameSource:
+    """
+    Fuente de frames para `analyze_camera_stream` respaldada por un `SharedFrameRing`.
+    Ofrece la misma interfaz que `FrameGrabber` (read/stats/join), pero los frames
+    llegan ya redimensionados desde el proceso de captura.
+    """
+
+    prescaled = True
+
+    def __init__(self, camera_id: int, stop_event, max_frame_age: float = 1.0, recheck_interval: float = 0.5):
+        self.camera_id = camera_id
+        self.stop_event = stop_event
+        self.max_frame_age = max_frame_age
+        self.recheck_interval = recheck_interval  # Sin frames, cada cuánto se comprueba si el ring cambió
+
+        self._ring = None
+        self._current = None  # Handle del frame que el análisis está usando
+        self._last_check = time.monotonic()
+
+        self.frames_read = 0
+        self.frames_skipped = 0  # Frames que el productor publicó pero nunca se analizaron
+        self.frames_stale = 0
+        self.last_frame_age = 0.0
+
+    def start(self):
+        pass  # La captura vive en otro proceso; nos conectamos al ring de forma perezosa
+
+    def join(self, timeout: float = None):
+        self._release_current()
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+    def _release_current(self):
+        if self._current is not None and self._ring is not None:
+            self._ring.release(self._current)
+        self._current = None
+
+    def read(self, timeout: float = 1.0):
+        # El frame anterior ya se procesó: devolvemos su slot al productor
+        self._release_current()
+
+        deadline = time.monotonic() + timeout
+        while not self.stop_event.is_set():
+            if self._ring is not None and (self._ring.closed or self._replaced()):
+                # El proceso de captura terminó o se reinició; nos reconectaremos
+                self._ring.close()
+                self._ring = None
+            if self._ring is None:
+                self._ring = SharedFrameRing.attach(self.camera_id)
+
+            if self._ring is not None:
+                handle, skipped = self._ring.latest()
+                self.frames_skipped += skipped
+                if handle is not None:
+                    age = time.time() - handle.timestamp
+                    if age > self.max_frame_age:
+                        self.frames_stale += 1
+                        self._ring.release(handle)
+                        return None
+
+                    self._current = handle
+                    self._last_check = time.monotonic()
+                    self.frames_read += 1
+                    self.last_frame_age = age
+                    return self._ring.view(handle), handle.seq, handle.timestamp
+
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.002)
+        return None
+
+    def _replaced(self) -> bool:
+        """Si, tras un rato sin frames, el nombre de la cámara ya apunta a otro segmento."""
+        now = time.monotonic()
+        if now - self._last_check < self.recheck_interval:
+            return False
+        self._last_check = now
+        published = SharedFrameRing.published_id(self.camera_id)
+        return published is not None and published != self._ring.ring_id
+
+    def stats(self) -> dict:
+        producer = self._ring.counters() if self._ring is not None else {}
+        return {
+            "transport": "shared_memory",
+            "connected": bool(producer.get("connected", 0)),
+            "frames_grabbed": producer.get("frames_written", 0),
+            "frames_dropped": self.frames_skipped + producer.get("frames_lost", 0),
+            "frames_blocked": producer.get("frames_blocked", 0),
+            "frames_stale": self.frames_stale,
+            "reconnects": producer.get("reconnects", 0),
+            "last_frame_age_ms": round(self.last_frame_age * 1000, 1),
+        }
@@ -0,0 +1,58 @@
+import os
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+# --- Configuración ---
+# Servidor de prueba que imita el endpoint de alertas de Spring Boot.
+# Uso: python alert_stub_server.py  (y en otra terminal levantar el análisis con
+# SPRING_BOOT_ALERT_URL=http://localhost:8080/api/internal/alerts)
+puerto = int(os.getenv("STUB_PORT", "8080"))
+tasa_fallos = float(os.getenv("STUB_FAIL_RATE", "0"))    # Fracción de peticiones que responden 503
+latencia_ms = float(os.getenv("STUB_LATENCY_MS", "0"))   # Demora artificial por petición
+sin_lotes = os.getenv("STUB_NO_BATCH", "0") == "1"       # Simula un core sin endpoint de lotes
+evento_invalido = os.getenv("STUB_REJECT_EVENT", "")      # Tipo de evento que se responde con 400
+# --- Fin Configuración ---
+
+app = FastAPI(title="Stub de alertas de Spring Boot")
+recibidas = []
+
+
+def simular_core(alertas: list):
+    if latencia_ms:
+        time.sleep(latencia_ms / 1000)
+    if random.random() < tasa_fallos:
+        raise HTTPException(status_code=503, detail="Fallo simulado")
+    if evento_invalido and any(alerta["event_type"] == evento_invalido for alerta in alertas):
+        raise HTTPException(status_code=400, detail="Alerta inválida")
+
+
+@app.post("/api/internal/alerts", status_code=201)
+async def crear_alerta(request: Request):
+    alerta = await request.json()
+    simular_core([alerta])
+    recibidas.append(alerta)
+    print(f"Alerta recibida: {alerta['event_type']} (cámara {alerta['camera_id']}): {alerta['details']}")
+    return alerta
+
+
+@app.post("/api/internal/alerts/batch", status_code=201)
+async def crear_alertas(request: Request):
+    if sin_lotes:
+        raise HTTPException(status_code=404, detail="Not Found")
+    alertas = await request.json()
+    simular_core(alertas)
+    recibidas.extend(alertas)
+    print(f"Lote de {len(alertas)} alerta(s) recibido")
+    return alertas
+
+
+@app.get("/api/alerts")
+async def historial():
+    return recibidas[-50:]
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=puerto)
@@ -0,0 +1,172 @@
+"""
+Benchmark del costo de CPU de la decodificación por cámara.
+
+Compara el camino actual (OpenCV decodifica a resolución completa y se redimensiona
+con INTER_AREA en Python) contra:
+  - el mismo camino sobre un substream de baja resolución (--substream),
+  - ffmpeg redimensionando y descartando frames antes de entregarlos (FFmpegPipeGrabber).
+
+Se procesa el video completo lo más rápido posible y se reporta la CPU usada por
+segundo de video, es decir, la fracción de un núcleo que costaría una cámara en vivo.
+
+Uso (desde analyticsService/):
+    python tests/bench_decode.py --video camara_4k.mp4 --substream camara_sub.mp4 --width 640 --fps 5
+Sin --video se genera un video sintético de 1920x1080.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_grabber import FFmpegPipeGrabber  # noqa: E402
+
+
+def cpu_seconds(who) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def video_info(path: str):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    return fps, frames, width, height
+
+
+def synthetic_video(path: str, width: int = 1920, height: int = 1080, fps: float = 25.0, seconds: int = 10):
+    """Video con ruido y un rectángulo en movimiento (para que el códec tenga trabajo)."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for i in range(int(fps * seconds)):
+        frame = background.copy()
+        x = (i * 20) % (width - 200)
+        cv2.rectangle(frame, (x, height // 3), (x + 200, height // 3 + 400), (0, 0, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def bench_opencv(path: str, width: int) -> dict:
+    """Camino actual: decodificación completa + rescale_frame con INTER_AREA."""
+    fps, _, _, _ = video_info(path)
+    cap = cv2.VideoCapture(path)
+    start_cpu, start = cpu_seconds(resource.RUSAGE_SELF), time.perf_counter()
+    frames = 0
+    size = None
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        scale = width / frame.shape[1]
+        small = cv2.resize(frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)),
+                           interpolation=cv2.INTER_AREA)
+        size = small.shape[1], small.shape[0]
+        frames += 1
+    cap.release()
+    return {
+        "frames_decoded": frames,
+        "frames_delivered": frames,
+        "frame_size": size,
+        "media_s": frames / fps,
+        "cpu_s": cpu_seconds(resource.RUSAGE_SELF) - start_cpu,
+        "wall_s": time.perf_counter() - start,
+    }
+
+
+def bench_ffmpeg(path: str, width: int, fps_limit: float) -> dict:
+    """ffmpeg redimensiona y decima; Python solo recibe los frames finales por el pipe."""
+    fps, frames, _, _ = video_info(path)
+    grabber = FFmpegPipeGrabber(0, path, threading.Event(), width=width, fps=fps_limit or None)
+    size = grabber._probe_size()
+    if size is None:
+        raise RuntimeError("ffprobe no pudo leer el video")
+    out_width, out_height = grabber._output_size(*size)
+    frame_bytes = out_width * out_height * 3
+
+    start_self, start_children = cpu_seconds(resource.RUSAGE_SELF), cpu_seconds(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    process = subprocess.Popen(grabber._command(out_width, out_height), stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=frame_bytes)
+    delivered = 0
+    buffer = bytearray(frame_bytes)
+    view = memoryview(buffer)
+    while True:
+        received = 0
+        while received < frame_bytes:
+            count = process.stdout.readinto(view[received:])
+            if not count:
+                break
+            received += count
+        if received < frame_bytes:
+            break
+        delivered += 1
+    process.wait()  # Necesario para que su CPU cuente en RUSAGE_CHILDREN
+    return {
+        "frames_decoded": frames,
+        "frames_delivered": delivered,
+        "frame_size": (out_width, out_height),
+        "media_s": frames / fps,
+        "cpu_s": (cpu_seconds(resource.RUSAGE_SELF) - start_self) +
+                 (cpu_seconds(resource.RUSAGE_CHILDREN) - start_children),
+        "wall_s": time.perf_counter() - start,
+    }
+
+
+def report(name: str, result: dict, baseline: dict = None):
+    cores = result["cpu_s"] / result["media_s"] if result["media_s"] else 0.0
+    line = (f"{name:<22} {result['frame_size'][0]}x{result['frame_size'][1]:<6} "
+            f"entregados {result['frames_delivered']:>5}  CPU {result['cpu_s']:6.2f} s  "
+            f"-> {cores * 100:6.1f} % de un núcleo por cámara")
+    if baseline is not None and result["cpu_s"]:
+        line += f"  ({baseline['cpu_s'] / result['cpu_s']:.1f}x menos CPU)"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Stream principal (archivo o URL); por defecto uno sintético 1080p")
+    parser.add_argument("--substream", help="Substream de baja resolución de la misma cámara")
+    parser.add_argument("--width", type=int, default=640, help="Ancho de los frames analizados")
+    parser.add_argument("--fps", type=float, default=5.0, help="Frames/s entregados por ffmpeg (0 = todos)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video
+        if video is None:
+            video = os.path.join(tmp, "synthetic.mp4")
+            print("Generando video sintético 1920x1080...")
+            synthetic_video(video)
+
+        fps, frames, width, height = video_info(video)
+        print(f"Video: {width}x{height} a {fps:.1f} fps, {frames} frames ({frames / fps:.1f} s)\n")
+
+        baseline = bench_opencv(video, args.width)
+        report("opencv (actual)", baseline)
+
+        if args.substream:
+            report("opencv substream", bench_opencv(args.substream, args.width), baseline)
+
+        try:
+            report("ffmpeg escala", bench_ffmpeg(video, args.width, 0), baseline)
+            if args.fps:
+                report(f"ffmpeg escala+{args.fps:g}fps", bench_ffmpeg(video, args.width, args.fps), baseline)
+            if args.substream:
+                report("ffmpeg substream", bench_ffmpeg(args.substream, args.width, args.fps), baseline)
+        except (FileNotFoundError, RuntimeError) as e:
+            print(f"Se omiten las pruebas con ffmpeg: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark del tiempo de arranque del servicio de análisis.
+
+Para cada corrida mide, con un proceso nuevo (arranque en frío del intérprete):
+  - import_s: lo que tarda `import main` (lo que bloquea antes de que uvicorn escuche),
+  - live_s:   desde lanzar uvicorn hasta que /health/live responde,
+  - ready_s:  desde lanzar uvicorn hasta que /health/ready responde 200 (modelo cargado).
+Se reporta la mediana de `--runs` corridas. Con `--baseline` se compara contra una
+corrida anterior y el proceso termina con código 1 si algo empeoró más que `--tolerance`.
+
+Cada corrida usa un registro de cámaras vacío y temporal (no se restauran cámaras reales).
+
+Uso (desde analyticsService/):
+    python tests/bench_startup.py --runs 5 --json arranque.json
+    DETECTOR_BACKEND=onnx python tests/bench_startup.py --baseline arranque.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def service_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("SHOW_WINDOWS", "0")
+    env["CAMERA_REGISTRY_PATH"] = os.path.join(workdir, "camera_registry.db")
+    env.setdefault("ALERT_SPOOL_DIR", os.path.join(workdir, "alert_spool"))
+    return env
+
+
+def measure_import(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=SERVICE_DIR, env=env,
+                            capture_output=True, text=True, timeout=300)
+    if output.returncode != 0:
+        raise RuntimeError(f"No se pudo importar main: {output.stderr.strip()[-500:]}")
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url: str, deadline: float, process) -> bool:
+    """Consulta `url` hasta que responda 200 (o hasta `deadline`, o hasta que el proceso muera)."""
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def measure_server(env: dict, ready_timeout: float) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + ready_timeout
+        live = wait_for(f"{base}/health/live", deadline, process)
+        live_s = time.monotonic() - start if live else None
+        ready = live and wait_for(f"{base}/health/ready", deadline, process)
+        ready_s = time.monotonic() - start if ready else None
+        model = None
+        try:
+            model = requests.get(f"{base}/health/ready", timeout=2).json().get("models")
+        except (requests.RequestException, ValueError):
+            pass
+        return {"live_s": live_s, "ready_s": ready_s, "model": model}
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def median(values: list):
+    values = [value for value in values if value is not None]
+    return round(statistics.median(values), 3) if values else None
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Lista de regresiones (métrica, antes, ahora) por encima de `tolerance` (fracción)."""
+    regressions = []
+    for metric in ("import_s", "live_s", "ready_s"):
+        before, now = baseline["summary"].get(metric), current["summary"].get(metric)
+        if before is None:
+            continue
+        if now is None or (before > 0 and (now - before) / before > tolerance):
+            regressions.append((metric, before, now))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de analyticsService")
+    parser.add_argument("--runs", type=int, default=3, help="Corridas (se reporta la mediana)")
+    parser.add_argument("--ready-timeout", type=float, default=120.0, help="Espera máxima por corrida (s)")
+    parser.add_argument("--json", help="Archivo donde guardar los resultados")
+    parser.add_argument("--baseline", help="Resultados anteriores (JSON) contra los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Empeoramiento tolerado (fracción)")
+    args = parser.parse_args()
+
+    runs = []
+    for index in range(args.runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = service_env(workdir)
+            run = {"import_s": measure_import(env), **measure_server(env, args.ready_timeout)}
+        runs.append(run)
+        ready = f"{run['ready_s']:.2f}s" if run["ready_s"] is not None else "no listo"
+        live = f"{run['live_s']:.2f}s" if run["live_s"] is not None else "sin respuesta"
+        print(f"Corrida {index + 1}: import {run['import_s']:.2f}s | live {live} | ready {ready}")
+
+    report = {
+        "meta": {
+            "detector_backend": os.getenv("DETECTOR_BACKEND", "ultralytics"),
+            "execution_mode": os.getenv("ANALYTICS_EXECUTION_MODE", "thread"),
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+        },
+        "summary": {metric: median([run[metric] for run in runs]) for metric in ("import_s", "live_s", "ready_s")},
+        "runs": runs,
+    }
+    print(json.dumps(report["summary"], indent=2))
+    if report["summary"]["ready_s"] is None and runs and runs[-1]["model"]:
+        print(f"El modelo no quedó listo: {runs[-1]['model']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"] != {**report["meta"], "runs": baseline["meta"].get("runs")}:
+            print(f"Advertencia: la línea base se tomó con otra configuración ({baseline['meta']}).")
+        regressions = compare(report, baseline, args.tolerance)
+        for metric, before, now in regressions:
+            print(f"REGRESIÓN {metric}: {before} -> {now}")
+        if regressions:
+            sys.exit(1)
+        print("Sin regresiones respecto de la línea base.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Levanta un clúster de análisis local: el coordinador y N nodos (cada uno un `main.py`
+en su propio puerto y con su propia cola de alertas), para probar el reparto de cámaras
+y el rebalanceo sin más máquinas.
+
+Opcionalmente registra cámaras de prueba (todas con la misma fuente) y detiene un nodo
+tras unos segundos para ver cómo se mueven sus cámaras. Muestra el estado de los nodos
+periódicamente; Ctrl+C detiene todos los procesos. Los logs quedan en --log-dir.
+
+Uso (desde analyticsService/):
+    python tests/run_local_cluster.py --nodes 3 --capacity 2,2,4
+    python tests/run_local_cluster.py --nodes 3 --cameras 6 --source rtsp://... --kill-node 0 --kill-after 30
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def launch(module: str, port: int, env: dict, log_path: str):
+    log = open(log_path, "w", encoding="utf-8")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=SERVICE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def wait_for(url: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def stop(process):
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def print_status(coordinator: str):
+    try:
+        status = requests.get(f"{coordinator}/nodes", timeout=2).json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Sin respuesta del coordinador: {e}")
+        return
+    for node in status["nodes"]:
+        load = node["load"]
+        state = "vivo" if node["alive"] else "caído"
+        print(f"  {node['node_id']:<10} {state:<6} cámaras {node['cameras']}/{node['bound']} "
+              f"presión {node['pressure']:.2f} cpu {load.get('cpu')} fps {load.get('fps')} "
+              f"inferencia {load.get('inference_ms')} ms")
+    print(f"  cámaras {status['cameras']} | sin nodo {status['unassigned']} | movimientos {status['moves']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clúster local de analyticsService")
+    parser.add_argument("--nodes", type=int, default=2, help="Cantidad de nodos")
+    parser.add_argument("--port", type=int, default=8000, help="Puerto del coordinador")
+    parser.add_argument("--base-port", type=int, default=8100, help="Puerto del primer nodo")
+    parser.add_argument("--capacity", default="", help="Capacidad de cada nodo separada por comas (por defecto 1)")
+    parser.add_argument("--cameras", type=int, default=0, help="Cámaras de prueba a registrar")
+    parser.add_argument("--source", default="", help="URL o archivo de las cámaras de prueba")
+    parser.add_argument("--kill-node", type=int, help="Índice del nodo a detener")
+    parser.add_argument("--kill-after", type=float, default=30.0, help="Segundos antes de detenerlo")
+    parser.add_argument("--interval", type=float, default=5.0, help="Cada cuánto mostrar el estado (s)")
+    parser.add_argument("--log-dir", help="Carpeta de logs (por defecto una temporal)")
+    args = parser.parse_args()
+
+    log_dir = args.log_dir or tempfile.mkdtemp(prefix="analytics-cluster-")
+    os.makedirs(log_dir, exist_ok=True)
+    capacities = [float(value) for value in args.capacity.split(",") if value.strip()]
+    coordinator = f"http://127.0.0.1:{args.port}"
+
+    base_env = dict(os.environ)
+    base_env.setdefault("SHOW_WINDOWS", "0")
+    processes = []
+    try:
+        env = {**base_env, "COORDINATOR_REGISTRY_PATH": os.path.join(log_dir, "coordinator_registry.db")}
+        processes.append(launch("coordinator", args.port, env, os.path.join(log_dir, "coordinator.log")))
+        if not wait_for(f"{coordinator}/health/live", 30):
+            raise RuntimeError(f"El coordinador no arrancó (ver {log_dir}/coordinator.log)")
+
+        for index in range(args.nodes):
+            port = args.base_port + index
+            env = {
+                **base_env,
+                "COORDINATOR_URL": coordinator,
+                "NODE_URL": f"http://127.0.0.1:{port}",
+                "NODE_ID": f"node-{index}",
+                "NODE_CAPACITY": str(capacities[index] if index < len(capacities) else 1.0),
+                "ALERT_SPOOL_DIR": os.path.join(log_dir, f"node-{index}", "alert_spool"),
+            }
+            processes.append(launch("main", port, env, os.path.join(log_dir, f"node-{index}.log")))
+        print(f"Coordinador en {coordinator}, {args.nodes} nodos desde el puerto {args.base_port}. Logs en {log_dir}")
+
+        if not wait_for(f"{coordinator}/health/ready", 60):
+            raise RuntimeError("Ningún nodo se registró en el coordinador")
+        for camera_id in range(1, args.cameras + 1):
+            response = requests.post(f"{coordinator}/analyze", timeout=60, json={
+                "camera_id": camera_id, "rtsp_url": args.source, "stream_name": f"camara-{camera_id}"
+            })
+            print(f"Cámara {camera_id}: {response.status_code} {response.json()}")
+
+        started = time.monotonic()
+        killed = False
+        while True:
+            time.sleep(args.interval)
+            if args.kill_node is not None and not killed and time.monotonic() - started >= args.kill_after:
+                print(f"Deteniendo node-{args.kill_node}...")
+                stop(processes[1 + args.kill_node])
+                killed = True
+            print_status(coordinator)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in reversed(processes):
+            stop(process)
+        print("Clúster detenido.")
+
+
+if __name__ == "__main__":
+    main()
@@ -56,29 +56,29 @@ while True:
     net.setInput(blob)
     detections = net.forward()
 
-    # 6. Recorrer todas las detecciones encontradas
+    # 6. Filtrar todas las detecciones de una vez
     # La forma de 'detections' es [1, 1, N, 7] donde N es el nro. de detecciones
-    for i in range(0, detections.shape[2]):
-        # Extraer la confianza (probabilidad) de la detección
-        confidence = detections[0, 0, i, 2]
-
-        # 7. Filtrar detecciones débiles (menores a confianza_minima)
-        if confidence > confianza_minima:
-            # 8. Calcular las coordenadas (x, y) del cuadro
-            # Las coordenadas del modelo están normalizadas (0.0 a 1.0)
-            # Hay que multiplicarlas por las dimensiones originales (h, w)
-            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-            (startX, startY, endX, endY) = box.astype("int")
-
-            # 9. Dibujar el cuadro verde
-            cv2.rectangle(frame, (startX, startY), (endX, endY), color_cuadro, grosor_cuadro)
-
-            # (Opcional) Dibujar la confianza sobre el cuadro
-            texto = f"{confidence * 100:.2f}%"
-            # Poner el texto un poco arriba del cuadro
-            y = startY - 10 if startY - 10 > 10 else startY + 10
-            cv2.putText(frame, texto, (startX, y),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, color_cuadro, 2)
+    detections = detections[0, 0]
+    confidences = detections[:, 2]
+
+    # 7. Quedarse solo con las detecciones fuertes (mayores a confianza_minima)
+    keep = confidences > confianza_minima
+
+    # 8. Calcular las coordenadas (x, y) de todos los cuadros
+    # Las coordenadas del modelo están normalizadas (0.0 a 1.0)
+    # Hay que multiplicarlas por las dimensiones originales (h, w)
+    boxes = (detections[keep, 3:7] * np.array([w, h, w, h])).astype("int")
+
+    for (startX, startY, endX, endY), confidence in zip(boxes.tolist(), confidences[keep].tolist()):
+        # 9. Dibujar el cuadro verde
+        cv2.rectangle(frame, (startX, startY), (endX, endY), color_cuadro, grosor_cuadro)
+
+        # (Opcional) Dibujar la confianza sobre el cuadro
+        texto = f"{confidence * 100:.2f}%"
+        # Poner el texto un poco arriba del cuadro
+        y = startY - 10 if startY - 10 > 10 else startY + 10
+        cv2.putText(frame, texto, (startX, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, color_cuadro, 2)
 
     # 10. Mostrar el fotograma resultante
     cv2.imshow('Deteccion DNN (Presiona "q")', frame)
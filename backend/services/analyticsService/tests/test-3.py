@@ -47,14 +47,12 @@ while True:
     results = model(frame, classes=[CLASS_ID_PERSON], conf=0.6, verbose=False)
 
     # --- 5. Dibujar Cuadros Azules ---
-    # Itera sobre cada detección en el frame actual
-    for box in results[0].boxes:
-        # Obtiene las coordenadas del cuadro (xyxy format)
-        x1, y1, x2, y2 = box.xyxy[0]
-
-        # Convierte las coordenadas a enteros para OpenCV
-        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+    # Extrae todas las detecciones de una vez como arreglos NumPy (N×4 cajas, N confianzas)
+    data = results[0].boxes.data.cpu().numpy()
+    boxes = data[:, :4].astype(int)
+    confidences = data[:, 4]
 
+    for (x1, y1, x2, y2), conf in zip(boxes.tolist(), confidences.tolist()):
         # Dibuja el rectángulo azul
         cv2.rectangle(
             img=frame,  # El frame donde dibujar
@@ -65,7 +63,6 @@ while True:
         )
 
         # (Opcional) Añadir etiqueta de confianza
-        conf = float(box.conf[0])
         label = f"Persona: {conf:.2f}"
         cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, COLOR_AZUL, 2)
 
@@ -0,0 +1,165 @@
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from alert_dispatcher import AlertDispatcher
+
+
+def make_alert(event_type="INTRUSION", details="Persona #1 ingresó a la zona 'puerta'."):
+    return {"camera_id": 1, "event_type": event_type, "details": details}
+
+
+def test_different_dedup_keys_are_not_coalesced(tmp_path):
+    dispatcher = AlertDispatcher("http://127.0.0.1:9", str(tmp_path))
+    assert dispatcher.submit(make_alert(), dedup_key=("puerta", 1))
+    assert dispatcher.submit(make_alert(details="Persona #2 ingresó a la zona 'puerta'."), dedup_key=("puerta", 2))
+    assert dispatcher.coalesced == 0
+    batch = dispatcher._drain(10)
+    assert [alert["details"] for alert in batch] == [
+        "Persona #1 ingresó a la zona 'puerta'.",
+        "Persona #2 ingresó a la zona 'puerta'.",
+    ]
+
+
+def test_same_dedup_key_is_coalesced_while_queued(tmp_path):
+    dispatcher = AlertDispatcher("http://127.0.0.1:9", str(tmp_path), dedup_window=30)
+    dispatcher.submit(make_alert(), dedup_key=("puerta", 1))
+    dispatcher.submit(make_alert(), dedup_key=("puerta", 1))
+    batch = dispatcher._drain(10)
+    assert len(batch) == 1
+    assert batch[0]["details"].endswith("(x2 en 30s)")
+    assert "_key" not in dispatcher._payload(batch[0])
+
+
+def test_dedup_window_starts_when_alert_is_sent(tmp_path):
+    dispatcher = AlertDispatcher("http://127.0.0.1:9", str(tmp_path), dedup_window=30)
+    dispatcher.submit(make_alert(), dedup_key="puerta")
+    assert dispatcher._recent == {}  # Aún en cola: no cuenta como enviada
+    dispatcher._drain(10)
+    assert dispatcher.submit(make_alert(), dedup_key="puerta")
+    assert dispatcher.coalesced == 1
+    assert dispatcher._queue.qsize() == 0
+
+
+def test_spool_pending_only_reads_new_lines(tmp_path, monkeypatch):
+    dispatcher = AlertDispatcher("http://127.0.0.1:9", str(tmp_path))
+    dispatcher._spool([make_alert() for _ in range(3)])
+    assert dispatcher.stats()["spool_pending"] == 3
+
+    # Un archivo de otro proceso que comparte la carpeta
+    other = AlertDispatcher("http://127.0.0.1:9", str(tmp_path))
+    other._spool_file = os.path.join(str(tmp_path), "alerts-0.jsonl")
+    other._spool([make_alert()])
+
+    reads = []
+    real_open = open
+
+    def counting_open(path, mode="r", *args, **kwargs):
+        reads.append(path)
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", counting_open)
+    assert dispatcher.stats()["spool_pending"] == 4
+    assert reads == [other._spool_file]  # El archivo ya contado no se vuelve a leer
+
+    reads.clear()
+    assert dispatcher.stats()["spool_pending"] == 4
+    assert reads == []
+
+    os.remove(other._spool_file)  # Reclamado por el reenvío
+    assert dispatcher.stats()["spool_pending"] == 3
+
+
+@pytest.fixture
+def stub_core(monkeypatch):
+    """El stub de alertas de Spring Boot (alert_stub_server.py) respondiendo 400 a INVALID."""
+    monkeypatch.setenv("STUB_REJECT_EVENT", "INVALID")
+    sys.modules.pop("alert_stub_server", None)
+    stub = importlib.import_module("alert_stub_server")
+    server = uvicorn.Server(uvicorn.Config(stub.app, host="127.0.0.1", port=0, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "el stub no arrancó"
+        time.sleep(0.02)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    yield stub, f"http://127.0.0.1:{port}/api/internal/alerts"
+    server.should_exit = True
+    thread.join(5)
+
+
+def test_rejected_alert_does_not_poison_its_batch(stub_core, tmp_path):
+    stub, url = stub_core
+    dispatcher = AlertDispatcher(url, str(tmp_path), max_retries=3, backoff_base=0.01)
+    alerts = [make_alert(details="a"), make_alert(event_type="INVALID", details="b"), make_alert(details="c")]
+    for index, alert in enumerate(alerts):
+        dispatcher.submit(alert, dedup_key=index)
+
+    assert dispatcher._deliver(dispatcher._drain(10)) == []
+    assert [alert["details"] for alert in stub.recibidas] == ["a", "c"]
+    assert dispatcher.rejected == 1
+    assert dispatcher.sent == 2
+    assert dispatcher.failed_attempts == 0  # Un 400 no se reintenta
+    assert dispatcher.stats()["spool_pending"] == 0
+
+
+def test_rejected_alerts_are_dropped_from_the_spool(stub_core, tmp_path):
+    stub, url = stub_core
+    dispatcher = AlertDispatcher(url, str(tmp_path), replay_interval=0.1, backoff_base=0.01)
+    dispatcher._spool([make_alert(event_type="INVALID", details="b")] +
+                      [make_alert(details=str(index)) for index in range(5)])
+    dispatcher.start()
+    try:
+        deadline = time.monotonic() + 10
+        while dispatcher.replayed < 6 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        dispatcher.stop()
+    assert [alert["details"] for alert in stub.recibidas] == ["0", "1", "2", "3", "4"]
+    assert dispatcher.rejected == 1
+    assert dispatcher.stats()["spool_pending"] == 0
+
+
+def test_replay_survives_truncated_lines_and_adopts_orphaned_claims(stub_core, tmp_path):
+    stub, url = stub_core
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    lines = [json.dumps(make_alert(details=str(index))) for index in range(3)]
+    # Un reenvío que murió a mitad de camino, con la última línea cortada por una caída al escribir
+    orphan = tmp_path / f"alerts-{dead.pid}.jsonl.replay-{dead.pid}"
+    orphan.write_text("\n".join(lines[:2]) + "\n" + lines[2][:20], encoding="utf-8")
+    (tmp_path / "alerts-1.jsonl").write_text(json.dumps(make_alert(details="3")) + "\n", encoding="utf-8")
+
+    dispatcher = AlertDispatcher(url, str(tmp_path), replay_interval=0.1)
+    dispatcher.start()
+    try:
+        deadline = time.monotonic() + 10
+        while dispatcher.replayed < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        dispatcher.stop()
+    assert sorted(alert["details"] for alert in stub.recibidas) == ["0", "1", "3"]
+    assert dispatcher.spool_invalid == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_recent_sends_are_pruned_after_the_window(tmp_path):
+    dispatcher = AlertDispatcher("http://127.0.0.1:9", str(tmp_path), dedup_window=0.05)
+    for track_id in range(100):
+        dispatcher.submit(make_alert(), dedup_key=("puerta", track_id))
+    dispatcher._drain(100)
+    assert len(dispatcher._recent) == 100
+
+    time.sleep(0.1)
+    dispatcher.submit(make_alert(), dedup_key=("puerta", 100))
+    dispatcher._drain(1)
+    dispatcher._prune_recent()
+    assert list(dispatcher._recent) == [(1, "INTRUSION", ("puerta", 100))]
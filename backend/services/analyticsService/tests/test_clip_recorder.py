@@ -0,0 +1,68 @@
+import time
+
+import cv2
+import numpy as np
+
+import clip_recorder
+from clip_recorder import ClipRecorder
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_continuous_event_is_split_into_bounded_clips(tmp_path):
+    recorder = ClipRecorder(7, str(tmp_path), pre_roll=1.0, post_roll=1.0, fps=10.0, max_clip_seconds=3.0)
+    recorder.start()
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    start = time.time()
+    paths = []
+    largest = 0
+    try:
+        # 12 s de un evento que se dispara en cada frame (p.ej. merodeo)
+        for index in range(120):
+            now = start + index * 0.1
+            recorder.add_frame(frame, timestamp=now)
+            wait_until(recorder._inbox.empty)
+            paths.append(recorder.trigger(now=now))
+            with recorder._lock:
+                if recorder._pending is not None:
+                    largest = max(largest, len(recorder._pending.packets))
+    finally:
+        recorder.stop()
+    clip_recorder._WRITER_POOL.submit(lambda: None).result(timeout=30)
+
+    distinct = list(dict.fromkeys(paths))
+    assert len(distinct) >= 3
+    # Pre-roll + tope del clip (+1 frame de margen), a 10 fps
+    assert largest <= (1.0 + 3.0) * 10 + 1
+    assert recorder.clips_written == len(distinct)
+    for public_path in distinct:
+        capture = cv2.VideoCapture(str(tmp_path / public_path.split("/")[-1]))
+        assert capture.isOpened()
+        capture.release()
+
+
+def test_short_event_keeps_one_clip(tmp_path):
+    recorder = ClipRecorder(8, str(tmp_path), post_roll=2.0, max_clip_seconds=10.0)
+    now = time.time()
+    first = recorder.trigger(now=now)
+    assert recorder.trigger(now=now + 1.0) == first
+    assert recorder._pending.until == now + 3.0
+    assert recorder.clips_triggered == 1
+
+
+def test_failed_clip_is_counted_and_cleaned_up(tmp_path):
+    recorder = ClipRecorder(9, str(tmp_path), fps=10.0)
+    ok, jpeg = cv2.imencode(".jpg", np.zeros((48, 64, 3), dtype=np.uint8))
+    now = time.time()
+    # El segundo frame está corrupto: el archivo temporal ya existe cuando falla
+    clip = clip_recorder._PendingClip(str(tmp_path / "cam_9_test.mp4"),
+                                      [(now, jpeg.tobytes()), (now + 0.1, b"no es un jpeg")], now, now)
+    clip_recorder._WRITER_POOL.submit(recorder._write_clip, clip).result(timeout=30)
+
+    assert recorder.clips_failed == 1
+    assert recorder.clips_written == 0
+    assert list(tmp_path.iterdir()) == []
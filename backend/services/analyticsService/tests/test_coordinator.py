@@ -0,0 +1,28 @@
+import importlib
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def coordinator(tmp_path, monkeypatch):
+    monkeypatch.setenv("COORDINATOR_REGISTRY_PATH", str(tmp_path / "coordinator.db"))
+    sys.modules.pop("coordinator", None)
+    module = importlib.import_module("coordinator")
+    yield module
+    module.registry.close()
+    sys.modules.pop("coordinator", None)
+
+
+def test_only_ready_nodes_are_placeable(coordinator):
+    for node_id, ready in (("listo", True), ("cargando", False)):
+        node = coordinator.Node(node_id, f"http://{node_id}:8000", 1.0)
+        node.ready = ready
+        coordinator.nodes[node_id] = node
+
+    assert coordinator.placeable_nodes() == {"listo": 1.0}
+    assert coordinator.plan_target(1, {}) == "listo"
+
+    coordinator.nodes["listo"].ready = False  # p.ej. falló la carga del modelo
+    assert coordinator.placeable_nodes() == {}
+    assert coordinator.plan_target(1, {}) is None
@@ -0,0 +1,15 @@
+import pytest
+
+import detectors
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_missing_custom_onnx_model_is_reported(backend, tmp_path, monkeypatch):
+    def must_not_run(*args, **kwargs):
+        raise AssertionError("un modelo propio no se exporta ni se cuantiza")
+
+    monkeypatch.setattr(detectors, "export_onnx_model", must_not_run)
+    monkeypatch.setattr(detectors, "quantize_onnx_model", must_not_run)
+    missing = str(tmp_path / "propio.int8.onnx")
+    with pytest.raises(FileNotFoundError, match="propio.int8.onnx"):
+        detectors.create_detector(backend, model_path=missing)
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from inference_scheduler import InferenceScheduler
+
+
+def test_frames_without_result_get_an_error():
+    # Un modelo que "pierde" el último frame de cada lote
+    scheduler = InferenceScheduler(lambda frames: [len(frames)] * (len(frames) - 1),
+                                   max_batch_size=4, max_wait_ms=200)
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    futures = [scheduler.submit(frame, camera_id) for camera_id in range(3)]
+    scheduler.start()
+    try:
+        assert futures[0].result(timeout=5) == 3
+        assert futures[1].result(timeout=5) == 3
+        with pytest.raises(RuntimeError):
+            futures[2].result(timeout=5)
+    finally:
+        scheduler.stop()
@@ -0,0 +1,39 @@
+from model_loader import ModelLoader
+
+
+def test_failing_on_ready_marks_load_as_failed_and_retries():
+    calls = []
+
+    def on_ready(detector):
+        calls.append(detector)
+        if len(calls) == 1:
+            raise RuntimeError("no se pudo iniciar el planificador")
+
+    loader = ModelLoader(lambda: object(), retry_delay=0.05)
+    loader.on_ready = on_ready
+    loader.start()
+    try:
+        assert loader.wait(timeout=5)
+        status = loader.status()
+        assert status["state"] == "ready"
+        assert status["attempts"] == 2
+        assert status["error"] is None
+        assert loader.detector is calls[-1]
+    finally:
+        loader.stop()
+
+
+def test_failing_on_ready_is_reported():
+    def on_ready(detector):
+        raise RuntimeError("no se pudo iniciar el planificador")
+
+    loader = ModelLoader(lambda: object(), retry_delay=30)
+    loader.on_ready = on_ready
+    loader.start()
+    try:
+        assert not loader.wait(timeout=0.5)
+        assert loader.state == "failed"
+        assert "planificador" in loader.error
+        assert loader.detector is None
+    finally:
+        loader.stop()
@@ -0,0 +1,71 @@
+from placement import HashRing, choose_node, load_bounds
+
+CAMERAS = range(2000)
+
+
+def owners(ring: HashRing) -> dict:
+    return {camera_id: ring.owner(camera_id) for camera_id in CAMERAS}
+
+
+def test_removing_a_node_only_moves_its_cameras():
+    ring = HashRing()
+    ring.set_nodes({"a": 1.0, "b": 1.0, "c": 1.0})
+    before = owners(ring)
+    ring.set_nodes({"a": 1.0, "b": 1.0})
+    after = owners(ring)
+
+    moved = {camera_id for camera_id in CAMERAS if before[camera_id] != after[camera_id]}
+    assert moved == {camera_id for camera_id in CAMERAS if before[camera_id] == "c"}
+    assert set(after.values()) == {"a", "b"}
+
+
+def test_adding_a_node_only_takes_cameras_for_itself():
+    ring = HashRing()
+    ring.set_nodes({"a": 1.0, "b": 1.0, "c": 1.0})
+    before = owners(ring)
+    ring.set_nodes({"a": 1.0, "b": 1.0, "c": 1.0, "d": 1.0})
+    after = owners(ring)
+
+    moved = {camera_id for camera_id in CAMERAS if before[camera_id] != after[camera_id]}
+    assert moved == {camera_id for camera_id in CAMERAS if after[camera_id] == "d"}
+    # Aproximadamente su parte (1/4), no una redistribución completa
+    assert 0.15 * len(CAMERAS) < len(moved) < 0.35 * len(CAMERAS)
+
+
+def test_share_follows_capacity():
+    ring = HashRing()
+    ring.set_nodes({"small": 1.0, "big": 3.0})
+    shares = list(owners(ring).values())
+    assert 0.65 < shares.count("big") / len(shares) < 0.85
+
+
+def test_load_bounds():
+    assert load_bounds({"a": 1.0, "b": 3.0}, 100, balance_factor=1.25) == {"a": 32, "b": 94}
+    assert load_bounds({"a": 1.0}, 0) == {"a": 1}
+    assert load_bounds({}, 10) == {}
+
+
+def test_choose_node_respects_bounds():
+    weights = {"a": 1.0, "b": 1.0, "c": 2.0}
+    ring = HashRing()
+    ring.set_nodes(weights)
+    bounds = load_bounds(weights, len(CAMERAS), balance_factor=1.1)
+    counts = {}
+    for camera_id in CAMERAS:
+        node = choose_node(ring, camera_id, counts, bounds)
+        counts[node] = counts.get(node, 0) + 1
+    assert all(counts[node] <= bounds[node] for node in weights)
+    assert sum(counts.values()) == len(CAMERAS)
+
+
+def test_choose_node_skips_overloaded_and_excluded():
+    weights = {"a": 1.0, "b": 1.0, "c": 1.0}
+    ring = HashRing()
+    ring.set_nodes(weights)
+    bounds = load_bounds(weights, 30)
+    owner = ring.owner(7)
+    assert choose_node(ring, 7, {}, bounds, overloaded={owner}) != owner
+    assert choose_node(ring, 7, {}, bounds, exclude={owner}) == ring.candidates(7)[1]
+    # Todos sobrecargados: el menos ocupado en proporción a su límite
+    assert choose_node(ring, 7, {"a": 5, "b": 1, "c": 5}, bounds, overloaded=set(weights)) == "b"
+    assert choose_node(ring, 7, {}, bounds, exclude=set(weights)) is None
@@ -0,0 +1,33 @@
+import pytest
+
+from rate_controller import InferenceRateController
+
+
+def test_non_positive_weight_is_rejected_without_changes():
+    controller = InferenceRateController(target_dps=10)
+    controller.register(1)
+    with pytest.raises(ValueError):
+        controller.configure_camera(1, weight=0, fixed_interval=0.5)
+    stats = controller.camera_stats(1)
+    assert stats["weight"] == 1.0
+    assert stats["fixed_interval_s"] is None
+    controller.report(1, num_persons=0)  # Sigue funcionando
+
+
+def test_non_positive_node_settings_are_rejected():
+    controller = InferenceRateController(target_dps=10, occupied_weight=3.0)
+    with pytest.raises(ValueError):
+        controller.configure_node(target_dps=5, occupied_weight=0)
+    assert controller.target_dps == 10
+    assert controller.occupied_weight == 3.0
+
+
+def test_camera_without_share_gets_max_interval():
+    controller = InferenceRateController(target_dps=10, max_interval=5.0)
+    rate = controller.register(1)
+    controller.register(2)
+    rate.weight = 0.0  # Un peso nulo que llegara por otra vía no rompe el cálculo
+    controller.report(1, num_persons=0)
+    controller.report(2, num_persons=0)
+    assert rate.interval == 5.0
+    assert controller.camera_stats(2)["interval_s"] == 0.1
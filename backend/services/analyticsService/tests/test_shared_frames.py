@@ -0,0 +1,101 @@
+import multiprocessing
+import threading
+import time
+
+from shared_frames import SharedFrameRing, SharedFrameSource
+
+CAMERA_ID = 987654
+
+
+def produce(value: int):
+    """Productor de prueba: publica frames llenos de `value` hasta que lo maten."""
+    ring = SharedFrameRing.create(CAMERA_ID, (4, 4, 3), num_slots=2)
+    while True:
+        acquired = ring.acquire(timeout=0.05)
+        if acquired is not None:
+            slot, view = acquired
+            view[:] = value
+            ring.commit(slot)
+        time.sleep(0.01)
+
+
+def read_value(source: SharedFrameSource, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = source.read(timeout=0.1)
+        if result is not None:
+            return int(result[0][0, 0, 0])
+    return None
+
+
+def test_consumer_follows_relaunched_producer():
+    context = multiprocessing.get_context("spawn")
+    source = SharedFrameSource(CAMERA_ID, threading.Event(), recheck_interval=0.2)
+    producers = []
+    try:
+        producers.append(context.Process(target=produce, args=(1,), daemon=True))
+        producers[-1].start()
+        assert read_value(source) == 1
+
+        # El proceso de captura muere sin cerrar su ring y el watchdog lanza otro
+        producers[-1].kill()
+        producers[-1].join()
+        producers.append(context.Process(target=produce, args=(2,), daemon=True))
+        producers[-1].start()
+
+        deadline = time.monotonic() + 10
+        value = None
+        while value != 2 and time.monotonic() < deadline:
+            value = read_value(source, timeout=0.5)
+        assert value == 2
+    finally:
+        source.join()
+        for producer in producers:
+            if producer.is_alive():
+                producer.kill()
+                producer.join()
+        ring = SharedFrameRing.attach(CAMERA_ID)
+        if ring is not None:
+            ring.owner = True  # Borra el segmento que dejó el último productor
+            ring.close()
+
+
+def test_stale_segment_is_marked_closed_on_recreate():
+    first = SharedFrameRing.create(CAMERA_ID, (4, 4, 3), num_slots=2)
+    consumer = SharedFrameRing.attach(CAMERA_ID)
+    try:
+        # Sin cerrar `first` (productor caído), otro productor recrea el segmento
+        second = SharedFrameRing.create(CAMERA_ID, (4, 4, 3), num_slots=2)
+        assert consumer.closed
+        assert SharedFrameRing.published_id(CAMERA_ID) == second.ring_id != first.ring_id
+        second.close()
+    finally:
+        consumer.close()
+        first.owner = False
+        first.close()
+
+
+def test_consumer_reattaches_when_segment_was_unlinked_by_someone_else():
+    source = SharedFrameSource(CAMERA_ID, threading.Event(), recheck_interval=0.1)
+    first = SharedFrameRing.create(CAMERA_ID, (4, 4, 3), num_slots=2)
+    second = None
+    try:
+        slot, view = first.acquire(timeout=0.1)
+        view[:] = 1
+        first.commit(slot)
+        assert read_value(source) == 1
+
+        # El resource tracker del productor muerto borra el segmento (queda "abierto" para
+        # quien lo tenga mapeado) y el productor nuevo crea uno distinto
+        first._shm.unlink()
+        second = SharedFrameRing.create(CAMERA_ID, (4, 4, 3), num_slots=2)
+        slot, view = second.acquire(timeout=0.1)
+        view[:] = 2
+        second.commit(slot)
+        assert read_value(source, timeout=2) == 2
+    finally:
+        source.join()
+        first.owner = False
+        first.close()
+        if second is not None:
+            second.close()
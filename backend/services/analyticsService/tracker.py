@@ -0,0 +1,202 @@
+import time
+
+import numpy as np
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """IoU de todos contra todos entre dos conjuntos de cajas (N×4 y M×4, formato x1,y1,x2,y2)."""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-6)
+
+
+def greedy_match(iou: np.ndarray, threshold: float):
+    """
+    Asociación voraz por IoU descendente (suficiente para escenas de vigilancia y sin scipy).
+    Retorna (pares [(fila, columna)], filas sin pareja, columnas sin pareja).
+    """
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols])
+    used_rows, used_cols, pairs = set(), set(), []
+    for row, col in zip(rows[order], cols[order]):
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        pairs.append((int(row), int(col)))
+
+    unmatched_rows = [r for r in range(iou.shape[0]) if r not in used_rows]
+    unmatched_cols = [c for c in range(iou.shape[1]) if c not in used_cols]
+    return pairs, unmatched_rows, unmatched_cols
+
+
+def _boxes_to_state(boxes: np.ndarray) -> np.ndarray:
+    """x1,y1,x2,y2 -> centro x, centro y, ancho, alto."""
+    width = boxes[:, 2] - boxes[:, 0]
+    height = boxes[:, 3] - boxes[:, 1]
+    return np.stack([boxes[:, 0] + width / 2, boxes[:, 1] + height / 2, width, height], axis=1)
+
+
+def _state_to_boxes(state: np.ndarray) -> np.ndarray:
+    cx, cy = state[:, 0], state[:, 1]
+    width, height = np.maximum(state[:, 2], 1.0), np.maximum(state[:, 3], 1.0)
+    return np.stack([cx - width / 2, cy - height / 2, cx + width / 2, cy + height / 2], axis=1)
+
+
+class PersonTracker:
+    """
+    Tracker multi-objeto ligero estilo SORT para una cámara.
+
+    Cada track es un filtro de Kalman de velocidad constante sobre (cx, cy, w, h)
+    con velocidades en píxeles por segundo. Todos los tracks se predicen a la vez
+    con operaciones NumPy vectorizadas, así que entre inferencias las cajas se
+    pueden extrapolar a la hora de cada frame. Cuando llegan detecciones nuevas se
+    asocian por IoU y se corrigen los tracks; los ids son estables mientras el track viva.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 2, min_hits: int = 2,
+                 process_noise: float = 10.0, measurement_noise: float = 4.0):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses  # Inferencias seguidas sin detección antes de eliminar el track
+        self.min_hits = min_hits  # Detecciones necesarias para confirmar un track
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+
+        self._next_id = 1
+        self._x = np.zeros((0, 8))         # Estado: cx, cy, w, h, vcx, vcy, vw, vh
+        self._p = np.zeros((0, 8, 8))      # Covarianzas
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._hits = np.zeros(0, dtype=np.int64)
+        self._scores = np.zeros(0)
+        self._first_seen = np.zeros(0)
+        self._misses = np.zeros(0, dtype=np.int64)
+        self._time = None
+
+        self._h = np.hstack([np.eye(4), np.zeros((4, 4))])  # Solo medimos la posición/tamaño
+
+        # Contadores
+        self.tracks_created = 0
+        self.updates = 0
+        self.predictions = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def predict(self, now: float = None):
+        """Avanza todos los tracks hasta `now` (vectorizado)."""
+        now = time.time() if now is None else now
+        if self._time is None:
+            self._time = now
+        dt = max(0.0, now - self._time)
+        self._time = now
+        if dt == 0.0 or len(self._ids) == 0:
+            return
+
+        f = np.eye(8)
+        f[:4, 4:] = np.eye(4) * dt
+        q = np.eye(8) * self.process_noise * dt
+        self._x = self._x @ f.T
+        self._p = f @ self._p @ f.T + q
+        self.predictions += 1
+
+    def update(self, boxes: np.ndarray, scores: np.ndarray = None, now: float = None):
+        """Corrige los tracks con las detecciones de una inferencia (cajas N×4 x1,y1,x2,y2)."""
+        now = time.time() if now is None else now
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        scores = np.ones(len(boxes)) if scores is None else np.asarray(scores, dtype=np.float64)
+
+        self.predict(now)
+        self.updates += 1
+
+        iou = iou_matrix(_state_to_boxes(self._x), boxes) if len(self._ids) else np.zeros((0, len(boxes)))
+        pairs, _, unmatched_detections = greedy_match(iou, self.iou_threshold)
+
+        if pairs:
+            tracks = np.array([t for t, _ in pairs])
+            detections = np.array([d for _, d in pairs])
+            z = _boxes_to_state(boxes[detections])
+
+            # Actualización de Kalman por lotes para todos los tracks asociados
+            p = self._p[tracks]
+            r = np.eye(4) * self.measurement_noise
+            s = self._h @ p @ self._h.T + r
+            k = p @ self._h.T @ np.linalg.inv(s)
+            innovation = z - self._x[tracks] @ self._h.T
+            self._x[tracks] += np.einsum("nij,nj->ni", k, innovation)
+            self._p[tracks] = (np.eye(8) - k @ self._h) @ p
+
+            self._hits[tracks] += 1
+            self._scores[tracks] = scores[detections]
+
+        # Los tracks sin detección en esta inferencia suman un fallo; los asociados se reinician
+        matched = np.zeros(len(self._ids), dtype=bool)
+        if pairs:
+            matched[tracks] = True
+        self._misses[matched] = 0
+        self._misses[~matched] += 1
+
+        # Eliminamos los tracks que llevan demasiadas inferencias sin detección
+        alive = self._misses <= self.max_misses
+        if not alive.all():
+            self._keep(alive)
+
+        if unmatched_detections:
+            self._spawn(boxes[unmatched_detections], scores[unmatched_detections], now)
+
+    def _spawn(self, boxes: np.ndarray, scores: np.ndarray, now: float):
+        count = len(boxes)
+        x = np.zeros((count, 8))
+        x[:, :4] = _boxes_to_state(boxes)
+        p = np.tile(np.diag([10.0, 10.0, 10.0, 10.0, 1000.0, 1000.0, 1000.0, 1000.0]), (count, 1, 1))
+
+        self._x = np.vstack([self._x, x])
+        self._p = np.concatenate([self._p, p])
+        self._ids = np.concatenate([self._ids, np.arange(self._next_id, self._next_id + count)])
+        self._hits = np.concatenate([self._hits, np.ones(count, dtype=np.int64)])
+        self._scores = np.concatenate([self._scores, scores])
+        self._first_seen = np.concatenate([self._first_seen, np.full(count, now)])
+        self._misses = np.concatenate([self._misses, np.zeros(count, dtype=np.int64)])
+        self._next_id += count
+        self.tracks_created += count
+
+    def _keep(self, mask: np.ndarray):
+        self._x, self._p = self._x[mask], self._p[mask]
+        self._ids, self._hits, self._scores = self._ids[mask], self._hits[mask], self._scores[mask]
+        self._first_seen, self._misses = self._first_seen[mask], self._misses[mask]
+
+    def tracks(self, now: float = None):
+        """
+        Tracks confirmados en su posición actual.
+        Retorna (ids, cajas N×4, scores, segundos de permanencia).
+        """
+        now = self._time if now is None else now
+        confirmed = self._hits >= self.min_hits
+        return (
+            self._ids[confirmed],
+            _state_to_boxes(self._x[confirmed]),
+            self._scores[confirmed],
+            (now or 0.0) - self._first_seen[confirmed],
+        )
+
+    def count(self) -> int:
+        """Personas a la vista (tracks confirmados)."""
+        return int((self._hits >= self.min_hits).sum())
+
+    def stats(self) -> dict:
+        ids, _, _, dwell = self.tracks()
+        return {
+            "active_tracks": int(len(ids)),
+            "tentative_tracks": int(len(self._ids) - len(ids)),
+            "tracks_created": self.tracks_created,
+            "updates": self.updates,
+            "predictions": self.predictions,
+            "max_dwell_s": round(float(dwell.max()), 1) if len(dwell) else 0.0,
+        }
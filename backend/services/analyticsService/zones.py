@@ -0,0 +1,210 @@
+import cv2
+import numpy as np
+
+from detectors import Detections
+
+
+class Zone:
+    """
+    Zona poligonal de una cámara, en coordenadas normalizadas (0..1) para que no
+    dependa de la resolución con la que se analiza el stream.
+
+    - "include": solo cuentan las personas dentro de alguna zona de este tipo (si hay alguna)
+      y la inferencia se limita al rectángulo que las contiene.
+    - "exclude": las personas dentro de estas zonas se ignoran.
+    Reglas opcionales: `intrusion` (alerta cuando alguien entra) y `max_occupancy`
+    (alerta cuando hay más personas que las permitidas).
+    """
+
+    def __init__(self, name: str, points, kind: str = "include", intrusion: bool = False,
+                 max_occupancy: int = None):
+        if kind not in ("include", "exclude"):
+            raise ValueError(f"Tipo de zona inválido: '{kind}' (se espera 'include' o 'exclude').")
+        points = np.asarray(points, dtype=np.float32)
+        if points.ndim != 2 or points.shape[0] < 3 or points.shape[1] != 2:
+            raise ValueError(f"La zona '{name}' necesita al menos 3 puntos [x, y].")
+        if points.min() < 0 or points.max() > 1:
+            raise ValueError(f"Los puntos de la zona '{name}' deben estar normalizados entre 0 y 1.")
+
+        self.name = name
+        self.points = points
+        self.kind = kind
+        self.intrusion = intrusion
+        self.max_occupancy = max_occupancy
+
+    def pixel_points(self, width: int, height: int) -> np.ndarray:
+        return np.round(self.points * [width - 1, height - 1]).astype(np.int32)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "points": self.points.tolist(),
+            "intrusion": self.intrusion,
+            "max_occupancy": self.max_occupancy,
+        }
+
+
+class ZoneSet:
+    """
+    Zonas de una cámara rasterizadas una sola vez por resolución de frame.
+
+    Con las máscaras precalculadas, saber en qué zonas está cada persona es una sola
+    indexación NumPy sobre los "puntos de apoyo" (centro inferior de cada caja) de
+    todas las cajas a la vez. `crop()` entrega el rectángulo de las zonas "include"
+    (una vista, sin copiar) para que el detector procese solo esos píxeles.
+    """
+
+    def __init__(self, zones: list, roi_margin: float = 0.05):
+        self.zones = zones
+        self.roi_margin = roi_margin  # Margen alrededor del ROI (fracción del frame) para no cortar personas
+
+        self._shape = None
+        self._allowed = None      # (H, W) bool: el punto cuenta (dentro de "include" y fuera de "exclude")
+        self._zone_masks = None   # (Z, H, W) bool: una máscara por zona
+        self._roi = None          # (x1, y1, x2, y2) en píxeles, o None si es el frame completo
+        self._pixel_points = []
+
+        # Estado de las reglas
+        self._inside = {zone.name: set() for zone in zones}  # Tracks dentro de cada zona
+        self._over_capacity = set()  # Zonas que ya alertaron por exceso de ocupación
+        self.occupancy = {zone.name: 0 for zone in zones if zone.kind == "include"}
+
+        # Contadores
+        self.detections_in = 0
+        self.detections_filtered = 0
+        self.intrusions = 0
+        self.occupancy_alerts = 0
+
+    @classmethod
+    def from_config(cls, zones: list, **kwargs) -> "ZoneSet":
+        """Crea el conjunto desde dicts {name, points, kind, intrusion, max_occupancy}."""
+        return cls([Zone(**zone) for zone in zones], **kwargs)
+
+    def to_config(self) -> list:
+        return [zone.to_dict() for zone in self.zones]
+
+    def _prepare(self, shape):
+        """Rasteriza las zonas para una resolución (solo cuando cambia)."""
+        height, width = shape[:2]
+        if self._shape == (height, width):
+            return
+        self._shape = (height, width)
+        self._pixel_points = [zone.pixel_points(width, height) for zone in self.zones]
+
+        masks = np.zeros((len(self.zones), height, width), dtype=np.uint8)
+        for index, points in enumerate(self._pixel_points):
+            cv2.fillPoly(masks[index], [points], 1)
+        self._zone_masks = masks.astype(bool)
+
+        kinds = np.array([zone.kind for zone in self.zones])
+        include = self._zone_masks[kinds == "include"]
+        exclude = self._zone_masks[kinds == "exclude"]
+        allowed = include.any(axis=0) if len(include) else np.ones((height, width), dtype=bool)
+        if len(exclude):
+            allowed &= ~exclude.any(axis=0)
+        self._allowed = allowed
+
+        self._roi = None
+        if len(include):
+            ys, xs = np.nonzero(include.any(axis=0))
+            margin_x, margin_y = int(width * self.roi_margin), int(height * self.roi_margin)
+            # La caja de una persona sobresale de la zona (la zona contiene sus pies)
+            roi = (max(0, int(xs.min()) - margin_x), max(0, int(ys.min()) - margin_y - height // 4),
+                   min(width, int(xs.max()) + 1 + margin_x), min(height, int(ys.max()) + 1 + margin_y))
+            if (roi[2] - roi[0]) * (roi[3] - roi[1]) < width * height:
+                self._roi = roi
+
+    def crop(self, frame: np.ndarray):
+        """Retorna (vista del ROI, (offset_x, offset_y)). Sin zonas "include" es el frame completo."""
+        self._prepare(frame.shape)
+        if self._roi is None:
+            return frame, (0, 0)
+        x1, y1, x2, y2 = self._roi
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def roi_fraction(self) -> float:
+        """Fracción de los píxeles del frame que llegan al detector."""
+        if self._shape is None or self._roi is None:
+            return 1.0
+        x1, y1, x2, y2 = self._roi
+        return (x2 - x1) * (y2 - y1) / (self._shape[0] * self._shape[1])
+
+    def _feet(self, boxes: np.ndarray):
+        """Índices (ys, xs) del punto de apoyo (centro inferior) de cada caja, dentro del frame."""
+        height, width = self._shape
+        xs = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2).astype(np.int32), 0, width - 1)
+        ys = np.clip(boxes[:, 3].astype(np.int32), 0, height - 1)
+        return ys, xs
+
+    def filter(self, detections: Detections, shape) -> Detections:
+        """Descarta las detecciones fuera de las zonas "include" o dentro de una "exclude"."""
+        self._prepare(shape)
+        if len(detections) == 0:
+            return detections
+        ys, xs = self._feet(detections.boxes)
+        keep = self._allowed[ys, xs]
+        self.detections_in += len(detections)
+        self.detections_filtered += int(len(keep) - keep.sum())
+        return Detections(detections.boxes[keep], detections.confidences[keep])
+
+    def membership(self, boxes: np.ndarray, shape) -> np.ndarray:
+        """Matriz (Z, N) bool: si la caja n está en la zona z."""
+        self._prepare(shape)
+        if len(boxes) == 0:
+            return np.zeros((len(self.zones), 0), dtype=bool)
+        ys, xs = self._feet(boxes)
+        return self._zone_masks[:, ys, xs]
+
+    def evaluate(self, track_ids: np.ndarray, boxes: np.ndarray, shape) -> list:
+        """
+        Aplica las reglas de las zonas a los tracks actuales.
+        Retorna una lista de (event_type, detalle, clave) con los eventos nuevos; la clave
+        identifica el evento para la fusión de alertas (la zona y, si aplica, el track).
+        """
+        events = []
+        inside = self.membership(boxes, shape)
+        ids = track_ids.tolist()
+        for index, zone in enumerate(self.zones):
+            if zone.kind != "include":
+                continue
+            current = {track_id for track_id, flag in zip(ids, inside[index].tolist()) if flag}
+            self.occupancy[zone.name] = len(current)
+
+            if zone.intrusion:
+                for track_id in sorted(current - self._inside[zone.name]):
+                    self.intrusions += 1
+                    events.append(("INTRUSION", f"Persona #{track_id} ingresó a la zona '{zone.name}'.",
+                                   (zone.name, track_id)))
+            self._inside[zone.name] = current
+
+            if zone.max_occupancy is not None:
+                if len(current) > zone.max_occupancy and zone.name not in self._over_capacity:
+                    self._over_capacity.add(zone.name)
+                    self.occupancy_alerts += 1
+                    events.append(("OCCUPANCY_EXCEEDED",
+                                   f"{len(current)} personas en la zona '{zone.name}' "
+                                   f"(máximo {zone.max_occupancy}).", zone.name))
+                elif len(current) <= zone.max_occupancy:
+                    self._over_capacity.discard(zone.name)  # Se rearma al volver al límite
+        return events
+
+    def draw(self, frame: np.ndarray, color=(0, 255, 255), thickness: int = 1) -> np.ndarray:
+        """Dibuja el contorno de las zonas sobre el frame (en el lugar, como `draw_boxes`)."""
+        self._prepare(frame.shape)
+        for zone, points in zip(self.zones, self._pixel_points):
+            zone_color = color if zone.kind == "include" else (0, 0, 255)
+            cv2.polylines(frame, [points], True, zone_color, thickness)
+        return frame
+
+    def stats(self) -> dict:
+        return {
+            "zones": len(self.zones),
+            "roi": list(self._roi) if self._roi is not None else None,
+            "roi_fraction": round(self.roi_fraction(), 3),
+            "detections_in": self.detections_in,
+            "detections_filtered": self.detections_filtered,
+            "occupancy": dict(self.occupancy),
+            "intrusions": self.intrusions,
+            "occupancy_alerts": self.occupancy_alerts,
+        }
@@ -0,0 +1,225 @@
+import asyncio
+import collections
+import logging
+import re
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg separa las líneas de progreso con '\r' y los mensajes con '\n'
+LINE_SPLIT = re.compile(rb"[\r\n]+")
+
+# Línea de progreso: "frame= 250 fps= 25 q=-1.0 size= 1024kB time=00:00:10.00 bitrate= 838.9kbits/s drop=2 speed=1.01x"
+PROGRESS_FIELD = re.compile(r"(\w+)=\s*(\S+)")
+
+# Con "-progress pipe:2" ffmpeg escribe bloques "clave=valor", uno por línea, que terminan
+# en "progress=continue" (o "progress=end"). No dependen de -loglevel.
+PROGRESS_KEY = re.compile(
+    r"^(frame|fps|stream_\d+_\d+_q|bitrate|total_size|out_time_us|out_time_ms|out_time|"
+    r"dup_frames|drop_frames|speed|progress)=\s*(.*)$"
+)
+
+# Opciones para que launch_stream obtenga el progreso aunque -loglevel oculte la línea de stats
+PROGRESS_ARGS = ["-nostats", "-progress", "pipe:2"]
+
+
+def _parse_time(value: str) -> Optional[float]:
+    """"HH:MM:SS.ss" -> segundos (None si es "N/A" o negativo, como al arrancar)."""
+    try:
+        hours, minutes, seconds = value.split(":")
+        if hours.startswith("-"):
+            return None
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+def _parse_number(value: str) -> Optional[float]:
+    """"838.9kbits/s", "1.01x", "1024kB", "N/A" -> número (o None)."""
+    match = re.match(r"-?\d+(\.\d+)?", value)
+    return float(match.group()) if match else None
+
+
+class FfmpegProcess:
+    """
+    Un proceso ffmpeg administrado con asyncio (sin bloquear el event loop).
+
+    stderr se vacía continuamente en una tarea propia: si nadie lo leyera, el pipe
+    se llenaría y ffmpeg quedaría bloqueado escribiendo su progreso. El progreso (los
+    bloques de `-progress pipe:2` o la línea clásica "frame=... time=...") se convierte en
+    métricas (`metrics()`); el resto de los mensajes se guarda en un buffer circular de
+    `stderr_lines` líneas para diagnosticar fallos.
+    """
+
+    def __init__(self, name: str, command: List[str], stderr_lines: int = 50):
+        self.name = name
+        self.command = command
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.stderr = collections.deque(maxlen=stderr_lines)
+        self._drain_task: Optional[asyncio.Task] = None
+
+        # Métricas extraídas de la salida de progreso
+        self.started_at: Optional[float] = None
+        self.last_progress_at: Optional[float] = None
+        self.progress = {}
+        self._progress_block = {}  # Bloque de "-progress" en curso
+        self.progress_event = asyncio.Event()  # Se activa con cada línea de progreso
+        self.log_lines = 0
+        self.warnings = 0
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.returncode if self.process else None
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, startup_check: float = 1.0):
+        """
+        Lanza ffmpeg y espera `startup_check` segundos para detectar fallos inmediatos
+        (URL inválida, credenciales...). Lanza RuntimeError con el final de stderr si
+        el proceso terminó en ese lapso.
+        """
+        self.started_at = time.monotonic()
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        self._drain_task = asyncio.create_task(self._drain_stderr())
+
+        try:
+            await asyncio.wait_for(asyncio.shield(self.process.wait()), timeout=startup_check)
+        except asyncio.TimeoutError:
+            return  # Sigue corriendo: arrancó bien
+
+        await self._drain_task
+        raise RuntimeError(self.stderr_tail(10) or f"ffmpeg terminó con código {self.process.returncode}")
+
+    async def _drain_stderr(self):
+        buffer = b""
+        try:
+            while True:
+                chunk = await self.process.stderr.read(4096)
+                if not chunk:
+                    break
+                parts = LINE_SPLIT.split(buffer + chunk)
+                buffer = parts.pop()  # Línea incompleta: esperamos el resto
+                for part in parts:
+                    if part:
+                        self._on_line(part.decode("utf-8", errors="ignore"))
+            if buffer:
+                self._on_line(buffer.decode("utf-8", errors="ignore"))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error leyendo stderr de '{self.name}': {str(e)}")
+
+    def _on_line(self, line: str):
+        match = PROGRESS_KEY.match(line)
+        if match:
+            self._on_progress_field(match.group(1), match.group(2).strip())
+            return
+        if line.startswith("frame=") or (line.startswith("size=") and "time=" in line):
+            self._on_progress(line)
+            return
+        self.stderr.append(line)
+        self.log_lines += 1
+        lowered = line.lower()
+        if "error" in lowered or "warning" in lowered or "invalid" in lowered:
+            self.warnings += 1
+
+    def _on_progress(self, line: str):
+        fields = dict(PROGRESS_FIELD.findall(line))
+        progress = {}
+        for key in ("frame", "drop", "dup"):
+            if key in fields:
+                value = _parse_number(fields[key])
+                progress[key] = int(value) if value is not None else None
+        for key in ("fps", "bitrate", "speed", "size"):
+            if key in fields:
+                progress[key] = _parse_number(fields[key])
+        if "time" in fields:
+            progress["time"] = _parse_time(fields["time"])
+        self._set_progress(progress)
+
+    def _on_progress_field(self, key: str, value: str):
+        """Acumula un campo de "-progress"; el bloque se publica al llegar "progress=..."."""
+        if key != "progress":
+            self._progress_block[key] = value
+            return
+        fields, self._progress_block = self._progress_block, {}
+        progress = {}
+        for source, key in (("frame", "frame"), ("drop_frames", "drop"), ("dup_frames", "dup")):
+            if source in fields:
+                number = _parse_number(fields[source])
+                progress[key] = int(number) if number is not None else None
+        for key in ("fps", "bitrate", "speed"):
+            if key in fields:
+                progress[key] = _parse_number(fields[key])
+        if "total_size" in fields:
+            size = _parse_number(fields["total_size"])  # Bytes (la línea clásica usa kB)
+            progress["size"] = round(size / 1024, 1) if size is not None else None
+        if "out_time_us" in fields:
+            microseconds = _parse_number(fields["out_time_us"])
+            progress["time"] = microseconds / 1e6 if microseconds is not None and microseconds >= 0 else None
+        elif "out_time" in fields:
+            progress["time"] = _parse_time(fields["out_time"])
+        self._set_progress(progress)
+
+    def _set_progress(self, progress: dict):
+        self.progress = progress
+        self.last_progress_at = time.monotonic()
+        self.progress_event.set()
+
+    def metrics(self) -> dict:
+        """Últimas estadísticas de progreso de ffmpeg (sin consultar al proceso)."""
+        now = time.monotonic()
+        progress = self.progress
+        return {
+            "frames": progress.get("frame"),
+            "fps": progress.get("fps"),
+            "bitrate_kbps": progress.get("bitrate"),
+            "speed": progress.get("speed"),
+            "dropped_frames": progress.get("drop"),
+            "duplicated_frames": progress.get("dup"),
+            "output_kb": progress.get("size"),
+            "media_time_s": progress.get("time"),
+            "uptime_s": round(now - self.started_at, 1) if self.started_at else None,
+            "last_progress_age_s": round(now - self.last_progress_at, 1) if self.last_progress_at else None,
+            "log_lines": self.log_lines,
+            "warnings": self.warnings,
+        }
+
+    def stderr_tail(self, lines: int = 10) -> str:
+        return "\n".join(list(self.stderr)[-lines:])
+
+    async def wait(self) -> int:
+        returncode = await self.process.wait()
+        if self._drain_task is not None:
+            await self._drain_task
+        return returncode
+
+    async def stop(self, timeout: float = 5.0):
+        """Termina ffmpeg de forma limpia; si no sale en `timeout` segundos, lo mata."""
+        if not self.running:
+            return
+        try:
+            self.process.terminate()
+            await asyncio.wait_for(self.process.wait(), timeout=timeout)
+        except ProcessLookupError:
+            pass  # Ya había terminado
+        except asyncio.TimeoutError:
+            logger.warning(f"Stream '{self.name}' no respondió a SIGTERM, forzando terminación")
+            self.process.kill()
+            await self.process.wait()
+        finally:
+            if self._drain_task is not None:
+                self._drain_task.cancel()
@@ -1,12 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Path, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import subprocess
+from fastapi.responses import FileResponse, PlainTextResponse
+from pydantic import BaseModel, Field
 import asyncio
-from typing import Dict, Optional
+import os
+import time
+from typing import Dict, List, Optional, Set
 import logging
 from datetime import datetime
 
+from stream_registry import StreamRegistry
+from ffmpeg_process import PROGRESS_ARGS
+from metrics import REGISTRY, Counter, family, render
+from profiler import SamplingProfiler
+from recordings import STREAM_NAME_PATTERN, RecordingIndex, segment_output, stitch_clip
+from supervisor import RestartRateLimiter, SupervisedStream
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,18 +31,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Diccionario para almacenar los procesos activos
-active_streams: Dict[str, subprocess.Popen] = {}
+# Configuración de la grabación segmentada (misma salida de ffmpeg, sin recodificar)
+RECORDINGS_DIR = os.getenv("RECORDINGS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings"))
+RECORDING_ENABLED = os.getenv("RECORDING_ENABLED", "0") == "1"  # Valor por defecto si el request no indica "record"
+RECORDING_SEGMENT_SECONDS = int(os.getenv("RECORDING_SEGMENT_SECONDS", "10"))
+RECORDING_RETENTION_HOURS = float(os.getenv("RECORDING_RETENTION_HOURS", "24"))
+RECORDING_MAX_GB = float(os.getenv("RECORDING_MAX_GB", "0")) or None  # 0 = sin límite de espacio
+RECORDING_MAX_CLIP_SECONDS = float(os.getenv("RECORDING_MAX_CLIP_SECONDS", "600"))
+CLIPS_DIR = os.path.join(RECORDINGS_DIR, "clips")
+
+recording_index = RecordingIndex(RECORDINGS_DIR)
+
+# Tiempos de espera al detener un stream
+STOP_TIMEOUT_SECONDS = float(os.getenv("STOP_TIMEOUT_SECONDS", "5"))
+
+# Configuración del reinicio automático de streams caídos
+RESTART_BACKOFF_BASE_SECONDS = float(os.getenv("RESTART_BACKOFF_BASE_SECONDS", "1"))
+RESTART_BACKOFF_MAX_SECONDS = float(os.getenv("RESTART_BACKOFF_MAX_SECONDS", "60"))
+STALL_TIMEOUT_SECONDS = float(os.getenv("STALL_TIMEOUT_SECONDS", "20"))  # Sin progreso = cámara colgada
+RESTART_MAX_CONSECUTIVE = int(os.getenv("RESTART_MAX_CONSECUTIVE", "0"))  # 0 = reintentar siempre
+# Reinicios por segundo (y ráfaga) permitidos en todo el nodo
+RESTART_RATE_PER_SECOND = float(os.getenv("RESTART_RATE_PER_SECOND", "2"))
+RESTART_BURST = int(os.getenv("RESTART_BURST", "10"))
+
+restart_limiter = RestartRateLimiter(RESTART_RATE_PER_SECOND, RESTART_BURST)
+
+# Registro persistente de streams: al reiniciar el servicio se vuelven a levantar todos,
+# a la vez pero escalonados cada WARM_RESTART_STAGGER_SECONDS segundos
+STREAM_REGISTRY_ENABLED = os.getenv("STREAM_REGISTRY_ENABLED", "1") == "1"
+STREAM_REGISTRY_PATH = os.getenv("STREAM_REGISTRY_PATH",
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), "stream_registry.db"))
+WARM_RESTART_STAGGER_SECONDS = float(os.getenv("WARM_RESTART_STAGGER_SECONDS", "0.2"))
+
+stream_registry = StreamRegistry(STREAM_REGISTRY_PATH) if STREAM_REGISTRY_ENABLED else None
+
+# Diccionario para almacenar los streams activos (cada uno supervisa su proceso ffmpeg)
+active_streams: Dict[str, SupervisedStream] = {}
+
+# Streams que se están iniciando (reservan el nombre mientras ffmpeg arranca)
+starting_streams: Set[str] = set()
+
+# Streams que además de publicarse en MediaMTX se graban en disco
+recording_streams: Set[str] = set()
 
-# Tarea de monitoreo
-monitor_task: Optional[asyncio.Task] = None
+# Tarea de retención de grabaciones
+retention_task: Optional[asyncio.Task] = None
+
+# Tarea que vuelve a levantar los streams del registro al arrancar
+restore_task: Optional[asyncio.Task] = None
+
+# Métricas (formato Prometheus en /metrics); las de cada stream se leen del supervisor al consultar
+STREAM_STARTS = Counter("streaming_stream_starts_total", "Peticiones de inicio de stream (result: started/failed)",
+                        ["result"])
+
+# Perfilador por muestreo (apagado hasta que se active por la API)
+profiler = SamplingProfiler()
 
 
 class StreamConfig(BaseModel):
-    stream_name: str
+    # Se usa como carpeta de grabaciones y en la ruta de salida de ffmpeg
+    stream_name: str = Field(..., pattern=STREAM_NAME_PATTERN)
     rtsp_url: str
     username: Optional[str] = None
     password: Optional[str] = None
+    record: Optional[bool] = None  # Grabar segmentos en disco (None = RECORDING_ENABLED)
+
+
+class BulkStartRequest(BaseModel):
+    streams: List[StreamConfig]
+
+
+class BulkStopRequest(BaseModel):
+    stream_names: Optional[List[str]] = None  # None = todos los streams activos
+
+
+class ClipRequest(BaseModel):
+    start: datetime
+    end: datetime
 
 
 class StreamResponse(BaseModel):
@@ -43,53 +117,142 @@ class StreamResponse(BaseModel):
     mediamtx_url: Optional[str] = None
 
 
-async def monitor_streams():
+def remove_failed_stream(stream: SupervisedStream):
+    """Un stream que agotó sus reintentos se quita automáticamente"""
+    if active_streams.get(stream.name) is stream:
+        del active_streams[stream.name]
+        recording_streams.discard(stream.name)
+        logger.info(f"Stream '{stream.name}' removido automáticamente (cámara no disponible)")
+
+
+def describe_stream(stream_name: str, stream: SupervisedStream) -> dict:
+    is_running = stream.running
+    return {
+        "stream_name": stream_name,
+        "status": "running" if is_running else stream.state,
+        "pid": stream.process.pid if is_running else None,
+        "recording": stream_name in recording_streams,
+        **stream.stats(),
+        "metrics": stream.process.metrics()
+    }
+
+
+def collect_stream_metrics() -> list:
+    """Métricas de cada stream activo, tomadas de su supervisor y del progreso de ffmpeg."""
+    streams = []
+    for name, stream in list(active_streams.items()):
+        metrics = stream.process.metrics() if stream.process is not None else {}
+        streams.append(({"stream": name}, stream, metrics))
+
+    def per_stream(metric_name, metric_type, documentation, value):
+        return family(metric_name, metric_type, documentation,
+                      [(labels, value(stream, metrics)) for labels, stream, metrics in streams])
+
+    limiter = restart_limiter.stats()
+    return [
+        family("streaming_streams_active", "gauge", "Streams administrados", [({}, len(streams))]),
+        per_stream("streaming_stream_up", "gauge", "1 si ffmpeg está corriendo",
+                   lambda stream, _: int(stream.running)),
+        per_stream("streaming_stream_health", "gauge", "Puntaje de salud del stream (0-100)",
+                   lambda stream, _: stream.health()),
+        per_stream("streaming_stream_recording", "gauge", "1 si el stream se graba en disco",
+                   lambda stream, _: int(stream.name in recording_streams)),
+        per_stream("streaming_ffmpeg_restarts_total", "counter", "Reinicios de ffmpeg hechos por el supervisor",
+                   lambda stream, _: stream.restarts),
+        per_stream("streaming_ffmpeg_stalls_total", "counter", "Reinicios por falta de progreso",
+                   lambda stream, _: stream.stalls),
+        per_stream("streaming_ffmpeg_uptime_seconds", "gauge", "Tiempo desde que arrancó el ffmpeg actual",
+                   lambda _, metrics: metrics.get("uptime_s")),
+        per_stream("streaming_ffmpeg_bitrate_kbps", "gauge", "Bitrate de salida reportado por ffmpeg",
+                   lambda _, metrics: metrics.get("bitrate_kbps")),
+        per_stream("streaming_ffmpeg_fps", "gauge", "Frames por segundo reportados por ffmpeg",
+                   lambda _, metrics: metrics.get("fps")),
+        per_stream("streaming_ffmpeg_speed", "gauge", "Velocidad respecto de tiempo real (1 = tiempo real)",
+                   lambda _, metrics: metrics.get("speed")),
+        per_stream("streaming_ffmpeg_frames", "gauge", "Frames procesados por el ffmpeg actual",
+                   lambda _, metrics: metrics.get("frames")),
+        per_stream("streaming_ffmpeg_dropped_frames", "gauge", "Frames descartados por el ffmpeg actual",
+                   lambda _, metrics: metrics.get("dropped_frames")),
+        per_stream("streaming_ffmpeg_last_progress_age_seconds", "gauge", "Segundos desde el último progreso",
+                   lambda _, metrics: metrics.get("last_progress_age_s")),
+        family("streaming_restart_limiter_tokens", "gauge", "Reinicios disponibles en el limitador del nodo",
+               [({}, limiter["tokens"])]),
+        family("streaming_restart_limiter_waiting", "gauge", "Streams esperando turno para reiniciarse",
+               [({}, limiter["waiting"])]),
+    ]
+
+
+REGISTRY.add_collector(collect_stream_metrics)
+
+
+async def enforce_retention():
     """
-    Tarea en segundo plano que monitorea el estado de los streams
-    y limpia automáticamente los que han fallado
+    Tarea en segundo plano que borra los segmentos grabados más viejos que
+    RECORDING_RETENTION_HOURS (o los más antiguos si se supera RECORDING_MAX_GB)
     """
+    max_bytes = int(RECORDING_MAX_GB * 1024 ** 3) if RECORDING_MAX_GB else None
     while True:
         try:
-            # Revisar cada 5 segundos
-            await asyncio.sleep(5)
-            
-            # Lista de streams que han terminado
-            dead_streams = []
-            
-            for stream_name, process in active_streams.items():
-                # Verificar si el proceso sigue corriendo
-                if process.poll() is not None:
-                    # El proceso terminó
-                    dead_streams.append(stream_name)
-                    
-                    # Leer el error de stderr si existe
-                    try:
-                        stderr = process.stderr.read().decode('utf-8', errors='ignore')
-                        if stderr:
-                            logger.error(f"Stream '{stream_name}' terminó con error: {stderr[-500:]}")
-                        else:
-                            logger.warning(f"Stream '{stream_name}' terminó inesperadamente")
-                    except:
-                        logger.warning(f"Stream '{stream_name}' terminó")
-            
-            # Limpiar los streams muertos
-            for stream_name in dead_streams:
-                del active_streams[stream_name]
-                logger.info(f"Stream '{stream_name}' removido automáticamente (cámara no disponible)")
-        
+            await asyncio.sleep(60)
+            removed = await asyncio.to_thread(
+                recording_index.apply_retention, RECORDING_RETENTION_HOURS * 3600, max_bytes
+            )
+            if removed:
+                logger.info(f"Retención: {removed} segmento(s) eliminado(s)")
         except asyncio.CancelledError:
-            # Tarea cancelada, salir del loop
             break
         except Exception as e:
-            logger.error(f"Error en monitor de streams: {str(e)}")
+            logger.error(f"Error en la retención de grabaciones: {str(e)}")
+
+
+async def launch_many(configs: List[StreamConfig], stagger: float = 0.0) -> list:
+    """
+    Inicia varios streams a la vez. Cada uno arranca `stagger` segundos después del
+    anterior (para no abrir todas las conexiones RTSP en el mismo instante), pero sin
+    esperar a que el anterior termine su verificación de arranque.
+    Retorna el resultado de cada uno, en el mismo orden.
+    """
+    async def launch_one(index: int, config: StreamConfig) -> dict:
+        if stagger:
+            await asyncio.sleep(index * stagger)
+        try:
+            response = await launch_stream(config)
+        except HTTPException as e:
+            return {"stream_name": config.stream_name, "status": "error", "detail": e.detail}
+        return response.model_dump()
+
+    return list(await asyncio.gather(*(launch_one(index, config) for index, config in enumerate(configs))))
+
+
+async def restore_streams():
+    """Vuelve a iniciar todos los streams del registro (arranque en caliente)"""
+    started_at = time.monotonic()
+    configs = []
+    for stream_name, config in stream_registry.load().items():
+        try:
+            configs.append(StreamConfig(**config))
+        except ValueError as e:
+            logger.error(f"Configuración inválida en el registro para '{stream_name}': {str(e)}")
+
+    logger.info(f"Restaurando {len(configs)} stream(s) desde el registro...")
+    results = await launch_many(configs, WARM_RESTART_STAGGER_SECONDS)
+    failed = [result for result in results if result["status"] == "error"]
+    for result in failed:
+        # Se queda en el registro: se reintenta en el próximo arranque o con /stream/start
+        logger.error(f"No se pudo restaurar '{result['stream_name']}': {result['detail']}")
+    logger.info(f"Registro restaurado: {len(results) - len(failed)}/{len(results)} stream(s) "
+                f"en {time.monotonic() - started_at:.1f}s")
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Iniciar el monitoreo de streams al arrancar la aplicación"""
-    global monitor_task
-    monitor_task = asyncio.create_task(monitor_streams())
-    logger.info("Monitor de streams iniciado")
+    """Iniciar la retención de grabaciones y restaurar los streams del registro"""
+    global retention_task, restore_task
+    retention_task = asyncio.create_task(enforce_retention())
+    logger.info("Retención de grabaciones iniciada")
+    if stream_registry is not None and len(stream_registry):
+        # En segundo plano: el servicio responde mientras los streams se van levantando
+        restore_task = asyncio.create_task(restore_streams())
 
 
 @app.get("/")
@@ -105,18 +268,79 @@ async def root():
 @app.get("/streams")
 async def list_streams():
     """Listar todos los streams activos"""
-    streams = []
-    for stream_name, process in active_streams.items():
-        is_running = process.poll() is None
-        streams.append({
-            "stream_name": stream_name,
-            "status": "running" if is_running else "stopped",
-            "pid": process.pid if is_running else None
-        })
+    streams = [describe_stream(stream_name, stream) for stream_name, stream in active_streams.items()]
     
     return {
         "total": len(streams),
-        "streams": streams
+        "streams": streams,
+        "healthy": sum(1 for stream in streams if stream["health"] >= 50),
+        "restart_limiter": restart_limiter.stats(),
+        "registered": len(stream_registry) if stream_registry is not None else None,
+        "restoring": restore_task is not None and not restore_task.done()
+    }
+
+
+@app.get("/stream/{stream_name}")
+async def get_stream(stream_name: str, log_lines: int = 20):
+    """
+    Estado de un stream: salud, reinicios, métricas de ffmpeg (fps, bitrate, frames
+    perdidos, velocidad) y los últimos mensajes de su log
+    
+    Args:
+        stream_name: Nombre del stream
+        log_lines: Cantidad de líneas recientes del log a incluir
+    """
+    if stream_name not in active_streams:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Stream '{stream_name}' no existe o no está activo"
+        )
+    
+    stream = active_streams[stream_name]
+    return {
+        **describe_stream(stream_name, stream),
+        "log": list(stream.process.stderr)[-log_lines:] if log_lines > 0 else []
+    }
+
+
+@app.get("/stream/{stream_name}/ready")
+async def stream_ready(stream_name: str, timeout: float = 0):
+    """
+    Indica si el stream ya está publicado en MediaMTX (ffmpeg reporta progreso).
+    Con `timeout` > 0 espera hasta ese tiempo (long-poll) a que lo esté, para que
+    otros servicios (p. ej. analítica) empiecen a consumir el relay apenas exista.
+    
+    Args:
+        stream_name: Nombre del stream
+        timeout: Segundos máximos de espera (máximo 30)
+    """
+    if stream_name not in active_streams:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Stream '{stream_name}' no existe o no está activo"
+        )
+    
+    stream = active_streams[stream_name]
+    
+    def is_ready() -> bool:
+        age = stream.process.metrics()["last_progress_age_s"]
+        return stream.running and age is not None and age < STALL_TIMEOUT_SECONDS
+    
+    deadline = asyncio.get_running_loop().time() + min(max(timeout, 0), 30)
+    while not is_ready():
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0 or active_streams.get(stream_name) is not stream:
+            break
+        # Despierta con la próxima línea de progreso (o al reiniciarse el proceso)
+        try:
+            await asyncio.wait_for(stream.process.progress_event.wait(), timeout=min(remaining, 1.0))
+        except asyncio.TimeoutError:
+            pass
+    
+    return {
+        "stream_name": stream_name,
+        "ready": is_ready(),
+        "mediamtx_url": f"rtsp://localhost:8554/{stream_name}"
     }
 
 
@@ -131,19 +355,28 @@ async def start_stream(config: StreamConfig):
     Returns:
         Información del stream iniciado
     """
+    response = await launch_stream(config)
+    if stream_registry is not None:
+        stream_registry.save(config.stream_name, config.model_dump())
+    return response
+
+
+async def launch_stream(config: StreamConfig) -> StreamResponse:
+    """Crear el proceso ffmpeg de un stream y empezar a supervisarlo"""
     stream_name = config.stream_name
     
-    # Verificar si el stream ya existe
+    # Verificar si el stream ya existe (o se está iniciando en otra petición)
+    if stream_name in starting_streams:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Stream '{stream_name}' ya se está iniciando"
+        )
     if stream_name in active_streams:
-        process = active_streams[stream_name]
-        if process.poll() is None:  # El proceso sigue corriendo
-            raise HTTPException(
-                status_code=400,
-                detail=f"Stream '{stream_name}' ya está activo"
-            )
-        else:
-            # El proceso murió, removerlo
-            del active_streams[stream_name]
+        # Aunque esté reiniciándose, el supervisor ya se encarga de este stream
+        raise HTTPException(
+            status_code=400,
+            detail=f"Stream '{stream_name}' ya está activo"
+        )
     
     # Construir la URL RTSP de entrada
     rtsp_input = config.rtsp_url
@@ -156,61 +389,89 @@ async def start_stream(config: StreamConfig):
     # URL de salida hacia MediaMTX
     mediamtx_url = f"rtsp://localhost:8554/{stream_name}"
     
+    record = RECORDING_ENABLED if config.record is None else config.record
+
     # Construir comando ffmpeg con opciones mejoradas para estabilidad
-    ffmpeg_command = [
-        "ffmpeg",
-        "-rtsp_transport", "tcp",  # Usar TCP para la entrada
-        "-i", rtsp_input,
-        "-c", "copy",  # Copiar sin recodificar
-        "-f", "rtsp",
-        "-rtsp_transport", "tcp",  # Usar TCP para la salida
-        "-rtsp_flags", "prefer_tcp",
-        mediamtx_url
-    ]
+    if record:
+        # Un solo proceso y una sola lectura de la cámara: el muxer tee copia los mismos
+        # paquetes a MediaMTX y a los segmentos en disco (sin decodificar ni recodificar)
+        ffmpeg_command = [
+            "ffmpeg",
+            "-hide_banner", "-loglevel", "warning",
+            *PROGRESS_ARGS,  # El progreso va aparte por stderr (métricas, supervisor, /ready)
+            "-rtsp_transport", "tcp",  # Usar TCP para la entrada
+            "-i", rtsp_input,
+            "-map", "0:v:0",
+            "-map", "0:a?",
+            "-c", "copy",  # Copiar sin recodificar
+            "-f", "tee",
+            f"[f=rtsp:rtsp_transport=tcp]{mediamtx_url}|"
+            f"{segment_output(RECORDINGS_DIR, stream_name, RECORDING_SEGMENT_SECONDS)}"
+        ]
+    else:
+        ffmpeg_command = [
+            "ffmpeg",
+            "-hide_banner", "-loglevel", "warning",
+            *PROGRESS_ARGS,  # El progreso va aparte por stderr (métricas, supervisor, /ready)
+            "-rtsp_transport", "tcp",  # Usar TCP para la entrada
+            "-i", rtsp_input,
+            "-c", "copy",  # Copiar sin recodificar
+            "-f", "rtsp",
+            "-rtsp_transport", "tcp",  # Usar TCP para la salida
+            "-rtsp_flags", "prefer_tcp",
+            mediamtx_url
+        ]
     
+    stream = SupervisedStream(
+        stream_name,
+        ffmpeg_command,
+        restart_limiter,
+        backoff_base=RESTART_BACKOFF_BASE_SECONDS,
+        backoff_max=RESTART_BACKOFF_MAX_SECONDS,
+        stall_timeout=STALL_TIMEOUT_SECONDS,
+        max_consecutive_failures=RESTART_MAX_CONSECUTIVE,
+        on_give_up=remove_failed_stream
+    )
+    process = stream.new_process()
+    starting_streams.add(stream_name)
     try:
-        # Iniciar el proceso ffmpeg
-        process = subprocess.Popen(
-            ffmpeg_command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE
-        )
-        
-        # Esperar un momento para verificar que el proceso no falle inmediatamente
-        await asyncio.sleep(1)
+        # Iniciar el proceso ffmpeg y esperar un momento (sin bloquear el event loop)
+        # para verificar que no falle inmediatamente. Un error aquí se informa al
+        # cliente; los fallos posteriores los reintenta el supervisor.
+        await process.start(startup_check=1.0)
         
-        if process.poll() is not None:
-            # El proceso terminó inmediatamente, algo salió mal
-            stderr = process.stderr.read().decode('utf-8', errors='ignore')
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error al iniciar el stream: {stderr[:500]}"
-            )
-        
-        # Guardar el proceso
-        active_streams[stream_name] = process
+        # Guardar el stream y empezar a supervisarlo
+        active_streams[stream_name] = stream
+        if record:
+            recording_streams.add(stream_name)
+        stream.supervise(process)
+        STREAM_STARTS.labels("started").inc()
         
         logger.info(f"Stream '{stream_name}' iniciado exitosamente (PID: {process.pid})")
         
         return StreamResponse(
             stream_name=stream_name,
             status="started",
-            message="Stream iniciado exitosamente",
+            message="Stream iniciado exitosamente" + (" (grabando)" if record else ""),
             mediamtx_url=mediamtx_url
         )
         
     except FileNotFoundError:
+        STREAM_STARTS.labels("failed").inc()
         raise HTTPException(
             status_code=500,
             detail="FFmpeg no está instalado o no se encuentra en el PATH del sistema"
         )
     except Exception as e:
+        # RuntimeError: el proceso terminó inmediatamente, algo salió mal
+        STREAM_STARTS.labels("failed").inc()
         logger.error(f"Error al iniciar stream '{stream_name}': {str(e)}")
         raise HTTPException(
             status_code=500,
-            detail=f"Error al iniciar el stream: {str(e)}"
+            detail=f"Error al iniciar el stream: {str(e)[:500]}"
         )
+    finally:
+        starting_streams.discard(stream_name)
 
 
 @app.post("/stream/stop/{stream_name}", response_model=StreamResponse)
@@ -224,28 +485,25 @@ async def stop_stream(stream_name: str):
     Returns:
         Información del stream detenido
     """
+    # Detener explícitamente es la única forma de sacar un stream del registro
+    # (al apagar el servicio o al agotar los reintentos se conserva)
+    if stream_registry is not None:
+        stream_registry.remove(stream_name)
+
     if stream_name not in active_streams:
         raise HTTPException(
             status_code=404,
             detail=f"Stream '{stream_name}' no existe o no está activo"
         )
     
-    process = active_streams[stream_name]
+    # Remover del diccionario antes de esperar: el nombre queda libre de inmediato
+    stream = active_streams.pop(stream_name)
+    recording_streams.discard(stream_name)
     
     try:
-        # Intentar terminar el proceso de forma limpia
-        process.terminate()
-        
-        # Esperar hasta 5 segundos para que termine
-        try:
-            process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            # Si no termina, forzar la terminación
-            process.kill()
-            process.wait()
-        
-        # Remover del diccionario
-        del active_streams[stream_name]
+        # Detener el supervisor (sin reinicios) y terminar el proceso de forma limpia
+        # (o forzarlo tras STOP_TIMEOUT_SECONDS) sin bloquear el event loop mientras tanto
+        await stream.stop(timeout=STOP_TIMEOUT_SECONDS)
         
         logger.info(f"Stream '{stream_name}' detenido exitosamente")
         
@@ -277,35 +535,211 @@ async def delete_stream(stream_name: str):
     return await stop_stream(stream_name)
 
 
+@app.post("/streams/start")
+async def start_streams(request: BulkStartRequest):
+    """
+    Iniciar varios streams en una sola petición (a la vez, escalonados).
+    No falla si alguno no se puede iniciar: retorna el resultado de cada uno.
+    """
+    results = await launch_many(request.streams, WARM_RESTART_STAGGER_SECONDS)
+    for config, result in zip(request.streams, results):
+        if result["status"] == "started" and stream_registry is not None:
+            stream_registry.save(config.stream_name, config.model_dump())
+    started = sum(1 for result in results if result["status"] == "started")
+    logger.info(f"Inicio masivo: {started}/{len(results)} stream(s) iniciados")
+    return {"started": started, "results": results}
+
+
+@app.post("/streams/stop")
+async def stop_streams(request: BulkStopRequest):
+    """Detener varios streams a la vez (o todos, si no se indica `stream_names`)"""
+    names = request.stream_names if request.stream_names is not None else list(active_streams)
+
+    async def stop_one(stream_name: str) -> dict:
+        try:
+            return (await stop_stream(stream_name)).model_dump()
+        except HTTPException as e:
+            state = "not_found" if e.status_code == 404 else "error"
+            return {"stream_name": stream_name, "status": state, "detail": e.detail}
+
+    results = list(await asyncio.gather(*(stop_one(name) for name in names)))
+    stopped = sum(1 for result in results if result["status"] == "stopped")
+    return {"stopped": stopped, "results": results}
+
+
+@app.get("/recordings")
+async def list_recordings():
+    """Streams con grabaciones en disco y el rango de tiempo disponible de cada uno"""
+    def summarize():
+        result = []
+        for stream_name in recording_index.streams():
+            segments = recording_index.segments(stream_name)
+            if not segments:
+                continue
+            result.append({
+                "stream_name": stream_name,
+                "recording": stream_name in recording_streams,
+                "segments": len(segments),
+                "size_bytes": sum(s.size for s in segments),
+                "start": datetime.fromtimestamp(segments[0].start).isoformat(),
+                "end": datetime.fromtimestamp(segments[-1].end).isoformat()
+            })
+        return result
+
+    recordings = await asyncio.to_thread(summarize)
+    return {"total": len(recordings), "recordings": recordings}
+
+
+@app.get("/recordings/{stream_name}")
+async def list_segments(stream_name: str = Path(..., pattern=STREAM_NAME_PATTERN), start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Segmentos grabados de un stream, opcionalmente filtrados por rango de tiempo
+    
+    Args:
+        stream_name: Nombre del stream
+        start: Inicio del rango (ISO 8601, opcional)
+        end: Fin del rango (ISO 8601, opcional)
+    """
+    segments = await asyncio.to_thread(
+        recording_index.segments,
+        stream_name,
+        start.timestamp() if start else None,
+        end.timestamp() if end else None
+    )
+    return {
+        "stream_name": stream_name,
+        "total": len(segments),
+        "segments": [
+            {
+                "file": os.path.basename(s.path),
+                "start": datetime.fromtimestamp(s.start).isoformat(),
+                "end": datetime.fromtimestamp(s.end).isoformat(),
+                "size_bytes": s.size
+            }
+            for s in segments
+        ]
+    }
+
+
+@app.post("/recordings/{stream_name}/clip")
+async def create_clip(request: ClipRequest, stream_name: str = Path(..., pattern=STREAM_NAME_PATTERN)):
+    """
+    Genera un clip mp4 de un rango de tiempo concatenando los segmentos grabados,
+    sin recodificar (el inicio se alinea al keyframe anterior)
+    
+    Args:
+        stream_name: Nombre del stream
+        request: Inicio y fin del clip
+    
+    Returns:
+        Nombre y URL de descarga del clip
+    """
+    start, end = request.start.timestamp(), request.end.timestamp()
+    if end <= start:
+        raise HTTPException(status_code=400, detail="El fin del clip debe ser posterior al inicio")
+    if end - start > RECORDING_MAX_CLIP_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El clip no puede durar más de {RECORDING_MAX_CLIP_SECONDS:.0f} segundos"
+        )
+
+    segments = await asyncio.to_thread(recording_index.segments, stream_name, start, end)
+    if not segments:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No hay grabaciones de '{stream_name}' en ese rango de tiempo"
+        )
+
+    os.makedirs(CLIPS_DIR, exist_ok=True)
+    filename = f"{stream_name}_{request.start.strftime('%Y%m%d-%H%M%S')}_{int(end - start)}s.mp4"
+    try:
+        await stitch_clip(segments, start, end, os.path.join(CLIPS_DIR, filename))
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=500,
+            detail="FFmpeg no está instalado o no se encuentra en el PATH del sistema"
+        )
+    except Exception as e:
+        logger.error(f"Error al generar clip de '{stream_name}': {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al generar el clip: {str(e)}")
+
+    return {
+        "stream_name": stream_name,
+        "clip": filename,
+        "url": f"/recordings/clips/{filename}",
+        "segments": len(segments)
+    }
+
+
+@app.get("/recordings/clips/{filename}")
+async def download_clip(filename: str):
+    """Descargar un clip generado"""
+    path = os.path.join(CLIPS_DIR, os.path.basename(filename))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Clip '{filename}' no existe")
+    return FileResponse(path, media_type="video/mp4", filename=os.path.basename(path))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(render(REGISTRY.collect()), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/debug/profiler/start")
+async def start_profiler(interval_ms: float = Query(10.0, ge=1, le=1000), duration_s: float = Query(0, ge=0)):
+    """Activar el perfilador por muestreo (con duration_s > 0 se apaga solo)"""
+    return profiler.start(interval_ms / 1000, duration_s or None)
+
+
+@app.post("/debug/profiler/stop")
+async def stop_profiler():
+    """Detener el perfilador por muestreo"""
+    return await asyncio.to_thread(profiler.stop)
+
+
+@app.get("/debug/profiler")
+async def profiler_results(output: str = Query("top", pattern="^(top|collapsed)$"), limit: int = Query(25, ge=1),
+                           thread: Optional[str] = None):
+    """Funciones con más muestras ("top") o pilas colapsadas para flamegraph ("collapsed")"""
+    if output == "collapsed":
+        return PlainTextResponse(profiler.collapsed(thread=thread) + "\n")
+    return {**profiler.status(), "top": profiler.top(limit, thread)}
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Limpiar todos los streams al apagar el servicio"""
-    global monitor_task
-    
-    # Cancelar la tarea de monitoreo
-    if monitor_task:
-        monitor_task.cancel()
+    """Limpiar todos los streams al apagar el servicio (el registro se conserva)"""
+    if restore_task:
+        restore_task.cancel()
+
+    # Cancelar la tarea de retención
+    if retention_task:
+        retention_task.cancel()
         try:
-            await monitor_task
+            await retention_task
         except asyncio.CancelledError:
             pass
     
     logger.info("Deteniendo todos los streams activos...")
     
-    for stream_name, process in list(active_streams.items()):
-        try:
-            process.terminate()
-            process.wait(timeout=3)
-        except Exception as e:
-            logger.error(f"Error al detener stream '{stream_name}': {str(e)}")
-            try:
-                process.kill()
-            except:
-                pass
-    
+    # Todos los streams se detienen a la vez: el apagado tarda lo que el más lento
+    streams = list(active_streams.values())
     active_streams.clear()
+    results = await asyncio.gather(
+        *(stream.stop(timeout=3) for stream in streams),
+        return_exceptions=True
+    )
+    for stream, result in zip(streams, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error al detener stream '{stream.name}': {str(result)}")
+    
+    recording_streams.clear()
     logger.info("Todos los streams han sido detenidos")
 
+    if stream_registry is not None:
+        stream_registry.close()
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,128 @@
+import math
+import threading
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Metric:
+    """
+    Métrica con etiquetas al estilo Prometheus.
+
+    `labels()` cachea el hijo de cada combinación de etiquetas y las actualizaciones son
+    una suma sobre un atributo, sin locks: en este servicio las métricas se actualizan
+    desde el event loop, así que no hay carreras.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _series(self):
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), child) for key, child in self._children.items()]
+
+    def samples(self) -> list:
+        return [(self.name, labels, child.value) for labels, child in self._series()]
+
+    def family(self) -> dict:
+        return {"name": self.name, "type": self.type, "help": self.documentation, "samples": self.samples()}
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Registry:
+    """
+    Conjunto de métricas del servicio. Los "collectors" son funciones que construyen
+    familias al momento de consultar /metrics (para valores que ya existen en otros
+    objetos, como el progreso de cada ffmpeg o los contadores del supervisor).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric: Metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self) -> list:
+        """Familias como estructuras simples, listas para `render()`."""
+        families = [metric.family() for metric in self._metrics]
+        for collector in self._collectors:
+            families.extend(collector())
+        return families
+
+
+def family(name: str, metric_type: str, documentation: str, samples: list) -> dict:
+    """Familia construida a mano por un collector: samples = [(labels, valor)]."""
+    return {"name": name, "type": metric_type, "help": documentation,
+            "samples": [(name, labels, value) for labels, value in samples]}
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(families: list) -> str:
+    """Formato de exposición de texto de Prometheus (versión 0.0.4)."""
+    lines = []
+    for item in families:
+        lines.append(f"# HELP {item['name']} {_escape(item['help'])}")
+        lines.append(f"# TYPE {item['name']} {item['type']}")
+        for name, labels, value in item["samples"]:
+            if value is None:
+                continue
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
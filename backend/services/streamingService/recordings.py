@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Nombre de cada segmento: {stream}_{YYYYmmdd-HHMMSS}.ts (lo genera ffmpeg con strftime)
+SEGMENT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+SEGMENT_PATTERN = re.compile(r"^(?P<stream>.+)_(?P<start>\d{8}-\d{6})\.ts$")
+
+# Los nombres de stream se usan como carpeta y como parte de la ruta de salida de ffmpeg:
+# sin separadores ni "..", no pueden salir de recordings_dir
+STREAM_NAME_PATTERN = r"^[A-Za-z0-9_-]+$"
+
+
+class Segment(NamedTuple):
+    path: str
+    start: float  # Epoch en segundos
+    end: float
+    size: int
+
+
+def segment_output(recordings_dir: str, stream_name: str, segment_seconds: int) -> str:
+    """
+    Salida del muxer `tee` de ffmpeg que escribe segmentos MPEG-TS de `segment_seconds`
+    (cortados en keyframes) en recordings_dir/{stream_name}/.
+    MPEG-TS sobrevive a cortes bruscos y se concatena sin re-multiplexar.
+    """
+    directory = stream_dir(recordings_dir, stream_name)
+    os.makedirs(directory, exist_ok=True)
+    pattern = os.path.join(directory, f"{stream_name}_%Y%m%d-%H%M%S.ts")
+    # En las opciones de tee los ':' separan opciones: se escapan los de la ruta
+    pattern = pattern.replace("\\", "/").replace(":", "\\:")
+    return (f"[f=segment:segment_time={segment_seconds}:segment_format=mpegts:"
+            f"strftime=1:reset_timestamps=1]{pattern}")
+
+
+def stream_dir(recordings_dir: str, stream_name: str) -> str:
+    """Carpeta de grabaciones de un stream. Lanza ValueError si el nombre no es válido."""
+    if not re.fullmatch(STREAM_NAME_PATTERN, stream_name):
+        raise ValueError(f"Nombre de stream inválido: '{stream_name}'")
+    return os.path.join(recordings_dir, stream_name)
+
+
+class RecordingIndex:
+    """
+    Índice de los segmentos grabados por stream, reconstruido desde el disco.
+
+    El inicio de cada segmento sale del nombre del archivo y el fin de su última
+    modificación (acotado por el inicio del siguiente).
+    """
+
+    def __init__(self, recordings_dir: str):
+        self.recordings_dir = recordings_dir
+
+    def streams(self) -> List[str]:
+        if not os.path.isdir(self.recordings_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.recordings_dir)
+            if os.path.isdir(os.path.join(self.recordings_dir, name)) and name != "clips"
+            and re.fullmatch(STREAM_NAME_PATTERN, name)
+        )
+
+    def segments(self, stream_name: str, start: Optional[float] = None,
+                 end: Optional[float] = None) -> List[Segment]:
+        """Segmentos de un stream ordenados por tiempo, opcionalmente solo los que tocan [start, end]."""
+        directory = stream_dir(self.recordings_dir, stream_name)
+        if not os.path.isdir(directory):
+            return []
+
+        entries = []
+        for filename in os.listdir(directory):
+            match = SEGMENT_PATTERN.match(filename)
+            if match is None or match.group("stream") != stream_name:
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # La retención lo borró mientras listábamos
+            seg_start = datetime.strptime(match.group("start"), SEGMENT_TIME_FORMAT).timestamp()
+            entries.append((seg_start, path, stat))
+        entries.sort()
+
+        segments = []
+        for i, (seg_start, path, stat) in enumerate(entries):
+            # La última escritura marca el fin (así un hueco por stream caído no estira el segmento)
+            seg_end = max(seg_start, stat.st_mtime)
+            if i + 1 < len(entries):
+                seg_end = min(seg_end, entries[i + 1][0])
+            segments.append(Segment(path, seg_start, seg_end, stat.st_size))
+
+        if start is not None:
+            segments = [s for s in segments if s.end > start]
+        if end is not None:
+            segments = [s for s in segments if s.start < end]
+        return segments
+
+    def apply_retention(self, max_age_seconds: float, max_total_bytes: Optional[int] = None) -> int:
+        """
+        Borra los segmentos más viejos que `max_age_seconds` y, si se supera
+        `max_total_bytes` entre todos los streams, los más antiguos hasta entrar en el límite.
+        Nunca borra el último segmento de un stream (puede estar escribiéndose).
+        Retorna la cantidad de segmentos eliminados.
+        """
+        now = time.time()
+        candidates = []
+        total_bytes = 0
+        for stream_name in self.streams():
+            segments = self.segments(stream_name)
+            total_bytes += sum(s.size for s in segments)
+            candidates.extend(segments[:-1])
+        candidates.sort(key=lambda s: s.start)
+
+        removed = 0
+        for segment in candidates:
+            too_old = now - segment.end > max_age_seconds
+            over_quota = max_total_bytes is not None and total_bytes > max_total_bytes
+            if not (too_old or over_quota):
+                break  # Ordenados por antigüedad: los siguientes tampoco se borran
+            try:
+                os.remove(segment.path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= segment.size
+            removed += 1
+        return removed
+
+
+async def stitch_clip(segments: List[Segment], start: float, end: float, output_path: str) -> str:
+    """
+    Arma un clip mp4 de [start, end] concatenando segmentos con el demuxer `concat`
+    de ffmpeg y `-c copy` (sin decodificar ni recodificar). El corte se alinea al
+    keyframe anterior a `start`.
+    """
+    if not segments:
+        raise ValueError("No hay segmentos grabados en ese rango de tiempo")
+
+    offset = max(0.0, start - segments[0].start)
+    duration = end - max(start, segments[0].start)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+        for segment in segments:
+            # Dentro de '...' el demuxer concat solo admite escapar la comilla como '\''
+            escaped = os.path.abspath(segment.path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+
+    command = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0",
+        "-ss", f"{offset:.3f}",
+        "-i", list_file.name,
+        "-t", f"{duration:.3f}",
+        "-c", "copy",
+        "-movflags", "+faststart",
+        output_path
+    ]
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+    finally:
+        os.remove(list_file.name)
+
+    if process.returncode != 0:
+        raise RuntimeError(stderr.decode("utf-8", errors="ignore")[-500:])
+
+    logger.info(f"Clip generado: {output_path} ({len(segments)} segmento(s))")
+    return output_path
@@ -0,0 +1,65 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class StreamRegistry:
+    """
+    Registro persistente (SQLite) de los streams iniciados en el servicio.
+
+    Guarda el `StreamConfig` con el que se inició cada stream (por `stream_name`) para
+    volver a levantarlos todos al reiniciar el servicio, sin esperar a que el core los
+    vuelva a pedir uno por uno. Solo se borra una entrada con /stream/stop (no al apagar
+    el servicio ni al agotar los reintentos). Las escrituras son pequeñas y
+    transaccionales: un corte a mitad de escritura no corrompe el registro.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS streams ("
+            " stream_name TEXT PRIMARY KEY,"
+            " config TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        try:
+            # El StreamConfig incluye el usuario y la contraseña RTSP de la cámara
+            os.chmod(path, 0o600)
+        except OSError:
+            pass
+
+    def save(self, stream_name: str, config: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO streams (stream_name, config, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(stream_name) DO UPDATE SET config = excluded.config, updated_at = excluded.updated_at",
+                (stream_name, json.dumps(config), time.time())
+            )
+
+    def remove(self, stream_name: str) -> bool:
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM streams WHERE stream_name = ?", (stream_name,))
+        return cursor.rowcount > 0
+
+    def load(self) -> dict:
+        """{ stream_name: configuración } en el orden en que se iniciaron (o actualizaron)."""
+        with self._lock:
+            rows = self._db.execute("SELECT stream_name, config FROM streams ORDER BY updated_at").fetchall()
+        return {stream_name: json.loads(config) for stream_name, config in rows}
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM streams").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
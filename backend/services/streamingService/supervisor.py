@@ -0,0 +1,256 @@
+import asyncio
+import collections
+import logging
+import random
+import time
+from typing import Callable, List, Optional
+
+from ffmpeg_process import FfmpegProcess
+
+logger = logging.getLogger(__name__)
+
+
+class RestartRateLimiter:
+    """
+    Token bucket para todo el nodo: limita cuántos ffmpeg se pueden relanzar por
+    segundo. Un corte de red que tumba cientos de cámaras a la vez no dispara
+    cientos de procesos en el mismo instante; los reinicios se escalonan.
+    """
+
+    def __init__(self, rate: float = 2.0, burst: int = 10):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waiting = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            # El lock hace que los reinicios salgan en orden de llegada
+            async with self._lock:
+                self._refill()
+                while self._tokens < 1:
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+                    self._refill()
+                self._tokens -= 1
+        finally:
+            self.waiting -= 1
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "rate_per_s": self.rate,
+            "burst": self.burst,
+            "tokens": round(self._tokens, 2),
+            "waiting": self.waiting,
+        }
+
+
+class SupervisedStream:
+    """
+    Mantiene vivo el ffmpeg de un stream.
+
+    La detección de fallos es por eventos: se espera a la vez la salida del proceso y
+    la siguiente línea de progreso; si el proceso termina, o no reporta progreso en
+    `stall_timeout` segundos (cámara colgada), se reinicia con backoff exponencial
+    con jitter, pasando por el `RestartRateLimiter` del nodo.
+    """
+
+    def __init__(self, name: str, command: List[str], limiter: RestartRateLimiter,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, stall_timeout: float = 20.0,
+                 stable_after: float = 60.0, max_consecutive_failures: int = 0,
+                 on_give_up: Optional[Callable[["SupervisedStream"], None]] = None):
+        self.name = name
+        self.command = command
+        self.limiter = limiter
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stall_timeout = stall_timeout
+        self.stable_after = stable_after  # Segundos corriendo para considerar que se recuperó
+        self.max_consecutive_failures = max_consecutive_failures  # 0 = reintentar siempre
+        self.on_give_up = on_give_up
+
+        self.process: Optional[FfmpegProcess] = None
+        self.state = "starting"
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Contadores
+        self.restarts = 0
+        self.stalls = 0
+        self.consecutive_failures = 0
+        self.last_exit_code: Optional[int] = None
+        self.last_failure: Optional[str] = None
+        self.next_restart_in: Optional[float] = None
+        self._recent_failures = collections.deque(maxlen=50)  # Horas (monotonic) de los fallos
+
+    def new_process(self) -> FfmpegProcess:
+        return FfmpegProcess(self.name, self.command)
+
+    def supervise(self, process: FfmpegProcess):
+        """Empieza a supervisar un proceso ya iniciado."""
+        self.process = process
+        self.state = "running"
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while not self._stopping:
+                reason = await self._watch(self.process)
+                if self._stopping:
+                    break
+                self._record_failure(reason)
+                if self._give_up_if_exhausted() or not await self._restart():
+                    return
+        except asyncio.CancelledError:
+            pass
+
+    def _give_up_if_exhausted(self) -> bool:
+        """Si se llegó a `max_consecutive_failures`, deja el stream en "failed" y retorna True."""
+        if not self.max_consecutive_failures or self.consecutive_failures < self.max_consecutive_failures:
+            return False
+        self.state = "failed"
+        logger.error(f"Stream '{self.name}' falló {self.consecutive_failures} veces seguidas; "
+                     f"se deja de reintentar")
+        if self.on_give_up is not None:
+            self.on_give_up(self)
+        return True
+
+    async def _watch(self, process: FfmpegProcess) -> str:
+        """Espera hasta que el proceso termine o se quede sin progreso. Retorna el motivo."""
+        started = time.monotonic()
+        exit_task = asyncio.create_task(process.wait())
+        try:
+            while True:
+                progress_task = asyncio.create_task(process.progress_event.wait())
+                done, _ = await asyncio.wait(
+                    {exit_task, progress_task},
+                    timeout=self.stall_timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                progress_task.cancel()
+
+                if exit_task in done:
+                    self.last_exit_code = process.returncode
+                    reason = f"ffmpeg terminó (código {process.returncode})"
+                    break
+                if not done:
+                    self.stalls += 1
+                    reason = f"sin progreso durante {self.stall_timeout:.0f} s"
+                    await process.stop(timeout=3)
+                    self.last_exit_code = process.returncode
+                    break
+
+                process.progress_event.clear()
+                # Un proceso que lleva un rato estable "perdona" los fallos anteriores
+                if self.consecutive_failures and time.monotonic() - started >= self.stable_after:
+                    self.consecutive_failures = 0
+        finally:
+            exit_task.cancel()
+
+        tail = process.stderr_tail(3)
+        return f"{reason}: {tail[-300:]}" if tail else reason
+
+    def _record_failure(self, reason: str):
+        self.consecutive_failures += 1
+        self.last_failure = reason
+        self._recent_failures.append(time.monotonic())
+        logger.warning(f"Stream '{self.name}' falló ({reason}); fallos seguidos: {self.consecutive_failures}")
+
+    async def _restart(self) -> bool:
+        """Relanza ffmpeg hasta que arranque. Retorna False si se detuvo o se dejó de reintentar."""
+        while not self._stopping:
+            # Backoff exponencial con jitter para que las cámaras no se reintenten sincronizadas
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (self.consecutive_failures - 1))
+            delay *= random.uniform(0.5, 1.0)
+            self.state = "backoff"
+            self.next_restart_in = delay
+            await asyncio.sleep(delay)
+            self.next_restart_in = None
+
+            self.state = "waiting"
+            await self.limiter.acquire()
+            if self._stopping:
+                return False
+
+            self.state = "starting"
+            process = self.new_process()
+            self.restarts += 1
+            try:
+                await process.start(startup_check=1.0)
+            except asyncio.CancelledError:
+                # stop() llegó durante el arranque: este proceso aún no es self.process y
+                # nadie más lo detendría (quedaría publicando huérfano)
+                await process.stop(timeout=3)
+                raise
+            except Exception as e:
+                self._record_failure(f"no se pudo reiniciar: {str(e)[:300]}")
+                # Una cámara inalcanzable suele fallar ya en el arranque: también cuenta para el límite
+                if self._give_up_if_exhausted():
+                    return False
+                continue
+
+            self.process = process
+            self.state = "running"
+            logger.info(f"Stream '{self.name}' reiniciado (PID: {process.pid}, reinicio #{self.restarts})")
+            return True
+        return False
+
+    async def stop(self, timeout: float = 5.0):
+        """Detiene la supervisión y el proceso actual."""
+        self._stopping = True
+        self.state = "stopped"
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.process is not None:
+            await self.process.stop(timeout=timeout)
+
+    @property
+    def running(self) -> bool:
+        return self.state == "running" and self.process is not None and self.process.running
+
+    def health(self) -> int:
+        """
+        Puntaje de salud de 0 a 100: 0 si no está corriendo; se descuenta por reinicios
+        recientes, velocidad por debajo de tiempo real, frames perdidos y progreso atrasado.
+        """
+        if not self.running:
+            return 0
+        now = time.monotonic()
+        score = 100.0
+
+        recent = sum(1 for t in self._recent_failures if now - t < 600)
+        score -= min(40.0, recent * 10.0)
+
+        metrics = self.process.metrics()
+        if metrics["speed"] is not None and metrics["speed"] < 1.0:
+            score -= min(30.0, (1.0 - metrics["speed"]) * 100)
+        if metrics["frames"] and metrics["dropped_frames"]:
+            score -= min(20.0, metrics["dropped_frames"] / metrics["frames"] * 200)
+        if metrics["last_progress_age_s"] is None or metrics["last_progress_age_s"] > self.stall_timeout / 2:
+            score -= 10.0
+
+        return max(0, int(round(score)))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "health": self.health(),
+            "restarts": self.restarts,
+            "stalls": self.stalls,
+            "consecutive_failures": self.consecutive_failures,
+            "last_exit_code": self.last_exit_code,
+            "last_failure": self.last_failure,
+            "next_restart_in_s": round(self.next_restart_in, 1) if self.next_restart_in is not None else None,
+        }
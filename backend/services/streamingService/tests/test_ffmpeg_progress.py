@@ -0,0 +1,87 @@
+import asyncio
+import sys
+
+from ffmpeg_process import PROGRESS_ARGS, FfmpegProcess
+
+# stderr de "ffmpeg -hide_banner -loglevel warning -nostats -progress pipe:2 ... -c copy -f rtsp ..."
+# (ffmpeg 6): los avisos se intercalan con los bloques de progreso, que no dependen de -loglevel
+FFMPEG_STDERR = (
+    "frame=0\n"
+    "fps=0.00\n"
+    "stream_0_0_q=-1.0\n"
+    "bitrate=N/A\n"
+    "total_size=N/A\n"
+    "out_time_us=-9223372036854775807\n"
+    "out_time_ms=-9223372036854775807\n"
+    "out_time=-2562047788:00:54.775807\n"
+    "dup_frames=0\n"
+    "drop_frames=0\n"
+    "speed=N/A\n"
+    "progress=continue\n"
+    "[rtsp @ 0x55d5c5a3e6c0] max delay reached. need to consume packet\n"
+    "[rtsp @ 0x55d5c5a3e6c0] RTP: missed 3 packets\n"
+    "frame=251\n"
+    "fps=25.02\n"
+    "stream_0_0_q=-1.0\n"
+    "bitrate= 838.9kbits/s\n"
+    "total_size=1048620\n"
+    "out_time_us=10000000\n"
+    "out_time_ms=10000000\n"
+    "out_time=00:00:10.000000\n"
+    "dup_frames=0\n"
+    "drop_frames=2\n"
+    "speed=0.997x\n"
+    "progress=continue\n"
+)
+
+
+def run_fake_ffmpeg(output: str) -> FfmpegProcess:
+    """Pasa `output` por el stderr de un proceso real y lo lee como a ffmpeg."""
+    code = f"import sys, time; sys.stderr.write({output!r}); sys.stderr.flush(); time.sleep(30)"
+    process = FfmpegProcess("test", [sys.executable, "-c", code])
+
+    async def scenario():
+        await process.start(startup_check=1.0)
+        try:
+            await asyncio.wait_for(process.progress_event.wait(), timeout=5)
+            await asyncio.sleep(0.2)  # El resto de la salida ya está en el pipe
+        finally:
+            await process.stop()
+
+    asyncio.run(scenario())
+    return process
+
+
+def test_progress_args_bypass_loglevel():
+    assert PROGRESS_ARGS[PROGRESS_ARGS.index("-progress") + 1] == "pipe:2"
+
+
+def test_progress_blocks_become_metrics():
+    process = run_fake_ffmpeg(FFMPEG_STDERR)
+    metrics = process.metrics()
+    assert metrics["frames"] == 251
+    assert metrics["fps"] == 25.02
+    assert metrics["bitrate_kbps"] == 838.9
+    assert metrics["speed"] == 0.997
+    assert metrics["dropped_frames"] == 2
+    assert metrics["duplicated_frames"] == 0
+    assert metrics["output_kb"] == 1024.0
+    assert metrics["media_time_s"] == 10.0
+    assert metrics["last_progress_age_s"] is not None
+    # Solo los avisos quedan como log, no los campos de progreso
+    assert metrics["log_lines"] == 2
+    assert metrics["warnings"] == 0
+    assert process.stderr_tail(2).endswith("RTP: missed 3 packets")
+
+
+def test_incomplete_block_is_not_published():
+    process = run_fake_ffmpeg("frame=10\nfps=5.0\nprogress=continue\nframe=20\nfps=6.0\n")
+    assert process.metrics()["frames"] == 10
+
+
+def test_startup_block_has_no_media_time():
+    process = run_fake_ffmpeg(FFMPEG_STDERR.split("[rtsp")[0])
+    metrics = process.metrics()
+    assert metrics["frames"] == 0
+    assert metrics["media_time_s"] is None
+    assert metrics["output_kb"] is None
@@ -0,0 +1,43 @@
+import asyncio
+import os
+import stat
+import sys
+
+import pytest
+
+from recordings import RecordingIndex, Segment, segment_output, stitch_clip
+
+
+@pytest.mark.parametrize("name", ["../../x", "..", "a/b", "cam 1", "cam1\n", ""])
+def test_invalid_stream_names_are_rejected(tmp_path, name):
+    with pytest.raises(ValueError):
+        segment_output(str(tmp_path), name, 10)
+    with pytest.raises(ValueError):
+        RecordingIndex(str(tmp_path)).segments(name)
+    assert os.listdir(tmp_path) == []
+
+
+def test_valid_stream_name_stays_inside_recordings_dir(tmp_path):
+    output = segment_output(str(tmp_path), "camara_1-B", 10)
+    assert os.path.isdir(tmp_path / "camara_1-B")
+    assert "camara_1-B/camara_1-B_%Y%m%d-%H%M%S.ts" in output
+
+
+def test_concat_list_escapes_quotes(tmp_path, monkeypatch):
+    # ffmpeg de prueba: copia la lista del demuxer concat (-i) a la salida
+    fake = tmp_path / "bin" / "ffmpeg"
+    fake.parent.mkdir()
+    fake.write_text(f"#!{sys.executable}\n"
+                    "import shutil, sys\n"
+                    "args = sys.argv\n"
+                    "shutil.copy(args[args.index('-i') + 1], args[-1])\n")
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+
+    segment_path = str(tmp_path / "it's" / "cam_20250101-000000.ts")
+    output = tmp_path / "clip.txt"
+    segments = [Segment(segment_path, 0.0, 10.0, 1)]
+    asyncio.run(stitch_clip(segments, 0.0, 5.0, str(output)))
+
+    escaped = segment_path.replace("it's", "it'\\''s")
+    assert output.read_text() == "file '" + escaped + "'\n"
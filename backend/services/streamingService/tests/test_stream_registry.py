@@ -0,0 +1,21 @@
+from stream_registry import StreamRegistry
+
+
+def test_streams_survive_reopening(tmp_path):
+    path = str(tmp_path / "registry.db")
+    registry = StreamRegistry(path)
+    registry.save("entrada", {"stream_name": "entrada", "rtsp_url": "rtsp://10.0.0.1/1"})
+    registry.save("patio", {"stream_name": "patio", "rtsp_url": "rtsp://10.0.0.2/1"})
+    registry.save("entrada", {"stream_name": "entrada", "rtsp_url": "rtsp://10.0.0.1/2"})
+    registry.close()
+
+    registry = StreamRegistry(path)
+    assert len(registry) == 2
+    streams = registry.load()
+    assert list(streams) == ["patio", "entrada"]  # Orden de la última actualización
+    assert streams["entrada"]["rtsp_url"] == "rtsp://10.0.0.1/2"
+
+    assert registry.remove("patio")
+    assert not registry.remove("patio")
+    assert list(registry.load()) == ["entrada"]
+    registry.close()
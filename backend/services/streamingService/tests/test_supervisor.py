@@ -0,0 +1,66 @@
+import asyncio
+import sys
+
+from ffmpeg_process import FfmpegProcess
+from supervisor import RestartRateLimiter, SupervisedStream
+
+
+def test_stop_during_restart_does_not_orphan_new_process():
+    spawned = []
+
+    async def scenario():
+        stream = SupervisedStream("test", [sys.executable, "-c", "import time; time.sleep(30)"],
+                                  RestartRateLimiter(rate=100, burst=10), backoff_base=0.01, backoff_max=0.01)
+        new_process = stream.new_process
+
+        def tracked_process():
+            process = new_process()
+            spawned.append(process)
+            return process
+        stream.new_process = tracked_process
+
+        # El primer proceso termina enseguida: el supervisor lo relanza
+        first = FfmpegProcess("test", [sys.executable, "-c", "import time; time.sleep(0.2)"])
+        await first.start(startup_check=0.05)
+        stream.supervise(first)
+
+        # Se detiene mientras el reinicio espera el startup_check del proceso nuevo
+        for _ in range(200):
+            if spawned and spawned[0].running:
+                break
+            await asyncio.sleep(0.01)
+        assert stream.state == "starting"
+        await stream.stop(timeout=3)
+
+        assert not spawned[0].running
+        assert stream.state == "stopped"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        for process in spawned:
+            if process.running:
+                process.process.kill()
+
+
+def test_gives_up_when_restarts_fail_at_startup():
+    gave_up = []
+
+    async def scenario():
+        # Cámara inalcanzable: cada reinicio termina dentro del startup_check
+        stream = SupervisedStream("test", [sys.executable, "-c", "import sys; sys.exit('Connection refused')"],
+                                  RestartRateLimiter(rate=100, burst=10), backoff_base=0.01, backoff_max=0.01,
+                                  max_consecutive_failures=2, on_give_up=gave_up.append)
+
+        first = FfmpegProcess("test", [sys.executable, "-c", "import time; time.sleep(0.2)"])
+        await first.start(startup_check=0.05)
+        stream.supervise(first)
+        await asyncio.wait_for(stream._task, timeout=10)
+
+        assert gave_up == [stream]
+        assert stream.state == "failed"
+        assert stream.consecutive_failures == 2
+        assert stream.restarts == 1
+        assert "Connection refused" in stream.last_failure
+
+    asyncio.run(scenario())